@@ -0,0 +1,3 @@
+"""
+Conversion of StreamLine data into netCDF (installed as dwl.netcdf)
+"""
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Catalog of l0, l1 and VAD .nc files in a local SQLite database
+    - read_metadata(): metadata of one product file (only 1D variables are read)
+    - catalog: database with one row per file
+        update()    - add new and changed files of a directory tree, remove deleted files
+        query()     - select files by product, lidar, time range, scan type,
+                      geometry and angle ranges without opening them
+        paths()     - file paths of query(), e.g. as input of vad_l1.vad_day
+
+The products are recognized by their file names (*_l0.nc, *_l1.nc, *_vad.nc,
+see hpl2NetCDF.py and vad2NetCDF.py). Files whose size and modification time did
+not change since the last update are not opened again. Times are datenum (days
+since 0001-01-01, see matplotlib.dates) as in the .nc files.
+example:
+    cat=catalog('products.sqlite')
+    cat.update('/data/level1/SLXR_142',lidar='SLXR_142')
+    files=cat.paths(product='l1',lidar='SLXR_142',geometry='ppi',el_range=(69.5,70.5),\
+                    start='2019-07-01',end='2019-08-01')
+"""
+import os
+import hashlib
+import sqlite3
+import numpy as np
+from netCDF4 import Dataset
+import matplotlib.dates as mdates
+
+# file name suffix of the products
+suffixes={'_l0.nc':'l0','_l1.nc':'l1','_vad.nc':'vad'}
+
+columns=['path','product','lidar','lidar_id','scan_type','geometry','start_dn','end_dn',\
+         'el_min','el_max','az_min','az_max','gates_n','rays_n','range_gate_length',\
+         'pulses_per_ray','size','mtime','checksum']
+
+schema='''
+CREATE TABLE IF NOT EXISTS products (
+    path TEXT PRIMARY KEY,
+    product TEXT,
+    lidar TEXT,
+    lidar_id TEXT,
+    scan_type TEXT,
+    geometry TEXT,
+    start_dn REAL,
+    end_dn REAL,
+    el_min REAL,
+    el_max REAL,
+    az_min REAL,
+    az_max REAL,
+    gates_n INTEGER,
+    rays_n INTEGER,
+    range_gate_length REAL,
+    pulses_per_ray INTEGER,
+    size INTEGER,
+    mtime REAL,
+    checksum TEXT
+);
+CREATE INDEX IF NOT EXISTS products_time ON products (product, lidar, start_dn);
+'''
+
+def product_type(file_path):
+    for suffix,product in suffixes.items():
+        if file_path.endswith(suffix): return product
+    return None
+
+'''
+sha256 of a file, read in blocks of 1 MB
+'''
+def checksum(file_path,block_size=2**20):
+    sha=hashlib.sha256()
+    with open(file_path,'rb') as file_temp:
+        for block in iter(lambda: file_temp.read(block_size),b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+'''
+scan geometry from the angles of the rays (tol in deg)
+    stare - fixed azimuth and elevation
+    ppi   - fixed elevation
+    rhi   - fixed azimuth
+    other - both angles change (e.g. VAD with several elevations)
+'''
+def scan_geometry(el_deg,az_deg,tol=0.1):
+    el_fixed=np.ptp(el_deg)<=tol if el_deg.size>0 else True
+    az_fixed=np.ptp(az_deg%360)<=tol if az_deg.size>0 else True
+    if el_fixed and az_fixed: return 'stare'
+    if el_fixed: return 'ppi'
+    if az_fixed: return 'rhi'
+    return 'other'
+
+def range_gate_length(value):
+    try:
+        return float(str(value).split()[0])
+    except (ValueError,IndexError):
+        return None
+
+'''
+metadata of a l0, l1 or VAD .nc file; the 2D variables are not read
+Input:
+    file_path   - path of the .nc file
+    lidar       - name of the lidar; default: name in the VAD file name or
+                  system_id of l0 and l1 files
+Output:
+    dictionary with the columns of the catalog (without size, mtime, checksum)
+'''
+def read_metadata(file_path,lidar=None):
+    product=product_type(file_path)
+    with Dataset(file_path,'r') as ds_temp:
+        attrs={att:ds_temp.getncattr(att) for att in ds_temp.ncattrs()}
+        gates_n=len(ds_temp.dimensions['NUMBER_OF_GATES'])
+        if product=='vad':
+            dn=np.asarray(ds_temp['datenum'][:],dtype=float)
+            el_deg=np.asarray(ds_temp['elevation'][:],dtype=float)
+            az_deg=np.array([])
+            if lidar is None: lidar=os.path.basename(file_path)[:-len('_yyyymmdd_vad.nc')]
+        else:
+            el_deg=np.asarray(ds_temp['elevation'][:],dtype=float)
+            az_deg=np.asarray(ds_temp['azimuth'][:],dtype=float)
+            if 'datenum_time' in ds_temp.variables:
+                dn=np.asarray(ds_temp['datenum_time'][:],dtype=float)
+            else:
+                # l0: decimal time of the day of start_time; rays after midnight belong to the next day
+                dec_time=np.asarray(ds_temp['decimal_time'][:],dtype=float)
+                dec_time=dec_time+24*np.concatenate([[0],np.cumsum(np.diff(dec_time)<0)])
+                dn=mdates.datestr2num(attrs['start_time'].split()[0])+dec_time/24
+    if lidar is None: lidar=str(attrs.get('system_id',''))
+
+    return {'path':os.path.abspath(file_path),'product':product,'lidar':lidar,\
+            'lidar_id':str(attrs.get('system_id','')),'scan_type':attrs.get('scan_type','VAD' if product=='vad' else ''),\
+            'geometry':'vad' if product=='vad' else scan_geometry(el_deg,az_deg),\
+            'start_dn':float(np.nanmin(dn)) if dn.size>0 else None,'end_dn':float(np.nanmax(dn)) if dn.size>0 else None,\
+            'el_min':float(np.nanmin(el_deg)) if el_deg.size>0 else None,'el_max':float(np.nanmax(el_deg)) if el_deg.size>0 else None,\
+            'az_min':float(np.nanmin(az_deg)) if az_deg.size>0 else None,'az_max':float(np.nanmax(az_deg)) if az_deg.size>0 else None,\
+            'gates_n':gates_n,'rays_n':int(dn.size),'range_gate_length':range_gate_length(attrs.get('range_gate_length')),\
+            'pulses_per_ray':int(attrs['pulses_per_ray']) if 'pulses_per_ray' in attrs else None}
+
+'''
+datenum of a time given as datenum, datetime or string (e.g. '2019-07-01 12:00')
+'''
+def to_datenum(time):
+    if time is None or isinstance(time,(int,float,np.floating)): return time
+    if isinstance(time,str): return mdates.datestr2num(time)
+    return mdates.date2num(time)
+
+class catalog:
+    def __init__(self,db_path):
+        self.db_path=db_path
+        self.connection=sqlite3.connect(db_path)
+        self.connection.row_factory=sqlite3.Row
+        self.connection.executescript(schema)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    '''
+    add new and changed product files below path_root and remove files below
+    path_root which no longer exist
+    Input:
+        path_root   - directory (searched recursively) or list of files
+        lidar       - name of the lidar of all files (default: see read_metadata)
+        with_checksum - calculate sha256 of new and changed files
+    Output:
+        n_added, n_updated, n_removed, n_unchanged
+    '''
+    def update(self,path_root,lidar=None,with_checksum=True):
+        if isinstance(path_root,str):
+            files=[os.path.join(path,file_name) for path,dirs,file_names in os.walk(path_root) \
+                   for file_name in file_names if product_type(file_name)]
+            prefix=os.path.join(os.path.abspath(path_root),'')
+        else:
+            files,prefix=list(path_root),None
+
+        known={row['path']:(row['size'],row['mtime']) for row in \
+               self.connection.execute('SELECT path,size,mtime FROM products')}
+
+        n_added,n_updated,n_unchanged=0,0,0
+        rows=[]
+        for file_path in files:
+            path_abs=os.path.abspath(file_path)
+            stat=os.stat(path_abs)
+            if known.get(path_abs)==(stat.st_size,stat.st_mtime):
+                n_unchanged+=1
+                continue
+            try:
+                row=read_metadata(path_abs,lidar)
+            except (OSError,KeyError,IndexError) as error:
+                print('%s cannot be read: %s' %(path_abs,error))
+                continue
+            row.update(size=stat.st_size,mtime=stat.st_mtime,checksum=checksum(path_abs) if with_checksum else None)
+            rows.append([row[column] for column in columns])
+            if path_abs in known: n_updated+=1
+            else: n_added+=1
+
+        n_removed=0
+        if prefix is not None:
+            removed=[(path,) for path in known if path.startswith(prefix) and not os.path.exists(path)]
+            n_removed=len(removed)
+            self.connection.executemany('DELETE FROM products WHERE path=?',removed)
+        self.connection.executemany('INSERT OR REPLACE INTO products (%s) VALUES (%s)' \
+                                    %(','.join(columns),','.join(['?']*len(columns))),rows)
+        self.connection.commit()
+
+        return n_added,n_updated,n_removed,n_unchanged
+
+    '''
+    select files from the catalog; all conditions are optional
+    Input:
+        product     - 'l0', 'l1' or 'vad'
+        lidar       - name of the lidar
+        start, end  - files which contain rays between start and end (datenum,
+                      datetime or string)
+        scan_type   - part of the scan_type attribute, e.g. 'csm' or 'Stare'
+        geometry    - 'stare', 'ppi', 'rhi', 'other' or 'vad'
+        el_range, az_range in deg - (min,max); all rays of the file are within the range
+        gates_n     - number of range gates
+    Output:
+        list of dictionaries (columns of the catalog) sorted by start time
+    '''
+    def query(self,product=None,lidar=None,start=None,end=None,scan_type=None,geometry=None,\
+              el_range=None,az_range=None,gates_n=None):
+        conditions,values=[],[]
+        for column,value in [('product',product),('lidar',lidar),('geometry',geometry),('gates_n',gates_n)]:
+            if value is not None:
+                conditions.append('%s=?' % column)
+                values.append(value)
+        if start is not None:
+            conditions.append('end_dn>=?')
+            values.append(to_datenum(start))
+        if end is not None:
+            conditions.append('start_dn<=?')
+            values.append(to_datenum(end))
+        if scan_type is not None:
+            conditions.append('scan_type LIKE ?')
+            values.append('%%%s%%' % scan_type)
+        for name,angle_range in [('el',el_range),('az',az_range)]:
+            if angle_range is not None:
+                conditions.append('%s_min>=? AND %s_max<=?' %(name,name))
+                values+=[float(angle_range[0]),float(angle_range[1])]
+
+        sql='SELECT * FROM products'
+        if conditions: sql+=' WHERE '+' AND '.join(conditions)
+        sql+=' ORDER BY start_dn,path'
+
+        return [dict(row) for row in self.connection.execute(sql,values)]
+
+    '''
+    file paths of query() sorted by start time
+    '''
+    def paths(self,**conditions):
+        return [row['path'] for row in self.query(**conditions)]
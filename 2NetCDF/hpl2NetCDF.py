@@ -15,12 +15,18 @@ import datetime
 import xarray as xr
 import matplotlib.dates as mdates
 
+try:
+    from .. import instrument
+except ImportError:
+    from dwl import instrument
+
 '''
 Import of StreamLine .hpl (txt) files and save locally in directory. Therefore
 the data is converted into matrices with dimension "number of range gates" x "time stamp/rays".
 In newer versions of the StreamLine software, the spectral width can be 
 stored as additional parameter in the .hpl files.
 '''
+@instrument.timed('hpl2dict')
 def hpl2dict(file_path):
     #import hpl files into intercal storage
     with open(file_path, 'r') as text_file:
@@ -70,6 +76,10 @@ def hpl2dict(file_path):
     data_temp['pitch'] = np.full(rays_n,np.nan) #degrees
     data_temp['roll'] = np.full(rays_n,np.nan) #degrees
     
+    instrument.count('hpl_files')
+    instrument.count('rays',rays_n)
+    instrument.count('gates',rays_n*gates_n)
+
     for ri in range(0,rays_n): #loop rays
         lines_temp = lines[header_n+(ri*gates_n)+ri+1:header_n+(ri*gates_n)+gates_n+ri+1]
         header_temp = np.asarray(lines[header_n+(ri*gates_n)+ri].split(),dtype=float)
@@ -92,6 +102,7 @@ def hpl2dict(file_path):
 Write .hpl into netCDF l0 data; no data is added, changed or removed;
 additional information about institution and contact are optional; 
 '''
+@instrument.timed('hpl_to_netcdf')
 def hpl_to_netcdf(file_path,path_out,institution=None,contact=None,overwrite=False):
     #check if import file exists
     if not os.path.exists(file_path):
@@ -187,6 +198,7 @@ def hpl_to_netcdf(file_path,path_out,institution=None,contact=None,overwrite=Fal
     gate_centers[:] = data_temp['center_of_gates']
     dataset_temp.close()
     print('%s is created succesfully' % path_file)
+    return path_file
 
 '''
 convert level0 netCDF data into level1 netCDF data
@@ -197,6 +209,7 @@ input variables:
     path_out        - string
 The lidar_info variables needs the 
 '''
+@instrument.timed('to_netcdf_l1')
 def to_netcdf_l1(file_path,file_name_out,lidar_info,path_out):
     
     ds_temp=xr.open_dataset(file_path)
@@ -250,9 +263,9 @@ def to_netcdf_l1(file_path,file_name_out,lidar_info,path_out):
     dec_time_temp=ds_temp.decimal_time.values
     
     # if data from the next day is collected
-    import sys
     if dec_time_temp[-1]<dec_time_temp[0]:
-        sys.exit()
+        ds_temp.close()
+        raise ValueError('%s contains rays of the next day' % os.path.basename(file_path))
     
     date_num=mdates.datestr2num(ds_temp.start_time.split()[0])
     dn_time_temp=date_num+dec_time_temp/24
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lazy access to l0, l1 and VAD .nc files of a lidar over arbitrary time ranges
+    - series: files of one product, concatenated along time when read
+        read()      - requested variables and time range as one xarray.Dataset
+        chunks()    - the same in time chunks (e.g. one day), one chunk in memory
+        sel()       - series restricted to a time range (no file is opened)
+    - open_series(): series of a lidar and time range selected from the catalog
+
+No data is read when a series is created. read() opens only the files which
+overlap with the time range and reads only the requested variables and the
+slice of rays (or VAD profiles) within the time range. The dimensions are named
+consistently for all products:
+    time    - NUMBER_OF_RAYS (l0, l1) or NUMBER_OF_SCANS (vad); coordinate datenum
+    gate    - NUMBER_OF_GATES; files with fewer range gates are filled with NaN
+Times are datenum (days since 0001-01-01, see matplotlib.dates).
+example:
+    vad_july=open_series('products.sqlite','SLXR_142','2019-07-01','2019-08-01',product='vad')
+    for dn_start,ds_day in vad_july.chunks(days=1,variables=['ucomp','vcomp']):
+        ...
+"""
+import numpy as np
+import xarray as xr
+from netCDF4 import Dataset
+import matplotlib.dates as mdates
+
+try:
+    from . import catalog as ct
+except ImportError:
+    import catalog as ct
+
+time_dimensions={'l0':'NUMBER_OF_RAYS','l1':'NUMBER_OF_RAYS','vad':'NUMBER_OF_SCANS'}
+dimension_names={'NUMBER_OF_RAYS':'time','NUMBER_OF_SCANS':'time','NUMBER_OF_GATES':'gate'}
+
+'''
+datenum of the rays (l0, l1) or profiles (vad) of an open netCDF4 Dataset
+'''
+def read_time(ds_temp,product):
+    if product=='vad':
+        return np.asarray(ds_temp['datenum'][:],dtype=float)
+    if 'datenum_time' in ds_temp.variables:
+        return np.asarray(ds_temp['datenum_time'][:],dtype=float)
+    # l0: decimal time of the day of start_time; rays after midnight belong to the next day
+    dec_time=np.asarray(ds_temp['decimal_time'][:],dtype=float)
+    dec_time=dec_time+24*np.concatenate([[0],np.cumsum(np.diff(dec_time)<0)])
+    return mdates.datestr2num(ds_temp.start_time.split()[0])+dec_time/24
+
+'''
+values of a netCDF4 variable (masked values as NaN for float variables)
+'''
+def read_values(variable,index=Ellipsis):
+    values=variable[index]
+    if np.ma.isMaskedArray(values):
+        if values.dtype.kind=='f':
+            values=values.filled(np.nan)
+        else:
+            values=np.ma.getdata(values)
+    return np.asarray(values)
+
+'''
+files of one product of one lidar
+Input:
+    file_paths  - l0, l1 or vad .nc files
+    product     - 'l0', 'l1' or 'vad' (default: from the file names)
+    starts, ends - datenum of the first and last ray of each file (e.g. from the
+                   catalog); otherwise the time variable of each file is read
+                   when the time range is needed the first time
+    start, end  - time range of the series (default: all rays)
+'''
+class series:
+    def __init__(self,file_paths,product=None,starts=None,ends=None,start=None,end=None):
+        self.file_paths=list(file_paths)
+        self.product=product if product is not None else \
+                     (ct.product_type(self.file_paths[0]) if self.file_paths else 'l1')
+        self.time_dim=time_dimensions[self.product]
+        self._starts=None if starts is None else np.asarray(starts,dtype=float)
+        self._ends=None if ends is None else np.asarray(ends,dtype=float)
+        self.start_dn,self.end_dn=ct.to_datenum(start),ct.to_datenum(end)
+
+    def __len__(self):
+        return len(self.file_paths)
+
+    def _time_ranges(self):
+        if self._starts is None:
+            starts,ends=[],[]
+            for file_path in self.file_paths:
+                with Dataset(file_path,'r') as ds_temp:
+                    dn=read_time(ds_temp,self.product)
+                starts.append(np.nanmin(dn) if dn.size>0 else np.nan)
+                ends.append(np.nanmax(dn) if dn.size>0 else np.nan)
+            self._starts,self._ends=np.array(starts),np.array(ends)
+        return self._starts,self._ends
+
+    '''
+    first and last time of the series; start, end of the series if no file has rays
+    '''
+    @property
+    def start(self):
+        starts=self._time_ranges()[0]
+        if not np.isfinite(starts).any(): return self.start_dn
+        start=np.nanmin(starts)
+        return start if self.start_dn is None else max(start,self.start_dn)
+
+    @property
+    def end(self):
+        ends=self._time_ranges()[1]
+        if not np.isfinite(ends).any(): return self.end_dn
+        end=np.nanmax(ends)
+        return end if self.end_dn is None else min(end,self.end_dn)
+
+    '''
+    time range within the time range of the series
+    '''
+    def _limits(self,start=None,end=None):
+        start,end=ct.to_datenum(start),ct.to_datenum(end)
+        if self.start_dn is not None: start=self.start_dn if start is None else max(start,self.start_dn)
+        if self.end_dn is not None: end=self.end_dn if end is None else min(end,self.end_dn)
+        return start,end
+
+    '''
+    index of the files which overlap with [start,end], sorted by start time
+    '''
+    def _files(self,start=None,end=None):
+        starts,ends=self._time_ranges()
+        overlap=np.ones(starts.size,dtype=bool)
+        if start is not None: overlap&=ends>=start
+        if end is not None: overlap&=starts<=end
+        ind=np.flatnonzero(overlap)
+        return ind[np.argsort(starts[ind],kind='stable')]
+
+    '''
+    series of the files which overlap with [start,end]
+    '''
+    def sel(self,start=None,end=None):
+        start,end=self._limits(start,end)
+        ind=self._files(start,end)
+        return series([self.file_paths[i] for i in ind],self.product,self._starts[ind],self._ends[ind],start,end)
+
+    '''
+    read variables within [start,end] of all files
+    Input:
+        variables   - names of the variables (default: all); variables without
+                      time dimension (e.g. gate_centers) are read from one file
+        start, end  - datenum, datetime or string (default: all rays)
+    Output:
+        xarray.Dataset with dimensions time, gate (see above) and coordinate datenum
+    '''
+    def read(self,variables=None,start=None,end=None):
+        start_dn,end_dn=self._limits(start,end)
+        parts,static,attrs=[],dict(),dict()
+        gates_n=0
+        for fi in self._files(start_dn,end_dn):
+            with Dataset(self.file_paths[fi],'r') as ds_temp:
+                dn=read_time(ds_temp,self.product)
+                select=np.ones(dn.size,dtype=bool)
+                if start_dn is not None: select&=dn>=start_dn
+                if end_dn is not None: select&=dn<=end_dn
+                if not select.any(): continue
+                ind=np.flatnonzero(select)
+                # contiguous slice of rays; rays outside the range within the slice are removed afterwards
+                ray_slice=slice(ind[0],ind[-1]+1)
+                select_slice=select[ray_slice]
+
+                names=list(ds_temp.variables) if variables is None else variables
+                gates_file=len(ds_temp.dimensions['NUMBER_OF_GATES']) if 'NUMBER_OF_GATES' in ds_temp.dimensions else 0
+                part={'datenum':dn[ray_slice][select_slice]}
+                for name in names:
+                    if name=='datenum': continue # coordinate
+                    variable=ds_temp[name]
+                    if self.time_dim in variable.dimensions:
+                        axis=variable.dimensions.index(self.time_dim)
+                        index=tuple(ray_slice if di==axis else slice(None) for di in range(variable.ndim))
+                        part[name]=(variable.dimensions,np.compress(select_slice,read_values(variable,index),axis=axis))
+                    elif name not in static or gates_file>gates_n:
+                        # static variables of the file with most range gates
+                        static[name]=(variable.dimensions,read_values(variable))
+                gates_n=max(gates_n,gates_file)
+                if not attrs: attrs={att:ds_temp.getncattr(att) for att in ds_temp.ncattrs()}
+            parts.append(part)
+
+        if not parts:
+            return xr.Dataset(coords={'datenum':('time',np.array([]))},attrs=attrs)
+
+        data_vars=dict()
+        for name,(dims,values) in static.items():
+            data_vars[name]=([dimension_names.get(dim,dim) for dim in dims],values)
+        for name in parts[0]:
+            if name=='datenum': continue
+            dims=parts[0][name][0]
+            axis=dims.index(self.time_dim)
+            values=[self._pad_gates(part[name][1],dims,gates_n) for part in parts]
+            data_vars[name]=([dimension_names.get(dim,dim) for dim in dims],np.concatenate(values,axis=axis))
+        datenum=np.concatenate([part['datenum'] for part in parts])
+
+        return xr.Dataset(data_vars,coords={'datenum':('time',datenum)},attrs=attrs)
+
+    @staticmethod
+    def _pad_gates(values,dims,gates_n):
+        if 'NUMBER_OF_GATES' not in dims: return values
+        axis=dims.index('NUMBER_OF_GATES')
+        if values.shape[axis]==gates_n: return values
+        pad=[(0,0)]*values.ndim
+        pad[axis]=(0,gates_n-values.shape[axis])
+        return np.pad(values.astype(float),pad,constant_values=np.nan)
+
+    '''
+    read variables in time chunks of days length; only one chunk is in memory
+    Output:
+        generator of (start of chunk in datenum, xarray.Dataset); empty chunks are
+        skipped (no chunk for a series without files)
+    '''
+    def chunks(self,days=1.,variables=None,start=None,end=None):
+        if not self.file_paths: return
+        start_dn=self.start if start is None else ct.to_datenum(start)
+        end_dn=self.end if end is None else ct.to_datenum(end)
+        if start_dn is None or end_dn is None: return
+        if days>=1: start_dn=np.floor(start_dn)
+        # at least one chunk (series of a single ray or profile: start_dn==end_dn)
+        for ci in range(max(int(np.ceil((end_dn-start_dn)/days)),1)):
+            chunk_start=start_dn+ci*days
+            # the end of the chunk is excluded (except for the last chunk)
+            chunk_end=min(chunk_start+days,end_dn)
+            ds_chunk=self.read(variables,chunk_start,chunk_end)
+            if ds_chunk.sizes.get('time',0)>0 and chunk_end<end_dn:
+                ds_chunk=ds_chunk.isel(time=ds_chunk.datenum.values<chunk_start+days)
+            if ds_chunk.sizes.get('time',0)>0:
+                yield chunk_start,ds_chunk
+
+'''
+series of a lidar and time range from the catalog (see catalog.py); no file is
+opened. Further conditions of catalog.query (e.g. geometry='ppi',
+el_range=(69.5,70.5)) select the files.
+'''
+def open_series(db_path,lidar,start,end,product='l1',**conditions):
+    with ct.catalog(db_path) as cat:
+        rows=cat.query(product=product,lidar=lidar,start=start,end=end,**conditions)
+    return series([row['path'] for row in rows],product,[row['start_dn'] for row in rows],\
+                  [row['end_dn'] for row in rows],start,end)
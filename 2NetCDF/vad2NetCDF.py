@@ -59,7 +59,7 @@ def to_netcdf(lidar_info, vad, path_out):
     if not os.path.exists(path_out):
         os.makedirs(path_out)  
         
-    day_str = mdates.num2datestr(vad.dn[0],'%Y%m%d')
+    day_str = mdates.num2date(vad.dn[0]).strftime('%Y%m%d')
     file_name='%s_%s_vad.nc' %(lidar_info.name,day_str)
     file_path=os.path.join(path_out,file_name)
 
@@ -0,0 +1,3 @@
+"""
+Scan files and scan schedules for the StreamLine software
+"""
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Choice of scan sectors, elevation angles and scanner speeds for coplanar
+retrievals (see coplanar_retrieval/calc_retrieval.py). For each lidar candidate
+PPI scans (horizontal plane) or RHI scans (vertical plane) are generated; the
+grid points covered by each candidate are calculated for all candidates at once.
+All combinations of the candidates of the lidars are rated by
+    - coverage: fraction of grid points observed by at least one pair of lidars
+      with a valid angle between the beams (see calc_retrieval.valid_angle)
+    - error: mean error prefactor (1/sin(angle)^2, see calc_retrieval.select_lidars)
+and the scan files of the best combination can be written directly.
+
+Coverage model: a grid point is covered by a candidate if
+    - the point is within the sector and the range of the lidar (r_min, r_max)
+    - the beam passes the point closer than delta_l/2 (PPI: cone at elevation el;
+      RHI: vertical half plane at azimuth az)
+    - the distance between two rays at the point is smaller than delta_l
+      (ray spacing = speed * rays_avg)
+The duration of one sweep is estimated as in write_scan_file (sector/speed + 4 s)
+and has to be shorter than the time budget t_max.
+functions:
+    candidates_ppi      - PPI candidates for given elevation angles and speeds
+    candidates_rhi      - RHI candidates for given azimuth angle and speeds
+    coverage            - grid points covered by each candidate
+    optimize_coverage   - rate all combinations of candidates
+    write_best          - write scan files of a combination
+@author: maren
+"""
+import os
+import itertools
+import numpy as np
+try:
+    from . import write_scan_file as wsf
+    from ..coplanar_retrieval import calc_retrieval as cr
+except ImportError:
+    import write_scan_file as wsf
+    import calc_retrieval as cr
+
+'''
+PPI candidates
+input:
+    el in deg       - list of elevation angles
+    speeds in deg/s - list of scanner speeds
+    step in deg     - step of the start azimuth angle
+    widths in deg   - list of sector widths
+output:
+    dictionary with arrays (one entry per candidate) fixed (el), start, end (az), speed
+'''
+def candidates_ppi(el=[0,1,2,4],speeds=[1,2,3,4,6],step=10,widths=[30,45,60,90,120,180,360]):
+    fixed,start,width,speed=np.meshgrid(el,np.arange(0,360,step),widths,speeds,indexing='ij')
+    fixed,start,width,speed=fixed.ravel(),start.ravel(),width.ravel(),speed.ravel()
+    # 360 deg sectors do not depend on the start angle
+    keep=(width<360)|(start==0)
+
+    return {'scan_type':'ppi','fixed':fixed[keep],'start':start[keep],\
+            'end':start[keep]+width[keep],'speed':speed[keep]}
+
+'''
+RHI candidates (el between 0 and 180 deg, see write_rhi)
+input:
+    az in deg       - azimuth angle of the RHI scans
+    speeds in deg/s - list of scanner speeds
+    step in deg     - step of the start elevation angle
+    widths in deg   - list of sector widths
+'''
+def candidates_rhi(az,speeds=[1,2,3,4,6],step=5,widths=[30,45,60,90,120,180]):
+    start,width,speed=np.meshgrid(np.arange(0,180,step),widths,speeds,indexing='ij')
+    start,width,speed=start.ravel(),width.ravel(),speed.ravel()
+    keep=start+width<=180
+
+    return {'scan_type':'rhi','fixed':np.full(keep.sum(),float(az)),'start':start[keep],\
+            'end':start[keep]+width[keep],'speed':speed[keep]}
+
+'''
+sweep duration of candidates in s (see write_scan_file)
+'''
+def sweep_duration(cand):
+    return np.abs(cand['end']-cand['start'])/cand['speed']+4
+
+'''
+direction of the beams to the grid points
+output:
+    angle in deg    - angle used for the pairwise angle between lidars
+                      (horizontal: azimuth; vertical: elevation in the plane)
+    across          - horizontal: elevation angle in deg; vertical: distance to the plane in m
+    dist in m       - distance between lidar and point
+'''
+def point_geometry(dl_loc,grid):
+    dx=grid.xx_flat-dl_loc[0]
+    dy=grid.yy_flat-dl_loc[1]
+    dz=grid.zz_flat-dl_loc[2]
+    dist=np.sqrt(dx**2+dy**2+dz**2)
+
+    if grid.plane_orientation=='horizontal':
+        angle=np.rad2deg(np.arctan2(dx,dy))%360
+        elevation=np.rad2deg(np.arctan2(dz,np.sqrt(dx**2+dy**2)))
+        return angle,elevation,dist
+
+    # position along the plane and distance to the plane
+    phi=np.arctan2(grid.x[-1]-grid.x[0],grid.y[-1]-grid.y[0])
+    s=dx*np.sin(phi)+dy*np.cos(phi)
+    d=-dx*np.cos(phi)+dy*np.sin(phi)
+    angle=np.rad2deg(np.arctan2(dz,s))
+
+    return angle,d,dist
+
+'''
+grid points covered by each candidate
+input:
+    cand            - output of candidates_ppi or candidates_rhi
+    dl_loc in m     - location of the lidar
+    grid            - calc_retrieval.grid
+    rays_avg in s   - duration of one ray
+    r_min, r_max in m - range of the lidar
+output:
+    cover           - (candidates x grid points) boolean array
+    angle in deg    - direction of the beam to each grid point (see point_geometry)
+'''
+def coverage(cand,dl_loc,grid,rays_avg=1.,r_min=100,r_max=3000):
+    angle,across,dist=point_geometry(dl_loc,grid)
+
+    ray_spacing=np.deg2rad(cand['speed']*rays_avg)[:,None]*dist[None,:]
+    cover=(dist>=r_min)&(dist<=r_max)
+    cover=cover[None,:]&(ray_spacing<=grid.delta_l)
+
+    if cand['scan_type']=='ppi':
+        # height of the cone of the PPI scan above the point
+        dh=np.sqrt(dist**2-(grid.zz_flat-dl_loc[2])**2)
+        dz_beam=dl_loc[2]+dh[None,:]*np.tan(np.deg2rad(cand['fixed']))[:,None]-grid.zz_flat[None,:]
+        in_sector=(angle[None,:]-cand['start'][:,None])%360<=(cand['end']-cand['start'])[:,None]
+        cover&=in_sector&(np.abs(dz_beam)<=grid.delta_l/2)
+    else:
+        # azimuth of the RHI scan is assumed to be aligned with the plane
+        in_sector=(angle[None,:]>=cand['start'][:,None])&(angle[None,:]<=cand['end'][:,None])
+        cover&=in_sector&(np.abs(across)<=grid.delta_l/2)[None,:]
+
+    return cover,angle
+
+'''
+rating of all combinations of candidates
+The candidates of each lidar are restricted to sweeps shorter than t_max and to
+the n_keep candidates covering most grid points with a valid angle to any other
+lidar. The combinations are evaluated in chunks of chunk_size.
+input:
+    dl_loc_list     - list of lidar locations [x,y,z] in m
+    grid            - calc_retrieval.grid of the target area
+    t_max in s      - time budget of one sweep
+    cand_list       - list of candidates of each lidar (default: candidates_ppi for
+                      horizontal grids, candidates_rhi along the plane for vertical grids)
+    mask            - boolean array (grid shape); only these grid points are considered
+output:
+    dictionary with
+        cand            - candidates of each lidar (restricted)
+        combinations    - (combinations x lidar_n) index of the candidate of each lidar;
+                          sorted by coverage (descending) and error (ascending)
+        coverage        - fraction of grid points which can be retrieved
+        error           - mean error prefactor of the retrieved grid points
+        duration in s   - longest sweep of the combination
+'''
+def optimize_coverage(dl_loc_list,grid,t_max,cand_list=None,mask=None,rays_avg=1.,\
+                      r_min=100,r_max=3000,n_keep=40,chunk_size=500):
+    lidar_n=len(dl_loc_list)
+    dl_loc=np.array(dl_loc_list,dtype=float)
+    if cand_list is None:
+        if grid.plane_orientation=='horizontal':
+            cand_list=[candidates_ppi() for li in range(lidar_n)]
+        else:
+            phi=np.rad2deg(np.arctan2(grid.x[-1]-grid.x[0],grid.y[-1]-grid.y[0]))
+            cand_list=[candidates_rhi(phi) for li in range(lidar_n)]
+
+    cover_list,angle=[],[]
+    for cand,loc in zip(cand_list,dl_loc):
+        cover_temp,angle_temp=coverage(cand,loc,grid,rays_avg=rays_avg,r_min=r_min,r_max=r_max)
+        if mask is not None: cover_temp&=np.ravel(mask)[None,:]
+        cover_list.append(cover_temp)
+        angle.append(angle_temp)
+    angle=np.array(angle)
+
+    # valid angles (limits of calc_retrieval) and error prefactor of each pair of lidars at each grid point
+    diff=cr.pairwise_angle(np.deg2rad(angle))
+    pair_valid=cr.valid_angle(diff,grid.plane_orientation)
+    with np.errstate(divide='ignore'):
+        pair_error=1/np.sin(np.deg2rad(diff))**2
+
+    # restrict candidates
+    for li in range(lidar_n):
+        useful=np.delete(pair_valid[li],li,axis=0).any(axis=0)
+        score=(cover_list[li]&useful[None,:]).sum(axis=1)
+        score[sweep_duration(cand_list[li])>t_max]=-1
+        keep=np.argsort(-score,kind='stable')[:n_keep]
+        keep=keep[score[keep]>0]
+        if keep.size==0:
+            raise Exception('no candidate of lidar %i covers the grid within %.0f s' % (li,t_max))
+        cand_list[li]={key:(val[keep] if key!='scan_type' else val) for key,val in cand_list[li].items()}
+        cover_list[li]=cover_list[li][keep]
+
+    pairs=list(itertools.combinations(range(lidar_n),2))
+    combinations=np.array(list(itertools.product(*[range(c.shape[0]) for c in cover_list])))
+    n_points=grid.n if mask is None else np.sum(mask)
+
+    cov=np.zeros(combinations.shape[0])
+    error=np.full(combinations.shape[0],np.nan)
+    for ci in range(0,combinations.shape[0],chunk_size):
+        comb=combinations[ci:ci+chunk_size]
+        pair_n=np.zeros((comb.shape[0],grid.n),dtype=np.int8)
+        error_sum=np.zeros((comb.shape[0],grid.n))
+        for l1,l2 in pairs:
+            valid=cover_list[l1][comb[:,l1]]&cover_list[l2][comb[:,l2]]&pair_valid[l1,l2][None,:]
+            pair_n+=valid
+            error_sum+=np.where(valid,pair_error[l1,l2][None,:],0)
+        retrieved=pair_n>0
+        retrieved_n=retrieved.sum(axis=1)
+        cov[ci:ci+chunk_size]=retrieved_n/n_points
+        with np.errstate(invalid='ignore',divide='ignore'):
+            error[ci:ci+chunk_size]=np.where(retrieved,error_sum/pair_n,0).sum(axis=1)/retrieved_n
+
+    duration=np.max([sweep_duration(cand)[comb] for cand,comb in zip(cand_list,combinations.T)],axis=0)
+    order=np.lexsort((duration,np.nan_to_num(error,nan=np.inf),-cov))
+
+    return {'cand':cand_list,'combinations':combinations[order],'coverage':cov[order],\
+            'error':error[order],'duration':duration[order]}
+
+'''
+write scan files of a combination (default: best combination)
+input:
+    result          - output of optimize_coverage
+    lidar_ids       - list of lidar names; define the output folders
+    path_out        - output directory
+    bearings in deg - list of bearing of each lidar
+    ind             - index of the combination
+    c               - number of repetitions (see write_ppi, write_rhi)
+output:
+    list of scan file names
+'''
+def write_best(result,lidar_ids,path_out,bearings=None,ind=0,c=1,**kwargs):
+    if bearings is None: bearings=[0]*len(lidar_ids)
+
+    file_names=[]
+    for cand,ci,lidar_id,bearing in zip(result['cand'],result['combinations'][ind],lidar_ids,bearings):
+        path_lidar=os.path.join(path_out,lidar_id)
+        if cand['scan_type']=='ppi':
+            file_names.append(wsf.write_ppi(lidar_id,cand['start'][ci],cand['end'][ci],path_out=path_lidar,el=cand['fixed'][ci],\
+                                            s=cand['speed'][ci],c=c,bearing=bearing,**kwargs))
+        else:
+            file_names.append(wsf.write_rhi(lidar_id,cand['start'][ci],cand['end'][ci],path_out=path_lidar,az=cand['fixed'][ci],\
+                                            s=cand['speed'][ci],c=c,bearing=bearing,**kwargs))
+
+    return file_names
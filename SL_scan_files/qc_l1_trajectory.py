@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Quality control of level1 (l1) data with the expected trajectory of the scan file
+(see simulate_scan_file.py). Each measured ray is compared with the predicted
+azimuth and elevation; deviating rays (stuck motors, bearing errors, scans clipped
+by the dss) are flagged and the flags are written into the l1 netCDF file.
+functions:
+    expected_angles - predicted azimuth/elevation at the measured ray times (csm) or nearest point (ss)
+    scan_offset     - time of the first measured ray after the start of the scan (csm)
+    qc_flags        - residuals and flags of measured rays
+    qc_l1           - add qc variables to l1 netCDF file
+@author: maren
+"""
+import os
+import numpy as np
+import xarray as xr
+try:
+    from . import simulate_scan_file as ssf
+except ImportError:
+    import simulate_scan_file as ssf
+
+# flag values (bits) of qc_trajectory
+flag_az=1         # azimuth deviates from expected trajectory
+flag_el=2         # elevation deviates from expected trajectory
+flag_late=4       # ray after the expected end of the scan
+flag_stuck=8      # angles do not change although the scanner should move
+flag_meanings='azimuth_deviation elevation_deviation after_expected_scan_end motor_stuck'
+
+'''
+elevation angles above 90 deg (e.g. RHI scans from 0 to 180 deg) are reported 
+by the lidar as elevation angle below 90 deg with opposite azimuth angle
+'''
+def fold_angles(az,el):
+    over=el>90
+    return np.where(over,az+180,az)%360,np.where(over,180-el,el)
+
+'''
+deviation between two azimuth angles in deg (-180 to 180)
+'''
+def az_difference(az1,az2):
+    return (az1-az2+180)%360-180
+
+'''
+expected azimuth and elevation angle of measured rays
+csm: the predicted trajectory is interpolated to the time of the rays (relative to 
+the start of the scan); ss: each ray is assigned to the nearest scan point in azimuth using
+the sorted azimuth angles of the scan points
+input:
+    sim             - output of simulate_scan_file.simulate_scan
+    mode            - 'csm' or 'ss'
+    t_ray in s      - time of rays relative to the start of the scan
+    az_ray in deg   - measured azimuth angle (only used for ss)
+'''
+def expected_angles(sim,mode,t_ray,az_ray):
+    if mode=='csm':
+        az_unwrap=np.rad2deg(np.unwrap(np.deg2rad(sim['ray_az'])))
+        az_exp=np.interp(t_ray,sim['ray_time'],az_unwrap)%360
+        el_exp=np.interp(t_ray,sim['ray_time'],sim['ray_el'])
+        return fold_angles(az_exp,el_exp)
+    
+    az_point,el_point=fold_angles(sim['ray_az'],sim['ray_el'])
+    sort_ind=np.argsort(az_point)
+    az_sorted=az_point[sort_ind]
+    # candidates left and right of the measured azimuth angle (cyclic)
+    i_right=np.searchsorted(az_sorted,az_ray%360)%az_sorted.size
+    i_left=(i_right-1)%az_sorted.size
+    closer=np.abs(az_difference(az_ray,az_sorted[i_left]))<np.abs(az_difference(az_ray,az_sorted[i_right]))
+    ind=sort_ind[np.where(closer,i_left,i_right)]
+    
+    return az_point[ind],el_point[ind]
+
+'''
+time of the first measured ray after the start of the scan (csm): the first rays 
+are compared with the predicted trajectory for all offsets (step in s) at once; 
+the offset is the best match of the first range of offsets for which the median 
+deviation of the rays is within the tolerances (the angles of later cycles of a 
+scan repeat), or the best match of all offsets
+input:
+    sim                 - output of simulate_scan_file.simulate_scan
+    t_ray in s          - time of the first rays relative to the first ray
+    az, el in deg       - measured azimuth and elevation angle of these rays
+output:
+    offset in s
+'''
+def scan_offset(sim,t_ray,az,el,tol_az=1.,tol_el=0.5,step=0.1):
+    offsets=np.arange(0,max(sim['duration'],step),step)
+    az_exp,el_exp=expected_angles(sim,'csm',offsets[:,np.newaxis]+t_ray[np.newaxis,:],None)
+    # the azimuth angle is undefined for vertical rays
+    dev_az=np.where(el<89.5,np.abs(az_difference(az,az_exp))/tol_az,0)
+    cost=np.median(np.maximum(dev_az,np.abs(el-el_exp)/tol_el),axis=1)
+    
+    within=cost<=1
+    if not within.any():
+        return offsets[np.argmin(cost)]
+    i_start=np.argmax(within)
+    i_end=i_start+np.argmin(within[i_start:]) if not within[i_start:].all() else offsets.size
+    
+    return offsets[i_start+np.argmin(cost[i_start:i_end])]
+
+'''
+residuals and flags of measured rays
+input:
+    sim                 - output of simulate_scan_file.simulate_scan
+    mode                - 'csm' or 'ss'
+    time in s           - time of the rays
+    az, el in deg       - measured azimuth and elevation angle (corrected for bearing)
+    tol_az, tol_el in deg - maximum tolerated deviation
+    tol_t in s          - tolerated time after the expected end of the scan
+    offset in s         - time of the first ray after the start of the scan (csm); 
+                          default: estimated from the first align_n rays (see scan_offset)
+output:
+    az_res, el_res in deg   - measured minus expected angle
+    flag                    - sum of flag values (see top of file)
+'''
+def qc_flags(sim,mode,time,az,el,tol_az=1.,tol_el=0.5,tol_t=2.,offset=None,align_n=5):
+    t_ray=time-time[0]
+    if mode=='csm':
+        if offset is None:
+            offset=scan_offset(sim,t_ray[:align_n],az[:align_n],el[:align_n],tol_az=tol_az,tol_el=tol_el)
+        t_ray=t_ray+offset
+    az_exp,el_exp=expected_angles(sim,mode,t_ray,az)
+    az_res=az_difference(az,az_exp)
+    el_res=el-el_exp
+    
+    # the azimuth angle is undefined for vertical rays
+    flag=np.where((np.abs(az_res)>tol_az) & (el<89.5),flag_az,0)
+    flag|=np.where(np.abs(el_res)>tol_el,flag_el,0)
+    flag|=np.where(t_ray>sim['duration']+tol_t,flag_late,0)
+    
+    if t_ray.size>1:
+        still=(np.diff(az)==0) & (np.diff(el)==0)
+        moving=(np.abs(az_difference(az_exp[1:],az_exp[:-1]))>tol_az) | (np.abs(np.diff(el_exp))>tol_el)
+        stuck=np.concatenate([[False],still & moving])
+        flag|=np.where(stuck,flag_stuck,0)
+    
+    return az_res,el_res,flag.astype(np.int8)
+
+'''
+add qc variables (qc_trajectory, azimuth_residual, elevation_residual) to l1 netCDF file
+The scan file has to be written with the bearing of the l1 file; the azimuth angle
+of the l1 data is corrected for the bearing (see hpl2NetCDF.to_netcdf_l1).
+input:
+    file_path           - l1 netCDF file
+    scan_file           - path of scan file (.txt)
+    pulse_frequency in Hz - pulse repetition frequency of the lidar
+    file_out            - output file; default: file_path is overwritten
+other keyword arguments are passed to qc_flags
+output:
+    flag
+'''
+def qc_l1(file_path,scan_file,pulse_frequency=10000,file_out=None,**kwargs):
+    # time is kept as UNIX timestamp (the units of the l1 files are not CF conform)
+    with xr.open_dataset(file_path,decode_times=False) as ds_temp:
+        ds_temp.load()
+    
+    bearing=float(ds_temp.bearing.values) if 'bearing' in ds_temp else 0
+    scan=ssf.read_scan_file(scan_file)
+    sim=ssf.simulate_scan(scan,ray_duration=float(ds_temp.pulses_per_ray)/pulse_frequency,bearing=bearing)
+    
+    az_res,el_res,flag=qc_flags(sim,scan['mode'],ds_temp.time.values.astype(np.float64),\
+                                ds_temp.azimuth.values.astype(np.float64),\
+                                ds_temp.elevation.values.astype(np.float64),**kwargs)
+    
+    flag_var=xr.Variable(['NUMBER_OF_RAYS'],flag,\
+                         attrs={'long_name':'quality flag of scanner trajectory',\
+                                'flag_masks':np.array([flag_az,flag_el,flag_late,flag_stuck],dtype=np.int8),\
+                                'flag_meanings':flag_meanings,\
+                                'scan_file':os.path.basename(scan_file),\
+                                'comment':'0 = ray agrees with trajectory expected from scan file'})
+    ds_temp=ds_temp.assign(qc_trajectory=flag_var)
+    az_res_var=xr.Variable(['NUMBER_OF_RAYS'],az_res.astype(np.float32),\
+                           attrs={'units':'degrees',\
+                                  'long_name':'measured minus expected azimuth angle',\
+                                  'median':np.median(az_res)})
+    ds_temp=ds_temp.assign(azimuth_residual=az_res_var)
+    el_res_var=xr.Variable(['NUMBER_OF_RAYS'],el_res.astype(np.float32),\
+                           attrs={'units':'degrees',\
+                                  'long_name':'measured minus expected elevation angle'})
+    ds_temp=ds_temp.assign(elevation_residual=el_res_var)
+    
+    if file_out is None: file_out=file_path
+    ds_temp.to_netcdf(file_out+'.tmp')
+    ds_temp.close()
+    os.replace(file_out+'.tmp',file_out)
+    
+    return flag
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scan files of the Halo Photonics StreamLine software as list of commands
+Scan pattern are composed of motor commands (move), waits (wait) and repetitions
+(repeat) and rendered to the StreamLine text format in memory (render) or written
+with one write per file (write). The conversion of angles and speeds into motor
+units is only done here.
+classes:
+    move        - move both motors to azimuth/elevation angle
+    wait        - wait in msec
+    repeat      - repeat a list of commands n times
+    csm_scan    - scan file in continous scanning mode (csm)
+    ss_scan     - scan file in step and stare mode (ss)
+functions:
+    ppi, rhi, ppi_rhi, vad_csm, vad, ppi_el, ht_scan - scan pattern of write_scan_file
+    write_sweep - write scan files for all combinations of parameters
+@author: maren
+"""
+import os
+import itertools
+import numpy as np
+
+# motor points per complete circle
+el1=250000/360
+az1=500000/360
+
+# speed of the motors (points/(10 sec)) when moving to the start position
+S_max=5000
+
+'''
+move both motors to azimuth and elevation angle
+input:
+    az, el in deg       - target position (the bearing is added to az when rendered)
+    s_az, s_el in deg/sec - speed of the motors; None: S_max
+    a_az, a_el          - acceleration of the motors in motor units
+'''
+class move:
+    def __init__(self,az,el,s_az=None,s_el=None,a_az=30,a_el=50):
+        self.az,self.el=az,el
+        self.s_az,self.s_el=s_az,s_el
+        self.a_az,self.a_el=a_az,a_el
+
+    def render(self,bearing=0):
+        S1=S_max if self.s_az is None else np.round(self.s_az*az1/10)
+        S2=S_max if self.s_el is None else np.round(self.s_el*el1/10)
+        P1=-np.round((self.az+bearing)*az1)
+        P2=-np.round(self.el*el1)
+        return 'A.1=%i,S.1=%i,P.1=%i*A.2=%i,S.2=%i,P.2=%i\r\n' %(self.a_az,S1,P1,self.a_el,S2,P2)
+
+'''
+wait in msec before the next command
+'''
+class wait:
+    def __init__(self,ms):
+        self.ms=ms
+
+    def render(self,bearing=0):
+        return 'W%i\r\n' % self.ms
+
+'''
+repeat commands n times; the text is rendered only once
+'''
+class repeat:
+    def __init__(self,commands,n):
+        self.commands=commands
+        self.n=n
+
+    def render(self,bearing=0):
+        return ''.join([command.render(bearing) for command in self.commands])*self.n
+
+'''
+scan file in csm mode
+input:
+    name        - file name without .txt
+    commands    - list of move, wait and repeat
+'''
+class csm_scan:
+    def __init__(self,name,commands):
+        self.name=name
+        self.commands=commands
+
+    def render(self,bearing=0):
+        return ''.join([command.render(bearing) for command in self.commands])
+
+    '''
+    write scan file into path_out (created if missing)
+    return:
+        file_name   - name of the scan file without .txt
+    '''
+    def write(self,path_out,bearing=0):
+        if not os.path.exists(path_out): os.makedirs(path_out)
+        with open(os.path.join(path_out,self.name+'.txt'),'w') as text_file:
+            text_file.write(self.render(bearing))
+
+        return self.name
+
+'''
+scan file in ss mode; the scanner stares at each (az, el) point
+(the bearing is not applied to ss scans)
+'''
+class ss_scan(csm_scan):
+    def __init__(self,name,az,el,n=1):
+        self.name=name
+        self.az,self.el=np.atleast_1d(az),np.atleast_1d(el)
+        self.n=n
+
+    def render(self,bearing=0):
+        az,el=np.broadcast_arrays(self.az,self.el)
+        return ''.join(['%07.3f%07.3f\r\n' % (azi,eli) for azi,eli in zip(az,el)])*self.n
+
+'''
+commands for n sweeps back and forth between two positions starting at the first
+'''
+def sweeps(first,second,n,ms):
+    commands=[repeat([second,wait(ms),first,wait(ms)],n//2)]
+    if n%2==1: commands+=[second,wait(ms)]
+    return commands
+
+'''
+scan pattern of write_scan_file (see there for the parameters)
+'''
+def ppi(az_start,az_end,el=0,s=1,n=1,w=500):
+    name='csm_ppi_%.2f_%.2f-%.2f_%ix_s%i_w%i' %(el,az_start,az_end,n,s,w)
+    commands=[move(az_start,el),wait(w)]
+    commands+=sweeps(move(az_start,el,s_az=s),move(az_end,el,s_az=s),n,w)
+    return csm_scan(name,commands)
+
+def rhi(el_start,el_end,az=0,s=1,n=1,w=500):
+    name='csm_rhi_%.2f_%.2f-%.2f_%ix_s%i_w%i' %(az,el_start,el_end,n,s,w)
+    commands=[move(az,el_start),wait(w)]
+    commands+=sweeps(move(az,el_start,s_el=s),move(az,el_end,s_el=s),n,w)
+    return csm_scan(name,commands)
+
+def ppi_rhi(el_ppi,az_rhi,s=1,n=1,w=100):
+    name='csm_ppi_rhi_el%.2f_az%.2f_%ix_s%i_w%i' %(el_ppi,az_rhi,n,s,w)
+    commands=[repeat([move(az_rhi,el_ppi,a_az=50),wait(w),\
+                      move(az_rhi+360,el_ppi,s_az=s,a_az=50),wait(w),\
+                      move(az_rhi,0,a_az=50),wait(w),\
+                      move(az_rhi,180,s_az=s,s_el=s,a_az=50),wait(w)],n)]
+    return csm_scan(name,commands)
+
+def vad_csm(el_start,el_end,el_delta,s=1,w=100):
+    el_array=np.arange(el_start,el_end,el_delta)
+    name='csm_vad_ppi_%.2f-%.2f_%.2f_s%i_w%i' %(el_start,el_end,el_delta,s,w)
+    commands=[move(0,el_array[0]),wait(w)]
+    for eli,el in enumerate(el_array[1:]):
+        az_order=[0,360] if eli%2==0 else [360,0]
+        commands+=[move(az_order[0],el,s_az=s),wait(w),move(az_order[1],el,s_az=s),wait(w)]
+    return csm_scan(name,commands)
+
+def vad(rays_n,el,n=1):
+    name='ss_vad_%.2f_%irays_%ix' %(el,rays_n,n)
+    return ss_scan(name,np.linspace(0,360-360/rays_n,rays_n),el,n)
+
+def ppi_el(az_start,az_end,el=[0],s=1,n=1,w=500):
+    name='csm_ppi_%s_%.2f-%.2f_%ix_s%i_w%i' %(str(el).replace(', ','_')[1:-1],az_start,az_end,n,s,w)
+    commands=[]
+    check=True
+    for ni in range(n):
+        for el_temp in el:
+            first,second=(az_start,az_end) if check else (az_end,az_start)
+            commands+=[move(first,el_temp),wait(w),move(second,el_temp,s_az=s),wait(w)]
+            check=not check
+    return csm_scan(name,commands)
+
+def ht_scan(site,el_lim,az_lim,speed,delta_el,w=500):
+    el_array=np.arange(el1*el_lim[0],el1*el_lim[-1],el1*delta_el)/el1
+    az_order=[az_lim[0],az_lim[-1]]
+    commands=[]
+    for ei,el in enumerate(el_array):
+        if ei%2==0:
+            commands+=[move(az_order[0],el,s_az=speed),wait(w),move(az_order[1],el,s_az=speed)]
+        else:
+            commands+=[move(az_order[1],el,s_az=speed),wait(w),move(az_order[0],el,s_az=speed)]
+        commands+=[wait(w)]
+    return csm_scan('ht_%s' % site,commands)
+
+'''
+write scan files for all combinations of parameters
+input:
+    path_out    - output directory (created if missing)
+    pattern     - function returning a csm_scan or ss_scan (e.g. ppi, rhi)
+    bearing in deg - devation of the lidar north to true north
+    params      - lists of values for each parameter of pattern, e.g. el=[2,4],s=[1,2,3]
+return:
+    list of file names
+example:
+    write_sweep('SLXR_142',ppi,bearing=18.4,az_start=[0],az_end=[90,180],el=[0,2,4],s=[1,2])
+'''
+def write_sweep(path_out,pattern,bearing=0,**params):
+    keys=list(params.keys())
+    return [pattern(**dict(zip(keys,values))).write(path_out,bearing) \
+            for values in itertools.product(*[params[key] for key in keys])]
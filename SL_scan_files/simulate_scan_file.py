@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Simulation of scan files and daily scan schedules (dss) of the Halo Photonics 
+StreamLine software (see write_scan_file.py and write_dss_example.py). The motor 
+commands are parsed and the trajectory (azimuth, elevation), the time of each ray 
+and the duration of the scan are predicted.
+functions:
+    read_scan_file  - parse csm (motor commands and waits) or ss (azimuth/elevation points) scan file
+    simulate_scan   - trajectory, ray times and duration of a scan file
+    read_dss        - parse daily scan schedule
+    simulate_dss    - duration of all scans of a dss and check for overlapping scans
+
+Motion model (csm): both motors move simultaneously to their target position 
+with trapezoidal velocity profile (acceleration A, maximum speed S), the next 
+command starts when both motors have reached the target and the wait time is over.
+The conversion of the acceleration A into motor points/s^2 (acc_scale) is an 
+estimate and should be calibrated with measured l1 data.
+@author: maren
+"""
+import os,re
+import numpy as np
+
+# motor points per complete circle
+el1=250000/360
+az1=500000/360
+
+# speed of the motors between points of ss scans (motor points/(10 sec), see write_scan_file)
+S_max=5000
+
+_csm_pattern=re.compile(r'A\.1=(-?\d+),S\.1=(-?\d+),P\.1=(-?\d+)\*A\.2=(-?\d+),S\.2=(-?\d+),P\.2=(-?\d+)|W(\d+)')
+_ss_pattern=re.compile(r'^\s*(\d{3}\.\d{3})(\d{3}\.\d{3})\s*$',re.M)
+
+'''
+parse scan file
+input:
+    file_path       - path of scan file (.txt) or content of scan file
+output: 
+    dictionary with 
+        mode        - 'csm' or 'ss'
+    for csm (one entry per motor command):
+        az_deg, el_deg  - target position in deg (motor coordinates, including bearing)
+        s_az, s_el      - speed in deg/sec
+        a_az, a_el      - acceleration A (motor units)
+        wait in s       - wait time after the command
+    for ss (one entry per point):
+        az_deg, el_deg  - position in deg
+'''
+def read_scan_file(file_path):
+    if os.path.isfile(file_path):
+        with open(file_path,'r') as text_file:
+            text=text_file.read()
+    else:
+        text=file_path
+    
+    if _ss_pattern.search(text) and not _csm_pattern.search(text):
+        points=np.array(_ss_pattern.findall(text),dtype=float)
+        return {'mode':'ss','az_deg':points[:,0],'el_deg':points[:,1]}
+    
+    matches=_csm_pattern.findall(text)
+    if len(matches)==0:
+        raise Exception('no motor commands found')
+    
+    # waits belong to the preceding motor command
+    is_move=np.array([m[6]=='' for m in matches])
+    moves=np.array([m[:6] for m,move in zip(matches,is_move) if move],dtype=float)
+    wait_ms=np.array([float(m[6]) if not move else 0. for m,move in zip(matches,is_move)])
+    move_ind=np.cumsum(is_move)-1
+    wait=np.zeros(moves.shape[0])
+    np.add.at(wait,move_ind[move_ind>=0],wait_ms[move_ind>=0]/1000)
+    
+    return {'mode':'csm',\
+            'az_deg':-moves[:,2]/az1,'el_deg':-moves[:,5]/el1,\
+            's_az':moves[:,1]*10/az1,'s_el':moves[:,4]*10/el1,\
+            'a_az':moves[:,0],'a_el':moves[:,3],\
+            'wait':wait}
+
+'''
+duration of movements with trapezoidal velocity profile
+input:
+    d in deg        - distance
+    v in deg/sec    - maximum speed
+    a in deg/sec2   - acceleration
+'''
+def move_time(d,v,a):
+    d=np.abs(d)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        t=np.where(d>=v**2/a,d/v+v/a,2*np.sqrt(d/a))
+    
+    return np.where(d==0,0,t)
+
+'''
+distance covered after time t of a movement with trapezoidal velocity profile
+(v and a as in move_time, d total distance)
+'''
+def move_distance(t,d,v,a):
+    d_abs=np.abs(d)
+    v_peak=np.minimum(v,np.sqrt(d_abs*a))
+    t_acc=v_peak/a
+    t_total=move_time(d_abs,v,a)
+    t=np.clip(t,0,t_total)
+    s=np.where(t<t_acc,0.5*a*t**2,\
+        np.where(t<t_total-t_acc,0.5*a*t_acc**2+v_peak*(t-t_acc),\
+                 d_abs-0.5*a*(t_total-t)**2))
+    
+    return np.sign(d)*np.minimum(s,d_abs)
+
+'''
+Simulation of a scan file
+The rays of csm scans are recorded continuously every ray_duration seconds from 
+the start of the scan until the last command (including wait) is finished. For ss 
+scans the scanner moves to each point with S_max and stares for ray_duration.
+input:
+    file_path       - path or content of scan file
+    ray_duration in s - duration of one ray (pulses per ray / pulse frequency)
+    bearing in deg  - bearing used for the scan file; removed from the predicted azimuth
+    start_pos       - (az,el) in deg, motor position before the scan (default: first point)
+    acc_scale       - motor points/s^2 per unit of A
+return:
+    dictionary with
+        duration in s           - total duration of the scan
+        t_segment in s          - start time of each command/point
+        ray_time in s           - time of each ray from the start of the scan
+        ray_az, ray_el in deg   - predicted azimuth and elevation of each ray
+'''
+def simulate_scan(file_path,ray_duration=1.,bearing=0,start_pos=None,acc_scale=1000):
+    scan=read_scan_file(file_path) if isinstance(file_path,str) else file_path
+    
+    az_target,el_target=scan['az_deg'],scan['el_deg']
+    if start_pos is None:
+        start_pos=(az_target[0],el_target[0])
+    else:
+        start_pos=(start_pos[0]+bearing,start_pos[1])
+    az_from=np.concatenate([[start_pos[0]],az_target[:-1]])
+    el_from=np.concatenate([[start_pos[1]],el_target[:-1]])
+    d_az,d_el=az_target-az_from,el_target-el_from
+    
+    if scan['mode']=='csm':
+        s_az,s_el=scan['s_az'],scan['s_el']
+        a_az,a_el=scan['a_az']*acc_scale/az1,scan['a_el']*acc_scale/el1
+        wait=scan['wait']
+    else:
+        s_az,s_el=np.full(d_az.shape,S_max*10/az1),np.full(d_el.shape,S_max*10/el1)
+        a_az,a_el=np.full(d_az.shape,30*acc_scale/az1),np.full(d_el.shape,50*acc_scale/el1)
+        wait=np.full(d_az.shape,ray_duration)
+    
+    t_move=np.maximum(move_time(d_az,s_az,a_az),move_time(d_el,s_el,a_el))
+    t_segment=np.concatenate([[0],np.cumsum(t_move+wait)])
+    duration=t_segment[-1]
+    
+    if scan['mode']=='csm':
+        ray_time=np.arange(0,duration,ray_duration)
+        si=np.clip(np.searchsorted(t_segment,ray_time,side='right')-1,0,az_target.size-1)
+        t_in=ray_time-t_segment[si]
+        ray_az=az_from[si]+move_distance(t_in,d_az[si],s_az[si],a_az[si])
+        ray_el=el_from[si]+move_distance(t_in,d_el[si],s_el[si],a_el[si])
+    else:
+        # one ray at each point after arrival
+        ray_time=t_segment[:-1]+t_move
+        ray_az,ray_el=az_target.copy(),el_target.copy()
+    
+    return {'duration':duration,'t_segment':t_segment[:-1],\
+            'ray_time':ray_time,'ray_az':(ray_az-bearing)%360,'ray_el':ray_el}
+
+'''
+parse daily scan schedule (.dss)
+output: 
+    list of (start in s of day, scan name, averaging, mode 'C' or 'S'); the averaging 
+    is given in pulses per ray in thousands for 'C' (csm) and in s per ray for 'S' 
+    (ss, see write_dss.write_dss)
+'''
+def read_dss(file_path):
+    dss=[]
+    with open(file_path,'r') as text_file:
+        for line in text_file:
+            parts=line.split()
+            if len(parts)<4: continue
+            t=parts[0]
+            dss.append((int(t[0:2])*3600+int(t[2:4])*60+int(t[4:6]),parts[1],float(parts[2]),parts[3]))
+    
+    return dss
+
+'''
+Simulation of a daily scan schedule; every scan file is simulated once
+input:
+    dss_path        - path of .dss file
+    path_scans      - directory of the scan files (scan name + '.txt')
+    pulse_frequency - pulse repetition frequency of the lidar in Hz
+    bearing in deg  - see simulate_scan
+output:
+    dictionary with (one entry per scheduled scan)
+        start, end in s of day  - predicted start and end
+        name                    - scan name
+        overlap                 - True if the scan is not finished before the next scheduled scan
+'''
+def simulate_dss(dss_path,path_scans,pulse_frequency=10000,bearing=0,acc_scale=1000):
+    dss=read_dss(dss_path)
+    durations=dict()
+    
+    start,end,names=[],[],[]
+    for t_start,name,averaging,mode in dss:
+        key=(name,averaging,mode)
+        if key not in durations:
+            ray_duration=averaging*1000/pulse_frequency if mode=='C' else averaging
+            durations[key]=simulate_scan(os.path.join(path_scans,name+'.txt'),ray_duration=ray_duration,\
+                                         bearing=bearing,acc_scale=acc_scale)['duration']
+        start.append(t_start)
+        end.append(t_start+durations[key])
+        names.append(name)
+    start,end=np.array(start,dtype=float),np.array(end)
+    
+    next_start=np.concatenate([start[1:],[start[0]+24*3600]])
+    
+    return {'start':start,'end':end,'name':names,'overlap':end>next_start}
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Write scan files and daily scan schedules (dss) of the Halo Photonics StreamLine 
+software for one or several lidars. For coordinated scans (dual/triple-Doppler) 
+the start delays of the scans are chosen in a way that all lidars observe the 
+points of the retrieval plane at nearly the same time.
+classes:
+    scan_pattern    - scan of a schedule (duration of the slot, averaging, scan file)
+    lidar_schedule  - lidar parameters and list of scan_pattern
+functions:
+    write_scan_files    - write all scan files of a lidar_schedule
+    observation_time    - time at which a scan observes given points
+    optimize_start_delay - start delays of coordinated scans
+    write_dss           - write .dss of a lidar_schedule
+    write_campaign      - scan files, synchronization and .dss of several lidars
+@author: maren
+"""
+import os
+import numpy as np
+try:
+    from . import simulate_scan_file as ssf
+except ImportError:
+    import simulate_scan_file as ssf
+
+'''
+scan of a daily scan schedule
+input:
+    sd in min       - duration of the slot in the schedule
+    rays_avg in s   - refers to average configuration in SL software
+    name            - name of the scan; coordinated scans have the same name for all lidars
+    writer          - function of write_scan_file (e.g. write_ppi); None for 'stare'
+    args, kwargs    - arguments of writer (lidar_id, path_out and bearing are added)
+'''
+class scan_pattern:
+    def __init__(self,sd,rays_avg,name,writer=None,args=(),kwargs=None):
+        self.sd=sd
+        self.rays_avg=rays_avg
+        self.name=name
+        self.writer=writer
+        self.args=args
+        self.kwargs=kwargs if kwargs is not None else dict()
+        self.scan_file='stare' if writer is None else None
+        self.start_delay=0 # in s; in case delay is necessary to syncronize single scans
+
+'''
+lidar and its scan schedule
+input:
+    lidar_id            - name of the lidar; defines the output folder
+    pulse_frequency in Hz - pulse repetition frequency
+    bearing in deg      - devation of the lidar north to true north
+    dl_loc in m         - location [x,y,z] of the lidar (same coordinates as the retrieval grid)
+    scans               - list of scan_pattern; order corresponds to the order in the dss
+    focus               - focus of the telescope (SL XR does not have a focus any longer)
+'''
+class lidar_schedule:
+    def __init__(self,lidar_id,pulse_frequency,bearing,dl_loc,scans,focus=7):
+        self.lidar_id=lidar_id
+        self.pulse_frequency=pulse_frequency
+        self.bearing=bearing
+        self.dl_loc=np.asarray(dl_loc,dtype=float)
+        self.scans=scans
+        self.focus=focus
+        
+    def scan(self,name):
+        return [scan for scan in self.scans if scan.name==name][0]
+
+'''
+write all scan files of a lidar into path_out/lidar_id
+'''
+def write_scan_files(lidar,path_out):
+    path_lidar=os.path.join(path_out,lidar.lidar_id)
+    for scan in lidar.scans:
+        if scan.writer is None: continue
+        scan.scan_file=scan.writer(lidar.lidar_id,*scan.args,path_out=path_lidar,bearing=lidar.bearing,**scan.kwargs)
+
+'''
+time of a scan at which given points are observed; the point is observed by the
+ray with the smallest angle between ray and point (all rays are compared at once)
+input:
+    sim             - output of simulate_scan_file.simulate_scan
+    dl_loc in m     - location of the lidar
+    x,y,z in m      - coordinates of the points
+    tol in deg      - maximum angle between ray and point
+output:
+    t in s          - time after scan start; nan if the point is not observed
+'''
+def observation_time(sim,dl_loc,x,y,z,tol=2.):
+    el_rad,az_rad=np.deg2rad(sim['ray_el']),np.deg2rad(sim['ray_az'])
+    rays=np.stack([np.cos(el_rad)*np.sin(az_rad),np.cos(el_rad)*np.cos(az_rad),np.sin(el_rad)],axis=1)
+    
+    points=np.stack([np.ravel(x)-dl_loc[0],np.ravel(y)-dl_loc[1],np.ravel(z)-dl_loc[2]],axis=1)
+    points=points/np.linalg.norm(points,axis=1)[:,None]
+    
+    cos_angle=points@rays.T
+    ray_ind=np.argmax(cos_angle,axis=1)
+    t=sim['ray_time'][ray_ind]
+    t[cos_angle[np.arange(ray_ind.size),ray_ind]<np.cos(np.deg2rad(tol))]=np.nan
+    
+    return t
+
+'''
+start delays of a coordinated scan of several lidars
+The delays minimize the mean time between the first and the last lidar observing 
+a point (points observed by all lidars); the scan has to be finished within its 
+slot (0 <= start_delay <= sd*60 - scan duration). The slots of the coordinated scan
+have to start at the same time in the schedules of all lidars. The delays are optimized for one 
+lidar after the other, all candidate delays of a lidar are evaluated at once.
+input:
+    lidars          - list of lidar_schedule; the scan files have to be written
+    name            - name of the coordinated scan
+    x,y,z in m      - points of the retrieval plane (e.g. grid of coplanar_retrieval)
+    path_out        - directory containing the folders of the lidars
+    step in s       - resolution of the delays
+output:
+    delays in s     - start delay of each lidar (also set in scan_pattern.start_delay)
+    spread in s     - mean time between first and last observation of a point
+    coverage        - fraction of points observed by all lidars
+'''
+def optimize_start_delay(lidars,name,x,y,z,path_out,step=1.,tol=2.,iter_max=10):
+    t_obs,slack=[],[]
+    for lidar in lidars:
+        scan=lidar.scan(name)
+        sim=ssf.simulate_scan(os.path.join(path_out,lidar.lidar_id,scan.scan_file+'.txt'),\
+                              ray_duration=scan.rays_avg,bearing=lidar.bearing)
+        if sim['duration']>scan.sd*60:
+            raise Exception('%s of %s takes longer than %i min' % (scan.scan_file,lidar.lidar_id,scan.sd))
+        t_obs.append(observation_time(sim,lidar.dl_loc,x,y,z,tol=tol))
+        slack.append(scan.sd*60-sim['duration'])
+    t_obs=np.array(t_obs)
+    covered=np.all(np.isfinite(t_obs),axis=0)
+    if not np.any(covered):
+        raise Exception('no point is observed by all lidars during %s' % name)
+    t_obs=t_obs[:,covered]
+    
+    lidar_n=len(lidars)
+    delays=np.zeros(lidar_n)
+    for it in range(iter_max):
+        delays_old=delays.copy()
+        for li in range(lidar_n):
+            others=np.delete(t_obs+delays[:,None],li,axis=0)
+            candidates=np.arange(0,slack[li]+step/2,step)
+            t_li=t_obs[li][None,:]+candidates[:,None]
+            spread=np.maximum(others.max(axis=0),t_li)-np.minimum(others.min(axis=0),t_li)
+            delays[li]=candidates[np.argmin(spread.mean(axis=1))]
+        if np.array_equal(delays,delays_old): break
+    delays=delays-delays.min()
+    
+    for lidar,delay in zip(lidars,delays):
+        lidar.scan(name).start_delay=delay
+    t_obs=t_obs+delays[:,None]
+    
+    return delays,np.mean(t_obs.max(axis=0)-t_obs.min(axis=0)),np.mean(covered)
+
+'''
+write .dss of a lidar
+The schedule is repeated every sum(sd) minutes starting at 00:00. Entries which 
+are shifted into the previous day by a negative start delay are written at 
+the end of the day; stares are not written into the dss.
+output:
+    path of the .dss
+'''
+def write_dss(lidar,dss_name,path_out):
+    cycle=sum([scan.sd for scan in lidar.scans])*60
+    slot_start=np.cumsum([0]+[scan.sd*60 for scan in lidar.scans[:-1]])
+    
+    lines=[]
+    for cycle_start in np.arange(0,24*3600,cycle):
+        for scan,t_slot in zip(lidar.scans,slot_start):
+            if cycle_start+t_slot>=24*3600: break
+            if scan.scan_file=='stare': continue
+            t_write=int(np.round(cycle_start+t_slot+scan.start_delay))%(24*3600)
+            time_str='%02i%02i%02i' % (t_write//3600,t_write%3600//60,t_write%60)
+            if scan.scan_file[0:3]=='csm':
+                rays_av_temp=(scan.rays_avg*lidar.pulse_frequency)/1000
+                lines.append((t_write,'%s\t%s\t%s\t%s\t%s\r\n' % (time_str,scan.scan_file,int(rays_av_temp),'C',lidar.focus)))
+            elif scan.scan_file[0:2]=='ss':
+                lines.append((t_write,'%s\t%s\t%s\t%s\t%s\r\n' % (time_str,scan.scan_file,scan.rays_avg,'S',lidar.focus)))
+    lines.sort(key=lambda line: line[0])
+    
+    file_path=os.path.join(path_out,lidar.lidar_id,'%s.dss' % dss_name)
+    with open(file_path,'w') as text_file:
+        text_file.write(''.join([line[1] for line in lines]))
+    
+    return file_path
+
+'''
+write scan files and .dss of several lidars
+input:
+    lidars          - list of lidar_schedule
+    dss_name        - name of the scan schedule
+    path_out        - output directory; one folder per lidar
+    sync            - list of names of coordinated scans
+    x,y,z in m      - points of the retrieval plane used for the synchronization
+output:
+    dictionary with path of the .dss for each lidar_id
+'''
+def write_campaign(lidars,dss_name,path_out,sync=[],x=None,y=None,z=None,**kwargs):
+    for lidar in lidars:
+        write_scan_files(lidar,path_out)
+    
+    for name in sync:
+        delays,spread,coverage=optimize_start_delay(lidars,name,x,y,z,path_out,**kwargs)
+        print('%s: start delays %s s, mean time difference %.1f s, coverage %.2f' \
+              % (name,', '.join(['%.0f' % d for d in delays]),spread,coverage))
+    
+    return {lidar.lidar_id:write_dss(lidar,dss_name,path_out) for lidar in lidars}
@@ -0,0 +1,3 @@
+"""
+VAD retrievals of vertical profiles of horizontal wind
+"""
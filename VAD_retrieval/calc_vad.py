@@ -13,6 +13,11 @@ These methods are based on the following literature (i.a.,):
 import sys
 import numpy as np
 
+try:
+    from .. import instrument
+except ImportError:
+    from dwl import instrument
+
 '''
 Convert components of the horizontal 2d wind vector (u,v) to 
 wind direction (dd_deg) and wind speed (ff)
@@ -93,6 +98,7 @@ Estimate three dimensional wind vector by solving an overdetermined system of
 linear equations
 
 '''
+@instrument.timed('calc_vad_3d')
 def calc_vad_3d(rv,el_rad,az_rad):
     
     rn=rv.size
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VAD retrieval of level1 (l1) netCDF files of conical scans (one scan per file)
+and daily .nc files of the vertical profiles (see vad2NetCDF.py)
+    - read_l1_scan(): variables of the l1 file used for the retrieval
+    - calc_vad_scan(): (u,v,w) for all range gates of one scan at once
+    - vad_day(): retrieve all scans of one day and write the daily .nc file
+
+The overdetermined system of calc_vad.calc_vad_3d is solved for all range gates
+together; rays with SNR below snr_threshold only contribute to the unfiltered
+components (u_nf, v_nf).
+@author: maren
+"""
+import numpy as np
+import xarray as xr
+
+try:
+    from . import calc_vad as cv
+    from ..netcdf import vad2NetCDF
+    from .. import instrument
+except ImportError:
+    import calc_vad as cv
+    import vad2NetCDF
+    from dwl import instrument
+
+'''
+read conical scan from l1 file
+Output:
+    dictionary with dn (start of scan), el_deg, az_deg (rn,), rv, snr in dB (gn x rn),
+    r (gn,), range_gate_length
+'''
+def read_l1_scan(file_path):
+    # datenum_time is not decoded (units are not CF conform)
+    with xr.open_dataset(file_path,decode_times=False) as ds_temp:
+        intensity=ds_temp.intensity.values
+        with np.errstate(invalid='ignore',divide='ignore'):
+            snr=10*np.log10(intensity-1)
+        scan_temp={'dn':float(ds_temp.datenum_time.values[0]),\
+                   'el_deg':ds_temp.elevation.values.astype(np.float64),\
+                   'az_deg':ds_temp.azimuth.values.astype(np.float64),\
+                   'rv':ds_temp.radial_velocity.values.astype(np.float64),\
+                   'snr':snr,\
+                   'r':ds_temp.gate_centers.values.astype(np.float64),\
+                   'range_gate_length':ds_temp.attrs.get('range_gate_length','')}
+
+    return scan_temp
+
+'''
+least squares solution of rv = u cos(el) sin(az) + v cos(el) cos(az) + w sin(el)
+for each range gate; only rays with weight True are used
+Input:
+    rv in m/s       - (gn x rn) radial velocity
+    el_rad,az_rad   - (rn,) angles of the rays
+    weight          - (gn x rn) boolean array of used rays
+Output:
+    u,v,w in m/s    - (gn,) NaN where less than 3 rays are used
+    rv_fluc in m2/s2 - (gn,) variance of rv around (u,v,w)
+'''
+@instrument.timed('calc_vad_scan')
+def calc_vad_scan(rv,el_rad,az_rad,weight):
+    M=np.stack([np.cos(el_rad)*np.sin(az_rad),np.cos(el_rad)*np.cos(az_rad),np.sin(el_rad)],axis=1)
+    weight=weight&np.isfinite(rv)
+    rv_0=np.where(weight,rv,0)
+
+    A=np.einsum('gr,ri,rj->gij',weight.astype(float),M,M)
+    b=np.einsum('gr,ri->gi',rv_0,M)
+    solvable=(weight.sum(axis=1)>=3)&(np.abs(np.linalg.det(A))>1e-10)
+    A[~solvable]=np.eye(3)
+
+    uvw=np.linalg.solve(A,b[...,None])[...,0]
+    uvw[~solvable]=np.nan
+
+    rv_mean=uvw@M.T
+    with np.errstate(invalid='ignore'):
+        rv_fluc=np.sum(np.where(weight,(rv_mean-rv_0)**2,0),axis=1)/weight.sum(axis=1)
+
+    return uvw[:,0],uvw[:,1],uvw[:,2],rv_fluc
+
+'''
+VAD retrieval of all l1 files of one day
+Input:
+    file_paths      - l1 files of conical scans (same elevation and range gates)
+    lidar_info      - class with name, lidar_id, lat, lon, zsl (see vad2NetCDF.to_netcdf)
+    path_out        - directory path for output .nc files
+    snr_threshold in dB - rays with lower SNR are not used
+Output:
+    file_path       - path of the daily .nc file
+'''
+@instrument.timed('vad_day')
+def vad_day(file_paths,lidar_info,path_out,snr_threshold=-22):
+    scans=sorted([read_l1_scan(file_path) for file_path in file_paths],key=lambda scan_temp: scan_temp['dn'])
+
+    instrument.count('vad_scans',len(scans))
+
+    results=[]
+    for scan_temp in scans:
+        el_rad,az_rad=np.deg2rad(scan_temp['el_deg']),np.deg2rad(scan_temp['az_deg'])
+        valid=np.isfinite(scan_temp['rv'])
+        u,v,w,rv_fluc=calc_vad_scan(scan_temp['rv'],el_rad,az_rad,valid&(scan_temp['snr']>snr_threshold))
+        u_nf,v_nf,w_nf,rv_fluc_nf=calc_vad_scan(scan_temp['rv'],el_rad,az_rad,valid)
+        with np.errstate(invalid='ignore'):
+            snr_mean=np.nanmean(scan_temp['snr'],axis=1)
+        results.append((u,v,w,rv_fluc,snr_mean,u_nf,v_nf,scan_temp['az_deg'].size))
+
+    u,v,w,rv_fluc,snr,u_nf,v_nf=[np.stack([res[i] for res in results],axis=1) for i in range(7)]
+    ws,wd=cv.uv2ffdd(u,v)
+    el_deg=np.median(scans[0]['el_deg'])
+    gz=scans[0]['r']*np.sin(np.deg2rad(el_deg))
+    dn=np.array([scan_temp['dn'] for scan_temp in scans])
+    an=np.array([res[7] for res in results])
+
+    vad_temp=vad2NetCDF.vad(dn,gz,u,v,w,ws,wd,rv_fluc,snr,scans[0]['range_gate_length'],\
+                            snr_threshold,el_deg,an,u_nf,v_nf)
+
+    return vad2NetCDF.to_netcdf(lidar_info,vad_temp,path_out)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cold start of the command line interface (dwl/cli.py)
+The median wall time of n new python processes is measured for
+    - dwl --help:       only argparse is imported
+    - heavy imports:    numpy, netCDF4, xarray and matplotlib.pyplot, i.e. the 
+                        imports of a subcommand or of the former scripts
+usage: python cli_startup.py [n]
+"""
+import os,sys,time
+import subprocess
+
+path_repo=os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+
+def run_time(args,n):
+    env=dict(os.environ,PYTHONPATH=path_repo+os.pathsep+os.environ.get('PYTHONPATH',''))
+    times=[]
+    for i in range(n):
+        t_start=time.perf_counter()
+        subprocess.run([sys.executable]+args,env=env,stdout=subprocess.DEVNULL,check=True)
+        times.append(time.perf_counter()-t_start)
+    
+    return sorted(times)[n//2]
+
+def main(n=10):
+    t_python=run_time(['-c','pass'],n)
+    t_help=run_time(['-m','dwl','--help'],n)
+    t_heavy=run_time(['-c','import numpy, netCDF4, xarray, matplotlib.pyplot'],n)
+    
+    print('python:        %.3f s' %t_python)
+    print('dwl --help:    %.3f s' %t_help)
+    print('heavy imports: %.3f s' %t_heavy)
+    
+    return t_python,t_help,t_heavy
+
+if __name__=='__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the VAD quicklooks (quicklooks/plot_vad.py)
+Synthetic daily *_vad.nc files are written with vad2NetCDF.to_netcdf and the 
+time per figure is measured for
+    - new figure:   plot_VAD_day creates and closes a figure for each day
+    - template:     one vad_quicklook is reused for all days
+usage: python quicklook_template.py [days]
+"""
+import os,sys,time,tempfile,types
+import numpy as np
+
+path_repo=os.path.join(os.path.dirname(os.path.abspath(__file__)),'..')
+sys.path.insert(0,os.path.join(path_repo,'quicklooks'))
+sys.path.insert(0,os.path.join(path_repo,'2NetCDF'))
+sys.path.append(path_repo) # dwl.instrument, if the toolbox is not installed
+
+import matplotlib as mpl
+mpl.use('Agg')
+import matplotlib.dates as mdates
+import plot_vad
+import vad2NetCDF
+
+lidar_info=types.SimpleNamespace(name='SLXR_142',lidar_id=142,lat=47.3,lon=11.6,zsl=546)
+
+'''
+synthetic day of VAD profiles (10 min resolution, 60 range gates)
+'''
+def synthetic_vad(date_str,tn=144,gn=60,seed=0):
+    rng=np.random.default_rng(seed)
+    dn=mdates.datestr2num(date_str)+(np.arange(tn)*600+60)/(24*60*60)
+    gz=(np.arange(gn)+0.5)*30*np.sin(np.deg2rad(70))
+    u,v,w=rng.normal(3,1,(gn,tn)),rng.normal(-2,1,(gn,tn)),rng.normal(0,.5,(gn,tn))
+    ws,wd=np.sqrt(u**2+v**2),np.rad2deg(np.arctan2(u,v))%360
+    
+    return vad2NetCDF.vad(dn,gz,u,v,w,ws,wd,np.abs(w),np.full((gn,tn),-10.),30,-18,70,np.full(tn,36),u,v)
+
+def write_days(path_out,days_n):
+    date_strs=[(np.datetime64('2019-08-01')+di).astype(object).strftime('%Y%m%d') for di in range(days_n)]
+    files=[vad2NetCDF.to_netcdf(lidar_info,synthetic_vad(ds,seed=di),path_out) for di,ds in enumerate(date_strs)]
+    
+    return list(zip(files,date_strs))
+
+def main(days_n=10):
+    with tempfile.TemporaryDirectory() as path_temp:
+        file_list=write_days(path_temp,days_n)
+        
+        t_start=time.perf_counter()
+        for file_path,date_str in file_list:
+            plot_vad.plot_VAD_day(file_path,path_temp,lidar_info.name,date_str,lidar_info.zsl,'Kolsass')
+        t_new=(time.perf_counter()-t_start)/days_n
+        
+        t_start=time.perf_counter()
+        quicklook=plot_vad.vad_quicklook(lidar_info.name,lidar_info.zsl,'Kolsass')
+        for file_path,date_str in file_list:
+            plot_vad.plot_VAD_day(file_path,path_temp,lidar_info.name,date_str,lidar_info.zsl,'Kolsass',quicklook=quicklook)
+        quicklook.close()
+        t_template=(time.perf_counter()-t_start)/days_n
+    
+    print('new figure: %.3f s/figure' %t_new)
+    print('template:   %.3f s/figure' %t_template)
+    print('speedup:    %.2fx' %(t_new/t_template))
+    
+    return t_new,t_template
+
+if __name__=='__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark of the coplanar_retrieval scan class
+A long synthetic PPI scan (default: 1000 range gates x 3600 rays) is created and 
+the memory allocated by the scan class is measured with tracemalloc for 
+    - stored:   former scan class (copy below), which computed and stored all 
+                coordinates, flattened variables and angles in __init__
+    - all:      current scan class with all of these attributes requested
+    - retrieval: current scan class, only the coordinates used in calc_retrieval
+                (gx, gy) and vr
+    - float32:  as retrieval, but coordinates are stored as float32
+The reductions are given relative to stored.
+usage: python scan_memory.py [gates] [rays]
+"""
+import os,sys
+import tracemalloc
+import numpy as np
+
+path_repo=os.path.join(os.path.dirname(os.path.abspath(__file__)),'..')
+sys.path.insert(0,os.path.join(path_repo,'coplanar_retrieval'))
+sys.path.append(path_repo) # dwl.instrument, if the toolbox is not installed
+import calc_retrieval as cr
+
+'''
+scan class of the toolbox before coordinates were derived lazily (reference)
+'''
+class scan_stored:
+    def __init__(self,el_deg,az_deg,vr,snr,dl_loc,r):
+        [self.gn,self.rn]=vr.shape
+        self.el_deg,self.az_deg=el_deg,az_deg
+        self.vr,self.snr=vr,snr
+        self.dl_loc=dl_loc
+        [dlx,dly,dlz]=dl_loc
+        self.el_rad,self.az_rad=np.deg2rad(el_deg),np.deg2rad(az_deg)
+        gx_loc=np.outer(r,np.cos(self.el_rad)*np.sin(self.az_rad))
+        gy_loc=np.outer(r,np.cos(self.el_rad)*np.cos(self.az_rad))
+        gz_loc=np.outer(r,np.sin(self.el_rad))
+        self.gx,self.gy,self.gz=gx_loc+dlx,gy_loc+dly,gz_loc+dlz
+        gxy=np.sqrt(self.gx**2+self.gy**2)
+        gxy[self.gx<0]*=-1
+        self.gxy=gxy
+        self.gx_flat,self.gy_flat,self.gz_flat=self.gx.flatten(),self.gy.flatten(),self.gz.flatten()
+        self.gxy_flat=self.gxy.flatten()
+        self.vr_flat,self.snr_flat=self.vr.flatten(),self.snr.flatten()
+        self.el_deg_flat,self.az_deg_flat=np.tile(self.el_deg,(self.gn,1)).flatten(),np.tile(self.az_deg,(self.gn,1)).flatten()
+        self.el_rad_flat,self.az_rad_flat=np.tile(self.el_rad,(self.gn,1)).flatten(),np.tile(self.az_rad,(self.gn,1)).flatten()
+
+'''
+synthetic PPI scan at fixed elevation with constant wind
+'''
+def synthetic_ppi(gn,rn):
+    r=(np.arange(gn)+0.5)*30
+    az_deg=np.linspace(0,360,rn,endpoint=False)
+    el_deg=np.full(rn,2.)
+    vr=np.outer(np.ones(gn),5*np.sin(np.deg2rad(az_deg)))
+    snr=np.full((gn,rn),-10.)
+    
+    return el_deg,az_deg,vr,snr,r
+
+'''
+measure peak memory in MB allocated while creating the scan and requesting the 
+given attributes; the measured arrays vr and snr are allocated before
+dtype=None: former scan class (scan_stored)
+'''
+def measure(data,attributes,dtype=np.float64):
+    el_deg,az_deg,vr,snr,r=data
+    tracemalloc.start()
+    if dtype is None:
+        scan_temp=scan_stored(el_deg,az_deg,vr,snr,[0,0,0],r)
+    else:
+        scan_temp=cr.scan(el_deg,az_deg,vr,snr,[0,0,0],r,dtype=dtype)
+    kept=[getattr(scan_temp,att) for att in attributes]
+    current,peak=tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept,scan_temp
+    
+    return current/1e6,peak/1e6
+
+def main(gn=1000,rn=3600):
+    data=synthetic_ppi(gn,rn)
+    
+    attributes_all=['gx','gy','gz','gxy','gx_flat','gy_flat','gz_flat','gxy_flat','vr_flat','snr_flat',\
+                    'el_deg_flat','az_deg_flat','el_rad_flat','az_rad_flat']
+    cases=[('stored',[],None),\
+           ('all',attributes_all,np.float64),\
+           ('retrieval',['gx_flat','gy_flat','vr_flat'],np.float64),\
+           ('float32',['gx_flat','gy_flat','vr_flat'],np.float32)]
+    
+    print('scan: %i gates x %i rays; measured arrays (vr,snr): %.1f MB' %(gn,rn,(data[2].nbytes+data[3].nbytes)/1e6))
+    print('%-10s %12s %12s' %('case','kept (MB)','peak (MB)'))
+    results=dict()
+    for name,attributes,dtype in cases:
+        current,peak=measure(data,attributes,dtype)
+        results[name]=current
+        print('%-10s %12.1f %12.1f' %(name,current,peak))
+    print('reduction compared to stored: all %.1fx, retrieval %.1fx, float32 %.1fx' \
+          %tuple(results['stored']/results[name] for name in ['all','retrieval','float32']))
+    
+    return results
+
+if __name__=='__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the processing steps with stored baselines
+All cases run on deterministic synthetic data in a temporary directory (no
+network, no measurement data):
+    - hpl2dict, hpl_to_netcdf:  .hpl file with 300 rays x 200 range gates
+    - to_netcdf_l1:             l0 file of hpl_to_netcdf
+    - calc_vad_3d:              VAD of 100 range gates with 36 rays each
+    - calc_retrieval_horizontal: two PPI scans, 100 m grid (plan_grid)
+    - calc_retrieval_vertical:  two RHI scans in one plane, 100 m grid
+    - scan_to_grid:             PPI scan onto a 4 km x 4 km grid, 100 m spacing
+    - vad_to_netcdf:            one day of 10 min VAD profiles
+    - plot_VAD_day:             quicklook of this day
+The minimum run time of n repetitions (after one warm-up run) is compared with
+baseline.json; a case fails if it is slower than baseline*(1+tolerance) and at
+least min_delta seconds slower. The exit status is 1 if a case fails.
+The baseline depends on the machine and is not part of the repository: the first
+run writes baseline.json (as --update), later runs compare with it.
+usage:
+    python suite.py                     compare with baseline.json (first run: write it)
+    python suite.py --update            write baseline.json
+    python suite.py calc_vad_3d plot_VAD_day --tolerance 0.5
+"""
+import os,sys,time,json,tempfile,types
+import contextlib,warnings
+import argparse
+import platform
+import numpy as np
+
+path_repo=os.path.join(os.path.dirname(os.path.abspath(__file__)),'..')
+sys.path.insert(0,os.path.join(path_repo,'2NetCDF'))
+sys.path.insert(0,os.path.join(path_repo,'VAD_retrieval'))
+sys.path.insert(0,os.path.join(path_repo,'coplanar_retrieval'))
+sys.path.insert(0,os.path.join(path_repo,'quicklooks'))
+sys.path.append(path_repo) # dwl.instrument, if the toolbox is not installed
+
+import matplotlib as mpl
+mpl.use('Agg')
+import matplotlib.dates as mdates
+import hpl2NetCDF
+import vad2NetCDF
+import calc_vad as cv
+import calc_retrieval as cr
+import plot_vad
+
+path_baseline=os.path.join(os.path.dirname(os.path.abspath(__file__)),'baseline.json')
+
+lidar_info=types.SimpleNamespace(name='SLXR_142',lidar_id=142,lat=47.3,lon=11.6,zsl=546,bearing=18.4,gc_corr=0,\
+                                 diff_WGS84=np.nan,diff_geoid=np.nan,diff_bessel=np.nan)
+
+'''
+synthetic .hpl file (csm PPI at 5 deg elevation) of the StreamLine software
+'''
+def write_hpl(path_out,rays_n=300,gates_n=200,seed=0):
+    rng=np.random.default_rng(seed)
+    name='User1_142_20190805_120000'
+    lines=['Filename:\t%s.hpl' %name,'System ID:\t142','Number of gates:\t%i' %gates_n,\
+           'Range gate length (m):\t30.0','Gate length (pts):\t10','Pulses/ray:\t10000',\
+           'No. of waypoints in file:\t1','Scan type:\tUser file 1 - csm','Focus range:\t65535',\
+           'Start time:\t20190805 12:00:00.00','Resolution (m/s):\t0.0382',\
+           'Altitude of measurement (center of gate) = (range gate + 0.5) * Gate length',\
+           'Data line 1: Decimal time (hours)  Azimuth (degrees)  Elevation (degrees) Pitch (degrees) Roll (degrees)',\
+           'f9.6,1x,f6.2,1x,f6.2',\
+           'Data line 2: Range Gate  Doppler (m/s)  Intensity (SNR + 1)  Beta (m-1 sr-1)',\
+           'i3,1x,f6.4,1x,f8.6,1x,e12.6 - repeat for no. gates','****']
+    rv=rng.normal(0,2,(rays_n,gates_n))
+    intensity=1+10**(rng.normal(-15,3,(rays_n,gates_n))/10)
+    for ri in range(rays_n):
+        lines.append('%.6f %.2f %.2f 0.00 0.00' %(12+ri/3600,ri*360/rays_n,5.))
+        lines+=['%3i %.4f %.6f %.6E' %(gi,rv[ri,gi],intensity[ri,gi],1e-6) for gi in range(gates_n)]
+    file_path=os.path.join(path_out,name+'.hpl')
+    with open(file_path,'w') as text_file:
+        text_file.write('\n'.join(lines)+'\n')
+
+    return file_path
+
+'''
+synthetic PPI (el_deg scalar) or RHI (az_deg scalar) scan with constant wind
+'''
+def synthetic_scan(dl_loc,el_deg,az_deg,r=np.arange(50,3000,30.),u=3.,v=-2.,w=0.5,seed=0):
+    rng=np.random.default_rng(seed)
+    el_deg,az_deg=np.broadcast_arrays(np.asarray(el_deg,dtype=float),np.asarray(az_deg,dtype=float))
+    el_rad,az_rad=np.deg2rad(el_deg),np.deg2rad(az_deg)
+    vr=np.cos(el_rad)*(u*np.sin(az_rad)+v*np.cos(az_rad))+w*np.sin(el_rad)
+    vr=np.outer(np.ones(r.size),vr)+rng.normal(0,.2,(r.size,el_deg.size))
+
+    return cr.scan(el_deg,az_deg,vr,np.full(vr.shape,-10.),dl_loc,r)
+
+'''
+synthetic day of VAD profiles (10 min resolution, 60 range gates)
+'''
+def synthetic_vad(date_str='20190805',tn=144,gn=60,seed=0):
+    rng=np.random.default_rng(seed)
+    dn=mdates.datestr2num(date_str)+(np.arange(tn)*600+60)/(24*60*60)
+    gz=(np.arange(gn)+0.5)*30*np.sin(np.deg2rad(70))
+    u,v,w=rng.normal(3,1,(gn,tn)),rng.normal(-2,1,(gn,tn)),rng.normal(0,.5,(gn,tn))
+    ws,wd=np.sqrt(u**2+v**2),np.rad2deg(np.arctan2(u,v))%360
+
+    return vad2NetCDF.vad(dn,gz,u,v,w,ws,wd,np.abs(w),np.full((gn,tn),-10.),30,-18,70,np.full(tn,36),u,v)
+
+'''
+cases: function(path_temp) returning the function which is timed
+'''
+def case_hpl2dict(path_temp):
+    file_path=write_hpl(path_temp)
+    return lambda: hpl2NetCDF.hpl2dict(file_path)
+
+def case_hpl_to_netcdf(path_temp):
+    file_path=write_hpl(path_temp)
+    return lambda: hpl2NetCDF.hpl_to_netcdf(file_path,os.path.join(path_temp,'l0'),overwrite=True)
+
+def case_to_netcdf_l1(path_temp):
+    file_path=write_hpl(path_temp)
+    hpl2NetCDF.hpl_to_netcdf(file_path,os.path.join(path_temp,'l0'),overwrite=True)
+    file_path_l0=os.path.join(path_temp,'l0','2019','201908','20190805','User1_142_20190805_120000_l0.nc')
+    return lambda: hpl2NetCDF.to_netcdf_l1(file_path_l0,'User1_142_20190805_120000_l1.nc',lidar_info,os.path.join(path_temp,'l1'))
+
+def case_calc_vad_3d(path_temp):
+    rng=np.random.default_rng(0)
+    az_rad=np.deg2rad(np.arange(0,360,10.))
+    el_rad=np.full(az_rad.shape,np.deg2rad(70))
+    rv=np.cos(el_rad)*(3*np.sin(az_rad)-2*np.cos(az_rad))+rng.normal(0,.2,(100,az_rad.size))
+    return lambda: [cv.calc_vad_3d(rv_gate,el_rad,az_rad) for rv_gate in rv]
+
+def case_calc_retrieval_horizontal(path_temp):
+    az_deg=np.linspace(0,360,361)
+    scans=[synthetic_scan([0,0,0],0,az_deg,seed=0),synthetic_scan([1500,0,0],0,az_deg,seed=1)]
+    grid,mask=cr.plan_grid(scans,delta_l=100)
+    return lambda: cr.calc_retrieval(scans,grid,mask=mask)
+
+def case_calc_retrieval_vertical(path_temp):
+    el_deg=np.linspace(0,180,181)
+    scans=[synthetic_scan([0,0,0],el_deg,90,r=np.arange(50,2000,30.),seed=0),\
+           synthetic_scan([1500,0,0],el_deg,270,r=np.arange(50,2000,30.),seed=1)]
+    grid,mask=cr.plan_grid(scans,delta_l=100)
+    return lambda: cr.calc_retrieval(scans,grid,mask=mask)
+
+def case_scan_to_grid(path_temp):
+    scan_temp=synthetic_scan([0,0,0],0,np.linspace(0,360,361))
+    xy=np.arange(-2000,2001,100.)
+    grid=cr.grid(xy,xy,np.array([0.]),100)
+    return lambda: scan_temp.to_grid(grid)
+
+def case_vad_to_netcdf(path_temp):
+    vad_temp=synthetic_vad()
+    return lambda: vad2NetCDF.to_netcdf(lidar_info,vad_temp,os.path.join(path_temp,'vad'))
+
+def case_plot_VAD_day(path_temp):
+    file_path=vad2NetCDF.to_netcdf(lidar_info,synthetic_vad(),os.path.join(path_temp,'vad'))
+    return lambda: plot_vad.plot_VAD_day(file_path,path_temp,lidar_info.name,'20190805',lidar_info.zsl,'Kolsass')
+
+cases={'hpl2dict':case_hpl2dict,\
+       'hpl_to_netcdf':case_hpl_to_netcdf,\
+       'to_netcdf_l1':case_to_netcdf_l1,\
+       'calc_vad_3d':case_calc_vad_3d,\
+       'calc_retrieval_horizontal':case_calc_retrieval_horizontal,\
+       'calc_retrieval_vertical':case_calc_retrieval_vertical,\
+       'scan_to_grid':case_scan_to_grid,\
+       'vad_to_netcdf':case_vad_to_netcdf,\
+       'plot_VAD_day':case_plot_VAD_day}
+
+'''
+minimum run time in s of repeat runs after one warm-up run; messages and
+warnings of the cases are suppressed
+'''
+def measure(case,repeat=5):
+    with tempfile.TemporaryDirectory() as path_temp,open(os.devnull,'w') as devnull,\
+         contextlib.redirect_stdout(devnull),warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        func=case(path_temp)
+        func()
+        times=[]
+        for i in range(repeat):
+            t_start=time.perf_counter()
+            func()
+            times.append(time.perf_counter()-t_start)
+
+    return min(times)
+
+def machine():
+    return {'platform':platform.platform(),'processor':platform.processor(),'cpu_count':os.cpu_count(),\
+            'python':platform.python_version(),'numpy':np.__version__}
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description='benchmark suite of the Doppler wind lidar toolbox')
+    parser.add_argument('cases',nargs='*',help='cases to run (default: all): %s' %', '.join(cases.keys()))
+    parser.add_argument('--update',action='store_true',help='write the results as new baseline')
+    parser.add_argument('--baseline',default=path_baseline,help='baseline file (default: benchmarks/baseline.json)')
+    parser.add_argument('--tolerance',type=float,default=0.3,help='allowed relative slowdown (default: 0.3)')
+    parser.add_argument('--min-delta',type=float,default=0.002,help='allowed absolute slowdown in s (default: 0.002)')
+    parser.add_argument('--repeat',type=int,default=5,help='number of timed runs per case (default: 5)')
+    args=parser.parse_args(argv)
+    names=args.cases if args.cases else list(cases.keys())
+    unknown=[name for name in names if name not in cases]
+    if unknown: parser.error('unknown case(s): %s' %', '.join(unknown))
+
+    baseline={'machine':{},'cases':{}}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline,'r') as json_file:
+            baseline=json.load(json_file)
+    else:
+        print('no baseline %s; the results are written as baseline' %args.baseline)
+        args.update=True
+    if not args.update and baseline['machine'] and baseline['machine']!=machine():
+        print('baseline was measured on another machine or environment (%s); use --update' %baseline['machine']['platform'])
+
+    results=dict()
+    failed=[]
+    print('%-28s %10s %10s %8s' %('case','time (s)','base (s)','ratio'))
+    for name in names:
+        t_case=measure(cases[name],args.repeat)
+        results[name]=t_case
+        t_base=baseline['cases'].get(name)
+        if t_base is None:
+            print('%-28s %10.4f %10s %8s' %(name,t_case,'-','-'))
+            continue
+        regression=(t_case>t_base*(1+args.tolerance))&(t_case-t_base>args.min_delta)
+        if regression: failed.append(name)
+        print('%-28s %10.4f %10.4f %8.2f%s' %(name,t_case,t_base,t_case/t_base,'  REGRESSION' if regression else ''))
+
+    if args.update:
+        baseline['machine']=machine()
+        baseline['cases'].update(results)
+        with open(args.baseline,'w') as json_file:
+            json.dump(baseline,json_file,indent=1,sort_keys=True)
+        print('baseline written to %s' %args.baseline)
+        return 0
+
+    if failed:
+        print('%i case(s) slower than baseline by more than %.0f %%: %s' %(len(failed),100*args.tolerance,', '.join(failed)))
+        return 1
+    return 0
+
+if __name__=='__main__':
+    sys.exit(main())
@@ -0,0 +1,3 @@
+"""
+Coplanar retrievals of two-dimensional wind fields
+"""
@@ -44,46 +44,101 @@ variables:
     weigth      used method to weight the collected measurements for each grid point
 """
 import numpy as np
+from functools import cached_property
+
+try:
+    from .. import instrument
+except ImportError:
+    from dwl import instrument
 '''
 Defintion of classes: scan, grid, retrieval
 '''
 
 # variable contains measurements of DL scan
 # for each DL one scan class is defined which includes one scan
+# only the measured arrays (el_deg, az_deg, r, vr, snr) are stored; coordinates 
+# of the range gates (gx,gy,gz,gxy) are calculated when they are used for the 
+# first time and kept afterwards; *_flat variables are views of these arrays 
+# dtype=np.float32 halves the memory of the derived coordinates
 class scan:     
-    def __init__(self,el_deg,az_deg,vr,snr,dl_loc,r):
+    def __init__(self,el_deg,az_deg,vr,snr,dl_loc,r,dtype=np.float64):
         #get dimesnions of scan
         [self.gn,self.rn]=vr.shape
         
         #set attributes to class 
-        self.el_deg,self.az_deg=el_deg,az_deg
-        self.vr,self.snr=vr,snr
+        self.el_deg,self.az_deg=np.asarray(el_deg),np.asarray(az_deg)
+        self.vr,self.snr=np.ascontiguousarray(vr),np.ascontiguousarray(snr)
         self.dl_loc=dl_loc
+        self.r=np.asarray(r)
+        self.dtype=dtype
         
-        [dlx,dly,dlz]=dl_loc
-        
-        self.el_rad,self.az_rad=np.deg2rad(el_deg),np.deg2rad(az_deg)
-        
-        #coordinates of measurement in lidar local coordinate system
-        gx_loc=np.outer(r,np.cos(self.el_rad)*np.sin(self.az_rad))
-        gy_loc=np.outer(r,np.cos(self.el_rad)*np.cos(self.az_rad))
-        gz_loc=np.outer(r,np.sin(self.el_rad))
-        
-        #coordinates of measurements in gloabl coordinate sytem
-        self.gx,self.gy,self.gz=gx_loc+dlx,gy_loc+dly,gz_loc+dlz
-        
-        #horizontal distance from origin; defined in a way that distance is 
-        # smaller zero when measurement is taken west (negative x dir.) from origin 
-        gxy=np.sqrt(self.gx**2+self.gy**2)
+        self.el_rad,self.az_rad=np.deg2rad(self.el_deg),np.deg2rad(self.az_deg)
+    
+    #coordinates of measurements in gloabl coordinate sytem
+    @cached_property
+    def gx(self):
+        return self._coordinate(np.cos(self.el_rad)*np.sin(self.az_rad),self.dl_loc[0])
+    
+    @cached_property
+    def gy(self):
+        return self._coordinate(np.cos(self.el_rad)*np.cos(self.az_rad),self.dl_loc[1])
+    
+    @cached_property
+    def gz(self):
+        return self._coordinate(np.sin(self.el_rad),self.dl_loc[2])
+    
+    #horizontal distance from origin; defined in a way that distance is 
+    # smaller zero when measurement is taken west (negative x dir.) from origin 
+    @cached_property
+    def gxy(self):
+        gxy=np.hypot(self.gx,self.gy)
         gxy[self.gx<0]*=-1
-        self.gxy=gxy
-        
-        #flatten variables
-        self.gx_flat,self.gy_flat,self.gz_flat=self.gx.flatten(),self.gy.flatten(),self.gz.flatten()
-        self.gxy_flat=self.gxy.flatten()
-        self.vr_flat,self.snr_flat=self.vr.flatten(),self.snr.flatten()
-        self.el_deg_flat,self.az_deg_flat=np.tile(self.el_deg,(self.gn,1)).flatten(),np.tile(self.az_deg,(self.gn,1)).flatten()
-        self.el_rad_flat,self.az_rad_flat=np.tile(self.el_rad,(self.gn,1)).flatten(),np.tile(self.az_rad,(self.gn,1)).flatten()
+        return gxy
+    
+    def _coordinate(self,direction,offset):
+        #coordinates of measurement in lidar local coordinate system shifted by the lidar location
+        g=np.outer(self.r.astype(self.dtype),np.asarray(direction,dtype=self.dtype))
+        g+=offset
+        return g
+    
+    #flatten variables (views, no copies)
+    @property
+    def gx_flat(self): return self.gx.ravel()
+    @property
+    def gy_flat(self): return self.gy.ravel()
+    @property
+    def gz_flat(self): return self.gz.ravel()
+    @property
+    def gxy_flat(self): return self.gxy.ravel()
+    @property
+    def vr_flat(self): return self.vr.ravel()
+    @property
+    def snr_flat(self): return self.snr.ravel()
+    
+    #angles of each range gate as broadcast views (gn x rn) 
+    @property
+    def el_deg_2d(self): return np.broadcast_to(self.el_deg,(self.gn,self.rn))
+    @property
+    def az_deg_2d(self): return np.broadcast_to(self.az_deg,(self.gn,self.rn))
+    
+    # flat angles are copies of the broadcast views, calculated on request only; 
+    # for selected measurements use e.g. scan.az_deg[scan.ray_index(ind_flat)] instead
+    @property
+    def el_deg_flat(self): return self.el_deg_2d.ravel()
+    @property
+    def az_deg_flat(self): return self.az_deg_2d.ravel()
+    @property
+    def el_rad_flat(self): return np.broadcast_to(self.el_rad,(self.gn,self.rn)).ravel()
+    @property
+    def az_rad_flat(self): return np.broadcast_to(self.az_rad,(self.gn,self.rn)).ravel()
+    
+    #index of ray for indices of flattened (gn x rn) arrays
+    def ray_index(self,ind_flat):
+        return np.asarray(ind_flat)%self.rn
+    
+    #number of bytes of all arrays stored in the class (including cached coordinates)
+    def nbytes(self):
+        return sum(v.nbytes for v in self.__dict__.values() if isinstance(v,np.ndarray))
         
     def to_grid(self,grid):
         R=grid.delta_l/np.sqrt(2)
@@ -102,7 +157,7 @@ class scan:
 # grid for which coplanar retrieval is calculted (inclined planes are NOT possible)
 # x,y,z one dimensional (requirement: uniform grid)
 # xx,yy,zz two dimensional
-# TODO: write python function which finds optimum grid for used scans
+# grid which covers only grid points that can be retrieved is found with plan_grid()
 class grid:
     def __init__(self,x,y,z,delta_l):
         self.delta_l=delta_l
@@ -169,152 +224,353 @@ def vr2uv(angles_rad,W_weight,vr_array):
     
     return u,v
 
-def valid_angle(angle):
-    return ((angle>30)and(angle<150))
+# range of valid angles in deg between the beams of two lidars, see 
+# Stawiarski et al. (2013), doi:10.1175/JTECH-D-12-00244.1
+angle_limits={'horizontal':(30,150),'vertical':(20,160)}
+
+def valid_angle(angle,plane_orientation='horizontal'):
+    angle_min,angle_max=angle_limits[plane_orientation]
+    return ((angle>angle_min)&(angle<angle_max))
+
+'''
+Angles between the mean beam directions of all pairs of lidars
+Input:
+    az_mean_rad in rad  - (lidar_n,...) mean azimuth of the measurements of each lidar
+                          (in the vertical plane: angle of the beam in the plane)
+Output:
+    az_diff in deg      - (lidar_n x lidar_n,...) pairwise angles between 0 and 180 deg
+'''
+def pairwise_angle(az_mean_rad):
+    az_mean_rad=np.asarray(az_mean_rad)
+    diff=az_mean_rad[:,np.newaxis]-az_mean_rad[np.newaxis,:]
+    
+    return np.rad2deg(np.abs(np.arctan2(np.sin(diff),np.cos(diff))))
+
+'''
+Choose the lidars used for the retrieval of one grid point. A lidar is used if its
+beam crosses the beam of at least one other lidar with a valid angle (see valid_angle).
+The error prefactor is the mean of 1/sin(angle)^2 over all valid pairs.
+Input:
+    az_mean_rad in rad  - (lidar_n,) mean azimuth of the measurements of each lidar
+                          (in the vertical plane: angle of the beam in the plane)
+    plane_orientation   - 'horizontal' or 'vertical' (limits of valid_angle)
+Output:
+    lidar_sel           - (lidar_n,) boolean array of selected lidars
+    error               - error prefactor (NaN if less than two lidars are selected)
+'''
+def select_lidars(az_mean_rad,plane_orientation='horizontal'):
+    az_diff=pairwise_angle(az_mean_rad)
+    pair_valid=valid_angle(az_diff,plane_orientation)
+    
+    lidar_sel=pair_valid.any(axis=1)
+    if lidar_sel.sum()<2:
+        return lidar_sel,np.nan
+    
+    error=np.mean(1/(np.sin(np.deg2rad(az_diff[np.triu(pair_valid,1)]))**2))
+    
+    return lidar_sel,error
+
+'''
+positive direction along a vertical plane: mean azimuth in rad of the first 
+lidar (u>0 points away from the first lidar as in the retrieval of two lidars)
+'''
+def plane_direction(scan_list):
+    az_rad=scan_list[0].az_rad
+    return np.arctan2(np.mean(np.sin(az_rad)),np.mean(np.cos(az_rad)))
+
+'''
+angle in deg of beams in a vertical plane, 0 deg in direction phi (rad); el for 
+beams towards phi, 180-el for beams in the opposite direction
+'''
+def plane_angle(el_rad,az_rad,phi):
+    along=np.sign(np.cos(az_rad-phi))
+    along[along==0]=1
+    return np.rad2deg(np.arctan2(np.sin(el_rad),along*np.cos(el_rad)))
+
+'''
+Indices of valid measurements of a scan sorted into square buckets (width 
+bucket in m) of the horizontal plane, row by row along x. The measurements 
+within bucket of a point are in the 3 x 3 buckets around it, see bucket_ranges.
+Input:
+    scan        - scan class
+    bucket in m - width of the buckets
+Output:
+    ind_sort    - indices of valid measurements in scan.*_flat sorted by bucket
+    key_sort    - bucket number of these measurements
+    by_range    - first y bucket and number of y buckets (to number the buckets)
+'''
+def sort_valid_gates(scan,bucket):
+    ind_valid=np.where(~np.isnan(scan.vr_flat))[0]
+    bx=np.floor(scan.gx_flat[ind_valid]/bucket).astype(np.int64)
+    by=np.floor(scan.gy_flat[ind_valid]/bucket).astype(np.int64)
+    by_range=(by.min(),by.max()-by.min()+1) if by.size>0 else (0,1)
+    key=bx*by_range[1]+(by-by_range[0])
+    ind_order=np.argsort(key,kind='stable')
+    
+    return ind_valid[ind_order],key[ind_order],by_range
+
+'''
+Ranges in the sorted measurements (see sort_valid_gates) of the buckets around 
+points (x,y); measurements within R<=bucket of a point are in these ranges.
+Output:
+    start, end  - (3 x number of points) for the three columns of buckets along x
+'''
+def bucket_ranges(key_sort,by_range,x,y,R,bucket):
+    by0,by_n=by_range
+    bx_start,bx_end=np.floor((x-R)/bucket).astype(np.int64),np.floor((x+R)/bucket).astype(np.int64)
+    by_start=np.maximum(np.floor((y-R)/bucket).astype(np.int64)-by0,0)
+    by_end=np.minimum(np.floor((y+R)/bucket).astype(np.int64)-by0,by_n-1)
+    
+    start,end=[],[]
+    for dx in range(3):
+        bx=bx_start+dx
+        start_temp=np.searchsorted(key_sort,bx*by_n+by_start,side='left')
+        end_temp=np.searchsorted(key_sort,bx*by_n+by_end,side='right')
+        empty=(bx>bx_end)|(by_start>by_end)
+        end_temp[empty]=start_temp[empty]
+        start.append(start_temp)
+        end.append(end_temp)
+    
+    return np.array(start),np.array(end)
+   
+'''
+Find the grid for a set of scans: only grid points which can be retrieved are covered
+The orientation of the plane is taken from the scans (PPI: horizontal, RHI: vertical
+plane along the line connecting the first two lidars). For the candidate grid points 
+the valid measurements of each lidar within R=delta_l/sqrt(2) and their mean beam 
+direction are found as in calc_retrieval, and the angle between the beams of the 
+lidars is checked (see valid_angle and select_lidars). The extent of the grid is reduced 
+to the grid points which can be retrieved.
+Input:
+    scan_list           - list of scan classes
+    delta_l in m        - lattice width (default: larger of range gate length and 
+                          median distance between neighboring rays)
+    plane_orientation   - 'horizontal' or 'vertical' (default: from elevation range of scans)
+    min_n               - minimum number of measurements of a lidar within a grid cell
+Output:
+    grid                - grid class
+    mask                - boolean array (shape of grid.xx); True for grid points 
+                          which can be retrieved, see calc_retrieval(mask=mask)
+'''
+def plan_grid(scan_list,delta_l=None,plane_orientation=None,min_n=1):
+    if plane_orientation is None:
+        el_range=max([np.nanmax(scan.el_deg)-np.nanmin(scan.el_deg) for scan in scan_list])
+        plane_orientation='vertical' if el_range>5 else 'horizontal'
+    
+    if delta_l is None:
+        delta_l=0
+        for scan in scan_list:
+            dr=np.median(np.diff(scan.r))
+            angle=scan.el_rad if plane_orientation=='vertical' else scan.az_rad
+            dangle=np.median(np.abs(np.arctan2(np.sin(np.diff(angle)),np.cos(np.diff(angle)))))
+            delta_l=max(delta_l,dr,dangle*np.median(scan.r))
+        delta_l=np.ceil(delta_l)
+    
+    dl_loc=np.array([scan.dl_loc for scan in scan_list],dtype=float)
+    valid=[~np.isnan(scan.vr_flat) for scan in scan_list]
+    R=delta_l/np.sqrt(2)
+    
+    #coordinates (p1,p2) of valid measurements in the plane, distance d to the 
+    # plane and angle of the beam (as in calc_retrieval)
+    p1,p2,d,angle=[],[],[],[]
+    if plane_orientation=='horizontal':
+        for scan,v in zip(scan_list,valid):
+            p1.append(scan.gx_flat[v])
+            p2.append(scan.gy_flat[v])
+            d.append(np.zeros(p1[-1].size))
+            angle.append(scan.az_deg[scan.ray_index(np.flatnonzero(v))])
+        z_plane=np.median(np.concatenate([scan.gz_flat[v] for scan,v in zip(scan_list,valid)]))
+    else:
+        # plane along the line from the first to the second lidar, s is the 
+        # distance along this line from the first lidar
+        phi=np.arctan2(dl_loc[1,0]-dl_loc[0,0],dl_loc[1,1]-dl_loc[0,1])
+        phi_beam=plane_direction(scan_list)
+        for scan,v in zip(scan_list,valid):
+            s=(scan.gx_flat[v]-dl_loc[0,0])*np.sin(phi)+(scan.gy_flat[v]-dl_loc[0,1])*np.cos(phi)
+            d_temp=-(scan.gx_flat[v]-dl_loc[0,0])*np.cos(phi)+(scan.gy_flat[v]-dl_loc[0,1])*np.sin(phi)
+            close=np.abs(d_temp)<=R # distance to the plane
+            ray=scan.ray_index(np.flatnonzero(v)[close])
+            p1.append(s[close])
+            p2.append(scan.gz_flat[v][close])
+            d.append(d_temp[close])
+            angle.append(plane_angle(scan.el_rad[ray],scan.az_rad[ray],phi_beam))
+    
+    # candidate lattice covering all measurements
+    p1_all,p2_all=np.concatenate(p1),np.concatenate(p2)
+    c1=np.arange(np.floor(p1_all.min()/delta_l),np.ceil(p1_all.max()/delta_l)+1)*delta_l
+    c2=np.arange(np.floor(p2_all.min()/delta_l),np.ceil(p2_all.max()/delta_l)+1)*delta_l
+    
+    # number of measurements of each lidar within R of each lattice point and 
+    # their mean beam direction; a measurement is within R of the four corners 
+    # of its lattice cell at most
+    counts=np.zeros((len(scan_list),c2.size*c1.size))
+    angle_mean_rad=np.zeros((len(scan_list),c2.size*c1.size))
+    for li,(p1_temp,p2_temp,d_temp,angle_temp) in enumerate(zip(p1,p2,d,angle)):
+        i1_cell=np.floor((p1_temp-c1[0])/delta_l).astype(int)
+        i2_cell=np.floor((p2_temp-c2[0])/delta_l).astype(int)
+        sum_1,sum_2=np.zeros(c1.size*c2.size),np.zeros(c1.size*c2.size)
+        for i1,i2 in [(i1_cell+a,i2_cell+b) for a in (0,1) for b in (0,1)]:
+            R_dist=np.sqrt((p1_temp-c1[i1])**2+(p2_temp-c2[i2])**2+d_temp**2)
+            close=R_dist<=R
+            cell=i2[close]*c1.size+i1[close]
+            counts[li]+=np.bincount(cell,minlength=c1.size*c2.size)
+            if plane_orientation=='horizontal':
+                # circular mean of the azimuth angles
+                sum_1+=np.bincount(cell,np.sin(np.deg2rad(angle_temp[close])),minlength=c1.size*c2.size)
+                sum_2+=np.bincount(cell,np.cos(np.deg2rad(angle_temp[close])),minlength=c1.size*c2.size)
+            else:
+                sum_1+=np.bincount(cell,angle_temp[close],minlength=c1.size*c2.size)
+        if plane_orientation=='horizontal':
+            angle_mean_rad[li]=np.arctan2(sum_1,sum_2)
+        else:
+            angle_mean_rad[li]=np.deg2rad(sum_1/np.maximum(counts[li],1))
+    cover=counts>=min_n
+    
+    # valid pairs of covering lidars (lidar x lidar x cells)
+    diff=pairwise_angle(angle_mean_rad)
+    pair_valid=valid_angle(diff,plane_orientation)&cover[:,np.newaxis]&cover[np.newaxis,:]
+    mask=pair_valid.any(axis=(0,1)).reshape(c2.size,c1.size)
+    
+    if not mask.any():
+        raise Exception('scans do not overlap with valid angles')
+    
+    # reduce extent to the retrievable grid points
+    j_valid,i_valid=np.where(mask)
+    j_slice=slice(j_valid.min(),j_valid.max()+1)
+    i_slice=slice(i_valid.min(),i_valid.max()+1)
+    mask=mask[j_slice,i_slice]
+    
+    if plane_orientation=='horizontal':
+        grid_temp=grid(c1[i_slice],c2[j_slice],np.array([z_plane]),delta_l)
+    else:
+        s=c1[i_slice]
+        x=dl_loc[0,0]+s*np.sin(phi)
+        y=dl_loc[0,1]+s*np.cos(phi)
+        grid_temp=grid(x,y,c2[j_slice],delta_l)
+    
+    return grid_temp,mask
    
 '''
 Main dual Doppler algorithm
 assumptions: grid plane is alogned horizontal (ppis) or vertical (rhi), 
 inclination is NOT possible
+grid points excluded by mask (e.g., from plan_grid) are skipped
+For each grid point, only the lidars whose beams cross the beam of another lidar 
+with a valid angle are used (see select_lidars); the mean beam direction of each 
+lidar is the circular mean of the azimuth angles (horizontal plane, so that 
+sectors across north are averaged correctly) or the mean of the angles in the 
+plane (vertical plane, between 0 and 180 deg).
 '''
-def calc_retrieval(scan_list,grid,weight=None):
+@instrument.timed('calc_retrieval')
+def calc_retrieval(scan_list,grid,weight=None,mask=None):
     R=grid.delta_l/np.sqrt(2)
     
+    if mask is None:
+        grid_ind=np.arange(grid.n)
+    else:
+        grid_ind=np.flatnonzero(np.ravel(mask))
+    
     retrieval_temp=retrieval(grid,len(scan_list),weight)
+    instrument.count('grid_cells',grid_ind.size)
     
-    if grid.plane_orientation=='horizontal': #ppi, horizontal plane
-#        dd_retrieval_temp.scan_type='ppi'
-        for gi,(x_temp,y_temp,z_temp) in enumerate(zip(grid.xx_flat,grid.yy_flat,grid.zz_flat)): #loop through all grid points
-            # close measurements will be selected in lists 
-            
-            # close measurements will be selected in lists 
-            rv_,az_,w_,li_m=[],[],[],[]
-            temp=[]
-            for li,scan in enumerate(scan_list):
-                R_dist=np.sqrt((scan.gx_flat-x_temp)**2\
-                    +(scan.gy_flat-y_temp)**2)
-                
-                #distance of measurement center to grid point has to be smaller 
-                #R=delta_g/sqrt(2) and only valid measurements are counted
-                ind_temp=np.where((R_dist<=R)&(~np.isnan(scan.vr_flat)))[0]
-                temp.append(len(ind_temp))
-                if len(ind_temp)>0:
-                    w_.append(R_dist[ind_temp])
-                    az_.append(scan.az_deg_flat[ind_temp])
-                    rv_.append(scan.vr_flat[ind_temp])
-                    li_m.append(li)
-                    
-            if len(rv_)>1:
-                retrieval_temp.n_flat[gi,:]=temp
-                
-                if len(rv_)==2:
-                    az_mean_rad=[np.mean(np.deg2rad(az)) for az in az_]
-                    az_diff=np.rad2deg(np.abs(np.arctan2(np.sin(az_mean_rad[0]-az_mean_rad[1]),np.cos(az_mean_rad[0]-az_mean_rad[1]))))
-                    if not valid_angle(az_diff): continue
-                    lidar_n=[0,1]
-                    retrieval_temp.error_flat[gi]=1/(np.sin(np.deg2rad(az_diff))**2)
-                
-                    
-                elif len(rv_)==3:
-                    az_mean_rad=[np.mean(np.deg2rad(az)) for az in az_]
-                    #calc mean angle between different lidars
-                    az_diff01=np.rad2deg(np.abs(np.arctan2(np.sin(az_mean_rad[0]-az_mean_rad[1]),np.cos(az_mean_rad[0]-az_mean_rad[1]))))
-                    az_diff02=np.rad2deg(np.abs(np.arctan2(np.sin(az_mean_rad[0]-az_mean_rad[2]),np.cos(az_mean_rad[0]-az_mean_rad[2]))))
-                    az_diff12=np.rad2deg(np.abs(np.arctan2(np.sin(az_mean_rad[1]-az_mean_rad[2]),np.cos(az_mean_rad[1]-az_mean_rad[2]))))
+    '''
+    for each lidar, the valid measurements are sorted into buckets of width R of 
+    the horizontal plane once; the buckets around each grid point are found for all 
+    grid points at once. Lidars without measurements in these buckets are skipped, 
+    so the work per grid point scales with the number of measurements of the 
+    lidars covering it
+    '''
+    ind_sort,bucket_start,bucket_end=[],[],[]
+    for scan in scan_list:
+        ind_temp,key_sort,by_range=sort_valid_gates(scan,R)
+        start_temp,end_temp=bucket_ranges(key_sort,by_range,grid.xx_flat,grid.yy_flat,R,R)
+        ind_sort.append(ind_temp)
+        bucket_start.append(start_temp)
+        bucket_end.append(end_temp)
+    bucket_start,bucket_end=np.array(bucket_start),np.array(bucket_end)
+    
+    if grid.plane_orientation=='vertical':
+        phi=plane_direction(scan_list)
+    
+    for gi in grid_ind: #loop through all (retrievable) grid points
+        x_temp,y_temp,z_temp=grid.xx_flat[gi],grid.yy_flat[gi],grid.zz_flat[gi]
+        lidar_cover=np.where((bucket_end[:,:,gi]>bucket_start[:,:,gi]).any(axis=1))[0]
+        if len(lidar_cover)<2: continue
         
-                    az_diff01_valid,az_diff02_valid,az_diff12_valid=valid_angle(az_diff01),valid_angle(az_diff02),valid_angle(az_diff12)
-                    az_diff_valid_sum=sum([az_diff01_valid,az_diff02_valid,az_diff12_valid])
-                    retrieval_temp.error_flat[gi]=np.mean([1/(np.sin(np.deg2rad(az_diff01))**2),1/(np.sin(np.deg2rad(az_diff02))**2),1/(np.sin(np.deg2rad(az_diff12))**2)])
-                
-                
-                    lidar_n=[0,1,2]
-                   
-                w_flat=[w_[t] for t in lidar_n]
-                az_flat=[az_[t] for t in lidar_n]
-                rv_flat=[rv_[t] for t in lidar_n]
-                li_m=lidar_n
-                
-                az_temp=np.concatenate(az_flat)
-
-                az_mean_rad=np.deg2rad([np.mean(at) for at in az_flat])
-                
-                rv_temp=np.concatenate(rv_flat)
-                n=[rv.shape[0] for rv in rv_flat] # number of measurement points of each lidar
-                N=rv_temp.shape[0] #total number of measurement points
-                
-                retrieval_temp.n_flat[gi,li_m]=n
-                
-                #TODO more possibibilities for calculation weights
-                W_weight=np.zeros((N,N))
-                if weight is None:
-                    W=np.full(N,1)
-                elif weight=='lidar':
-                    W=np.concatenate([np.full(n_temp,1/n_temp) for n_temp in n])
-                np.fill_diagonal(W_weight,W)
-                
-                # calc 2d wind vector weighted
-                u_temp,v_temp=vr2uv(np.deg2rad(az_temp),W_weight,rv_temp)
-
-                retrieval_temp.v_flat[gi],retrieval_temp.u_flat[gi]=u_temp,v_temp
-                
-    elif grid.plane_orientation=='vertical': 
-
-        for gi,(x_temp,y_temp,z_temp) in enumerate(zip(grid.xx_flat,grid.yy_flat,grid.zz_flat)): #loop through all grid points
-            # close measurements will be selected in lists 
-            rv_,el_,w_=[],[],[]
-            for scan in scan_list:
-                R_dist=np.sqrt((scan.gx_flat-x_temp)**2\
-                    +(scan.gy_flat-y_temp)**2\
-                    +(scan.gz_flat-z_temp)**2)
-                
-                #distance of measurement center to grid point has to be smaller 
-                #R=delta_g/sqrt(2) and only valid measurements are counted
-                ind_temp=np.where((R_dist<=R)&(~np.isnan(scan.vr_flat)))[0]
-                if len(ind_temp)>0:
-                    w_.append(R_dist[ind_temp])
-                    el_.append(scan.el_deg_flat[ind_temp])
-                    rv_.append(scan.vr_flat[ind_temp])
-                    
-            if len(rv_)>1:
-                el_[1]=180-el_[1] #both angles must refer to the same system (more universal solution: angle in dependence to vertical??)
-                
-                el_temp=np.concatenate(el_)
-                el_temp_rad=np.deg2rad(el_temp)
-
-                # if angle between the measurements is too flat, no wind vector is calculated due to too big errors
-                # see Stawiarski et al. (2013), doi:10.1175/JTECH-D-12-00244.1
-                # to do: complete error calculations including mean angle between the two measurements!!!!
-                # + number of measurements for each grid point
-                #calculate error prefactor due to difference in angles
-                el_mean_rad=np.deg2rad([np.mean(el) for el in el_])
-                el_diff=np.rad2deg(np.abs(np.arctan2(np.sin(el_mean_rad[0]-el_mean_rad[1]),np.cos(el_mean_rad[0]-el_mean_rad[1]))))
-                if (el_diff>160)|(el_diff<20):
-                    continue
-
-                rv_temp=np.concatenate(rv_)
-                n=[rv.shape[0] for rv in rv_] # number of measurement points of each lidar
-                N=rv_temp.shape[0] #total number of measurement points
-
-                retrieval_temp.error_flat[gi]=1/(np.sin(el_mean_rad[1]-el_mean_rad[0])**2)
-
-                retrieval_temp.n_flat[gi,:]=n
+        # close measurements will be selected in lists 
+        rv_,angle_,w_,li_m=[],[],[],[]
+        temp=np.zeros(len(scan_list))
+        for li in lidar_cover:
+            scan=scan_list[li]
+            ind_bucket=np.concatenate([ind_sort[li][bucket_start[li,k,gi]:bucket_end[li,k,gi]] for k in range(3)])
+            if grid.plane_orientation=='horizontal':
+                R_dist=np.sqrt((scan.gx_flat[ind_bucket]-x_temp)**2\
+                    +(scan.gy_flat[ind_bucket]-y_temp)**2)
+            else:
+                R_dist=np.sqrt((scan.gx_flat[ind_bucket]-x_temp)**2\
+                    +(scan.gy_flat[ind_bucket]-y_temp)**2\
+                    +(scan.gz_flat[ind_bucket]-z_temp)**2)
+            
+            #distance of measurement center to grid point has to be smaller 
+            #R=delta_g/sqrt(2) and only valid measurements are counted
+            ind_temp=ind_bucket[R_dist<=R]
+            temp[li]=len(ind_temp)
+            if len(ind_temp)>0:
+                w_.append(R_dist[R_dist<=R])
+                ray_temp=scan.ray_index(ind_temp)
+                if grid.plane_orientation=='horizontal':
+                    angle_.append(scan.az_deg[ray_temp])
+                else:
+                    # angle of the beam in the plane, 0 deg in direction phi
+                    angle_.append(plane_angle(scan.el_rad[ray_temp],scan.az_rad[ray_temp],phi))
+                rv_.append(scan.vr_flat[ind_temp])
+                li_m.append(li)
                 
-                #TODO more possibibilities for calculation weights
-                W_weight=np.zeros((N,N))
-                if weight is None:
-                    W=np.full(N,1)
-                elif weight=='lidar':
-                    W=np.concatenate([np.full(n_temp,1/n_temp) for n_temp in n])
-                np.fill_diagonal(W_weight,W)
-
+        if len(rv_)>1:
+            retrieval_temp.n_flat[gi,:]=temp
+            
+            if grid.plane_orientation=='horizontal':
+                #mean azimuth of each lidar (circular mean)
+                angle_mean_rad=np.array([np.arctan2(np.mean(np.sin(np.deg2rad(az))),np.mean(np.cos(np.deg2rad(az)))) for az in angle_])
+            else:
+                angle_mean_rad=np.deg2rad([np.mean(angle) for angle in angle_])
+            
+            # check angles between all pairs of lidars at once and choose lidars
+            # if angle between the measurements is too flat, no wind vector is calculated due to too big errors
+            # see Stawiarski et al. (2013), doi:10.1175/JTECH-D-12-00244.1
+            lidar_sel,error_temp=select_lidars(angle_mean_rad,grid.plane_orientation)
+            if np.isnan(error_temp): continue
+            lidar_n=np.where(lidar_sel)[0]
+            retrieval_temp.error_flat[gi]=error_temp
                
-                A=np.column_stack((np.cos(el_temp_rad),np.sin(el_temp_rad)))
-                u_temp,v_temp=np.dot(np.dot(np.dot(np.linalg.inv(np.dot(np.dot(A.T,W_weight),A)),A.T),W_weight),rv_temp)
-        
+            w_flat=[w_[t] for t in lidar_n]
+            angle_flat=[angle_[t] for t in lidar_n]
+            rv_flat=[rv_[t] for t in lidar_n]
+            li_m=[li_m[t] for t in lidar_n]
+            
+            angle_temp=np.concatenate(angle_flat)
+            
+            rv_temp=np.concatenate(rv_flat)
+            n=[rv.shape[0] for rv in rv_flat] # number of measurement points of each lidar
+            N=rv_temp.shape[0] #total number of measurement points
+            
+            retrieval_temp.n_flat[gi,li_m]=n
+            
+            #TODO more possibibilities for calculation weights
+            W_weight=np.zeros((N,N))
+            if weight is None:
+                W=np.full(N,1)
+            elif weight=='lidar':
+                W=np.concatenate([np.full(n_temp,1/n_temp) for n_temp in n])
+            np.fill_diagonal(W_weight,W)
+            
+            # calc 2d wind vector weighted
+            u_temp,v_temp=vr2uv(np.deg2rad(angle_temp),W_weight,rv_temp)
+            
+            if grid.plane_orientation=='horizontal':
+                retrieval_temp.v_flat[gi],retrieval_temp.u_flat[gi]=u_temp,v_temp
+            else:
                 retrieval_temp.u_flat[gi],retrieval_temp.v_flat[gi]=u_temp,v_temp
             
     retrieval_temp.reshape()
     return retrieval_temp
-
-
- 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time series of coplanar retrievals:
+    - pair_scans(): find simultaneous scans of several lidars by their start times
+    - retrieval_writer: netCDF file with time dimension to which retrievals are appended
+    - load_l1_scan(): scan class of a l1 .nc file
+    - calc_retrieval_series(): retrieval for all pairs of scans written into one .nc file
+
+The scans are only loaded when they are used for a retrieval (see load_scan in 
+calc_retrieval_series), so a whole day of scans is never kept in memory.
+"""
+import os
+import datetime
+import numpy as np
+from netCDF4 import Dataset
+import matplotlib.dates as mdates
+
+try:
+    from . import calc_retrieval as cr
+except ImportError:
+    import calc_retrieval as cr
+
+dtn=(24*60*60) # second of day
+
+'''
+Pair scans of several lidars by their start times. The first lidar is used as
+reference; for each other lidar the closest scan is found by a sorted merge 
+(np.searchsorted) of the start times. Each scan is used at most once, if two 
+reference scans share the same closest scan, the closer one is kept.
+Input:
+    times_list      - list of arrays with start times (datenum) of the scans of each lidar
+    window in s     - maximum time difference between the scans of one pair
+Output:
+    dn_pairs        - (pairs_n,) start time of the reference scan of each pair
+    ind_pairs       - (pairs_n x lidar_n) index of the scan of each lidar in times_list
+'''
+def pair_scans(times_list,window):
+    times_ref=np.asarray(times_list[0],dtype=float)
+    pairs_valid=np.ones(times_ref.size,dtype=bool)
+    ind_pairs=[np.arange(times_ref.size)]
+    
+    for times in times_list[1:]:
+        times=np.asarray(times,dtype=float)
+        order=np.argsort(times,kind='stable')
+        times_sort=times[order]
+        
+        if times_sort.size==0:
+            return np.array([]),np.zeros((0,len(times_list)),dtype=int)
+        
+        #closest scan: left or right neighbor of the insertion point
+        ind_right=np.clip(np.searchsorted(times_sort,times_ref),0,times_sort.size-1)
+        ind_left=np.clip(ind_right-1,0,times_sort.size-1)
+        dt_left=np.abs(times_sort[ind_left]-times_ref)
+        dt_right=np.abs(times_sort[ind_right]-times_ref)
+        ind_close=np.where(dt_left<=dt_right,ind_left,ind_right)
+        dt_close=np.minimum(dt_left,dt_right)*dtn
+        
+        valid=dt_close<=window
+        
+        #scan used by several reference scans: keep closest
+        ind_unique=np.lexsort((dt_close,ind_close))
+        first=np.ones(ind_unique.size,dtype=bool)
+        first[1:]=ind_close[ind_unique][1:]!=ind_close[ind_unique][:-1]
+        unique=np.zeros(times_ref.size,dtype=bool)
+        unique[ind_unique[first]]=True
+        
+        pairs_valid&=valid&unique
+        ind_pairs.append(order[ind_close])
+    
+    ind_pairs=np.column_stack(ind_pairs)[pairs_valid]
+    
+    return times_ref[pairs_valid],ind_pairs
+
+'''
+netCDF file for a time series of retrievals on a fixed grid; the file is opened 
+once and each retrieval is appended along the unlimited dimension NUMBER_OF_SCANS. 
+Each field is chunked per scan and compressed.
+Input:
+    file_path       - path of the output .nc file
+    grid            - grid class used for all retrievals
+    lidar_n         - number of lidars
+    lidar_names     - names of the lidars (optional)
+    weight          - weight used for the retrievals
+    complevel       - zlib compression level
+'''
+class retrieval_writer():
+    def __init__(self,file_path,grid,lidar_n,lidar_names=None,weight=None,complevel=4):
+        self.grid=grid
+        self.ti=0
+        
+        path_out=os.path.dirname(file_path)
+        if path_out and not os.path.exists(path_out):
+            os.makedirs(path_out)
+        if os.path.isfile(file_path):
+            os.remove(file_path)
+        self.file_path=file_path
+        
+        [jn,in_]=grid.xx.shape
+        
+        dataset_temp=Dataset(file_path,'w',format='NETCDF4')
+        dataset_temp.createDimension('NUMBER_OF_SCANS',None)
+        dataset_temp.createDimension('GRID_J',jn)
+        dataset_temp.createDimension('GRID_I',in_)
+        dataset_temp.createDimension('NUMBER_OF_LIDARS',lidar_n)
+        
+        # Metadata
+        dataset_temp.description='Two dimensional wind fields from coplanar Doppler wind lidar scans'
+        dataset_temp.plane_orientation=grid.plane_orientation
+        dataset_temp.delta_l='%.2f m' %grid.delta_l
+        dataset_temp.weight='none' if weight is None else weight
+        if lidar_names is not None:
+            dataset_temp.lidars=', '.join(lidar_names)
+        dataset_temp.history='File created on %s ' %datetime.datetime.now().strftime('%d %b %Y %H:%M')
+        
+        if grid.plane_orientation=='horizontal':
+            u_descr,v_descr='westerly wind component (pointing east)','southerly wind component (pointing north)'
+        else:
+            u_descr,v_descr='horizontal wind component along the plane','vertical wind component'
+        
+        for name,values,long_name in (('x',grid.xx,'x coordinate of grid points (east)'),\
+                                      ('y',grid.yy,'y coordinate of grid points (north)'),\
+                                      ('z',grid.zz,'z coordinate of grid points (vertical)')):
+            coord=dataset_temp.createVariable(name,np.float32,('GRID_J','GRID_I'))
+            coord.units='m'
+            coord.long_name=long_name
+            coord[:,:]=values
+        
+        datenum=dataset_temp.createVariable('datenum',np.float64,('NUMBER_OF_SCANS'))
+        datenum.units='Number of days from January 1, 0001 in UTC'
+        datenum.long_name='start time of the reference scan'
+        datenum.description='datenum timestamp'
+        
+        time=dataset_temp.createVariable('time',np.int64,('NUMBER_OF_SCANS'))
+        time.units='Seconds since 01-01-1970 00:00:00 in UTC'
+        time.long_name='start time of the reference scan'
+        time.description='UNIX timestamp'
+        
+        chunks=(1,jn,in_)
+        fields=(('u','m s-1',u_descr),\
+                ('v','m s-1',v_descr),\
+                ('ws','m s-1','wind speed in the plane'),\
+                ('error','unitless','error prefactor due to the angle between the beams'))
+        for name,units,long_name in fields:
+            var=dataset_temp.createVariable(name,np.float32,('NUMBER_OF_SCANS','GRID_J','GRID_I'),\
+                                            zlib=True,complevel=complevel,chunksizes=chunks,fill_value=np.nan)
+            var.units=units
+            var.long_name=long_name
+        
+        n=dataset_temp.createVariable('n',np.float32,('NUMBER_OF_SCANS','GRID_J','GRID_I','NUMBER_OF_LIDARS'),\
+                                      zlib=True,complevel=complevel,chunksizes=chunks+(lidar_n,),fill_value=np.nan)
+        n.units='unitless'
+        n.long_name='number of valid measurements of each lidar per grid point'
+        
+        self.dataset=dataset_temp
+    
+    '''
+    append retrieval (retrieval class) with start time dn (datenum)
+    '''
+    def write(self,dn,retrieval):
+        ds=self.dataset
+        ds['datenum'][self.ti]=dn
+        ds['time'][self.ti]=np.round((dn-mdates.datestr2num('19700101'))*dtn)
+        ds['u'][self.ti,:,:]=retrieval.u
+        ds['v'][self.ti,:,:]=retrieval.v
+        ds['ws'][self.ti,:,:]=retrieval.ws
+        ds['error'][self.ti,:,:]=retrieval.error
+        ds['n'][self.ti,:,:,:]=retrieval.n
+        self.ti+=1
+        
+    def close(self):
+        self.dataset.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self,*args):
+        self.close()
+
+'''
+Load scan from l1 netCDF file (see hpl2NetCDF.to_netcdf_l1)
+Input:
+    file_path       - path of l1 .nc file
+    dl_loc          - location of the lidar [x,y,z] in m
+    snr_threshold in dB - radial velocities with lower SNR are set to NaN (optional)
+Output:
+    dn              - start time (datenum) of the scan
+    scan            - scan class
+'''
+def load_l1_scan(file_path,dl_loc,snr_threshold=None):
+    with Dataset(file_path,'r') as ds_temp:
+        dn=float(ds_temp['datenum_time'][0])
+        vr=np.ma.filled(ds_temp['radial_velocity'][:],np.nan).astype(np.float64)
+        if snr_threshold is not None:
+            with np.errstate(invalid='ignore',divide='ignore'):
+                snr=10*np.log10(np.ma.filled(ds_temp['intensity'][:],np.nan)-1)
+            vr[~(snr>snr_threshold)]=np.nan
+        else:
+            snr=np.full(vr.shape,np.nan)
+        scan_temp=cr.scan(np.ma.filled(ds_temp['elevation'][:],np.nan),np.ma.filled(ds_temp['azimuth'][:],np.nan),\
+                          vr,snr,dl_loc,np.ma.filled(ds_temp['gate_centers'][:],np.nan))
+    
+    return dn,scan_temp
+
+'''
+Retrieval for all simultaneous scans of several lidars 
+Input:
+    times_list      - list of arrays with start times (datenum) of the scans of each lidar
+    load_scan       - function load_scan(li,si) returning the scan class of scan si of lidar li
+    grid            - grid class
+    file_path       - path of the output .nc file
+    window in s     - maximum time difference between the scans of one pair
+    weight          - weight used in calc_retrieval
+    lidar_names     - names of the lidars (optional)
+    mask            - grid points which are retrieved (e.g., from plan_grid, optional)
+Output:
+    file_path       - path of the output .nc file
+'''
+def calc_retrieval_series(times_list,load_scan,grid,file_path,window=60,weight=None,lidar_names=None,mask=None):
+    dn_pairs,ind_pairs=pair_scans(times_list,window)
+    
+    with retrieval_writer(file_path,grid,len(times_list),lidar_names=lidar_names,weight=weight) as writer:
+        for dn,ind in zip(dn_pairs,ind_pairs):
+            scan_list=[load_scan(li,si) for li,si in enumerate(ind)]
+            retrieval_temp=cr.calc_retrieval(scan_list,grid,weight=weight,mask=mask)
+            writer.write(dn,retrieval_temp)
+    
+    return file_path
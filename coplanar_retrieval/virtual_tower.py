@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Virtual tower: vertical profiles of the wind vector at a fixed point (x,y) where
+the beams of two or three lidars (RHI or stare scans) intersect.
+
+For each lidar and each tower height the pointing direction and the range gate 
+which observe the tower are calculated once (tower class). The rays of the l1 
+data of each lidar are matched with these directions, so only one range gate per 
+matched ray is read and the work per time step does not depend on the number of 
+range gates or on the size of the scans. For each time step the systems of linear 
+equations of all heights are solved at once.
+
+classes:
+    tower: x, y, z, dl_loc, r --> el_deg, az_deg, gate index and unit vectors of each lidar for each height
+    tower_retrieval: dn, z, (u,v,w), n
+"""
+import numpy as np
+
+dtn=(24*60*60) # second of day
+
+'''
+geometry of the virtual tower
+Input:
+    x,y in m            - location of the tower in the global coordinate system (see calc_retrieval)
+    z in m              - (zn,) heights of the tower
+    dl_loc_list         - list of lidar locations [dlx,dly,dlz]
+    r_list in m         - list of arrays with the centers of the range gates of each lidar
+    tolerance in deg    - maximum angle between ray and direction to a tower height
+'''
+class tower:
+    def __init__(self,x,y,z,dl_loc_list,r_list,tolerance=0.5):
+        self.x,self.y=x,y
+        self.z=np.atleast_1d(np.asarray(z,dtype=float))
+        self.zn=self.z.size
+        self.ln=len(dl_loc_list)
+        self.tolerance=tolerance
+        
+        # (lidar_n x zn) pointing angles, distance and gate index of each tower height
+        self.el_deg=np.full((self.ln,self.zn),np.nan)
+        self.az_deg=np.full((self.ln,self.zn),np.nan)
+        self.gate=np.full((self.ln,self.zn),-1,dtype=int)
+        # (lidar_n x zn x 3) unit vectors pointing from lidar to tower height
+        self.direction=np.full((self.ln,self.zn,3),np.nan)
+        
+        for li,(dl_loc,r) in enumerate(zip(dl_loc_list,r_list)):
+            r=np.asarray(r,dtype=float)
+            [dlx,dly,dlz]=dl_loc
+            dx,dy,dz=x-dlx,y-dly,self.z-dlz
+            dist=np.sqrt(dx**2+dy**2+dz**2)
+            
+            self.direction[li]=np.column_stack((np.full(self.zn,dx),np.full(self.zn,dy),dz))/dist[:,np.newaxis]
+            self.el_deg[li]=np.rad2deg(np.arcsin(dz/dist))
+            self.az_deg[li]=np.rad2deg(np.arctan2(dx,dy))%360
+            
+            # closest range gate; heights outside of the measurement range are not used
+            gate=np.argmin(np.abs(r[np.newaxis,:]-dist[:,np.newaxis]),axis=1)
+            dr=np.median(np.diff(r)) if r.size>1 else np.inf
+            inside=np.abs(r[gate]-dist)<=dr/2
+            self.gate[li,inside]=gate[inside]
+    
+    '''
+    match rays of lidar li with the tower heights
+    Input:
+        li          - index of lidar
+        el_deg      - (rn,) elevation angle of rays
+        az_deg      - (rn,) azimuth angle of rays
+    Output:
+        ri,zi       - index of ray and index of tower height of all matches; 
+                      one ray can match several heights (e.g., vertical stare at the tower)
+    '''
+    def match(self,li,el_deg,az_deg):
+        el_rad,az_rad=np.deg2rad(el_deg),np.deg2rad(az_deg)
+        ray_direction=np.column_stack((np.cos(el_rad)*np.sin(az_rad),np.cos(el_rad)*np.cos(az_rad),np.sin(el_rad)))
+        cos_angle=np.clip(ray_direction@self.direction[li].T,-1,1) # rn x zn
+        
+        angle=np.rad2deg(np.arccos(cos_angle))
+        ri,zi=np.nonzero((angle<=self.tolerance)&(self.gate[li]>=0)[np.newaxis,:])
+        
+        return ri,zi
+
+# results of the virtual tower
+# dn start time of each time step (datenum); (u,v,w) wind vector (tn x zn); 
+# n number of rays of each lidar for each time step and height (tn x zn x lidar_n)
+class tower_retrieval:
+    def __init__(self,dn,z,u,v,w,n):
+        self.dn,self.z=dn,z
+        self.u,self.v,self.w=u,v,w
+        self.n=n
+        self.ws=np.sqrt(u**2+v**2)
+
+'''
+Solve the systems of linear equations of many time steps and heights at once
+Input:
+    vr          - (tn x zn x lidar_n) mean radial velocity, NaN if not measured 
+    direction   - (lidar_n x zn x 3) unit vectors of the beams
+    components  - 2: (u,v) with w=0, 3: (u,v,w)
+Output:
+    wind        - (tn x zn x 3) wind vector (w is zero for components=2)
+'''
+def solve_tower(vr,direction,components=3):
+    A=np.moveaxis(direction,0,1)[np.newaxis,:,:,:components] # 1 x zn x lidar_n x components
+    valid=~np.isnan(vr)
+    vr_valid=np.where(valid,vr,0)
+    
+    # normal equations for each time step and height, lidars without measurement have zero weight
+    AW=A*valid[...,np.newaxis]
+    M=np.einsum('tzlc,tzld->tzcd',AW,np.broadcast_to(A,AW.shape))
+    b=np.einsum('tzlc,tzl->tzc',AW,vr_valid)
+    
+    solvable=(valid.sum(axis=-1)>=components)&(np.abs(np.linalg.det(M))>1e-6)
+    wind=np.full(vr.shape[:2]+(3,),np.nan)
+    if solvable.any():
+        wind[solvable,:components]=np.linalg.solve(M[solvable],b[solvable][...,np.newaxis])[...,0]
+        if components==2:
+            wind[solvable,2]=0
+    
+    return wind
+
+'''
+Virtual tower retrieval from the ray streams (l1 data) of all lidars
+Input:
+    tower_temp      - tower class
+    rays_list       - list with one dictionary per lidar containing the l1 variables
+                      'datenum' (rn,), 'elevation' (rn,), 'azimuth' (rn,) and 
+                      'radial_velocity' (gn x rn); NaN for filtered measurements
+    dt in s         - length of the time steps
+    components      - 2: (u,v) with w=0, 3: (u,v,w) (at least three lidars)
+    dn_start        - start time of the first time step (default: first ray)
+Output:
+    tower_retrieval class
+'''
+def calc_tower(tower_temp,rays_list,dt=10,components=3,dn_start=None):
+    if dn_start is None:
+        dn_start=np.nanmin([np.nanmin(rays['datenum']) for rays in rays_list])
+    dn_end=np.nanmax([np.nanmax(rays['datenum']) for rays in rays_list])
+    tn=int(np.floor((dn_end-dn_start)*dtn/dt))+1
+    
+    vr_sum=np.zeros((tn,tower_temp.zn,tower_temp.ln))
+    n=np.zeros((tn,tower_temp.zn,tower_temp.ln))
+    
+    for li,rays in enumerate(rays_list):
+        ri,zi=tower_temp.match(li,np.asarray(rays['elevation']),np.asarray(rays['azimuth']))
+        ti=np.floor((np.asarray(rays['datenum'])[ri]-dn_start)*dtn/dt).astype(int)
+        # only one range gate of each matched ray is read
+        vr_temp=np.asarray(rays['radial_velocity'][tower_temp.gate[li,zi],ri],dtype=float)
+        use=(ti>=0)&(ti<tn)&~np.isnan(vr_temp)
+        np.add.at(vr_sum[...,li],(ti[use],zi[use]),vr_temp[use])
+        np.add.at(n[...,li],(ti[use],zi[use]),1)
+        
+    with np.errstate(invalid='ignore',divide='ignore'):
+        vr_mean=vr_sum/n
+    
+    wind=solve_tower(vr_mean,tower_temp.direction,components=components)
+    dn=dn_start+np.arange(tn)*dt/dtn
+    
+    return tower_retrieval(dn,tower_temp.z,wind[...,0],wind[...,1],wind[...,2],n)
@@ -0,0 +1,10 @@
+"""
+Doppler wind lidar toolbox
+The directories of the repository are installed as subpackages:
+    dwl.netcdf                  - 2NetCDF
+    dwl.VAD_retrieval           - VAD_retrieval
+    dwl.coplanar_retrieval      - coplanar_retrieval
+    dwl.quicklooks              - quicklooks
+    dwl.SL_scan_files           - SL_scan_files
+The command line interface is dwl.cli (command dwl).
+"""
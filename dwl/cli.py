@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Command line interface of the Doppler wind lidar toolbox
+    dwl convert     - StreamLine .hpl files into l0 .nc files (hpl2NetCDF.hpl_to_netcdf)
+    dwl l1          - l0 .nc files into corrected l1 .nc files (hpl2NetCDF.to_netcdf_l1)
+    dwl vad         - daily VAD .nc file of l1 conical scans (vad_l1.vad_day)
+    dwl retrieve    - time series of coplanar retrievals (retrieval_series.calc_retrieval_series)
+    dwl quicklook   - quicklooks of VAD, l1 or retrieval .nc files
+    dwl scanfile    - scan files for the StreamLine software (scan_commands)
+    dwl catalog     - SQLite catalog of l0, l1 and VAD .nc files (catalog.py)
+    dwl ingest      - service converting new .hpl files into l0, l1 and VAD files (ingest.py)
+    dwl schedule    - l0, l1 and VAD files of several lidars within a memory budget (scheduler.py)
+numpy, netCDF4, xarray and matplotlib are only imported by the subcommand which
+is run; "dwl --help" only needs argparse.
+File arguments can be glob patterns (e.g. "l1/*_l1.nc").
+With --metrics PATH the run time of the processing steps, counters and the peak
+memory are written to PATH at exit (Prometheus text format for *.prom, JSON
+lines otherwise; see instrument.py).
+"""
+import os,glob
+import argparse
+import ast
+import types
+
+'''
+expand glob patterns; sorted list of files
+'''
+def expand(patterns):
+    files=[]
+    for pattern in patterns:
+        files+=glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+    return sorted(files)
+
+'''
+lidar_info class of hpl2NetCDF and vad2NetCDF
+'''
+def lidar_info(args):
+    return types.SimpleNamespace(name=args.name,lidar_id=args.lidar_id,lat=args.lat,lon=args.lon,zsl=args.zsl,\
+                                 bearing=getattr(args,'bearing',0),gc_corr=getattr(args,'gc_corr',0),\
+                                 diff_WGS84=float('nan'),diff_geoid=float('nan'),diff_bessel=float('nan'))
+
+def add_lidar_arguments(parser):
+    parser.add_argument('--name',default='lidar',help='name of the lidar (used in file names)')
+    parser.add_argument('--lidar-id',default='',help='system id of the lidar')
+    parser.add_argument('--lat',type=float,default=-999.,help='latitude in decimal degrees north')
+    parser.add_argument('--lon',type=float,default=-999.,help='longitude in decimal degrees east')
+    parser.add_argument('--zsl',type=float,default=-999.,help='altitude above mean sea level in m')
+
+def cmd_convert(args):
+    from .netcdf import hpl2NetCDF
+    for file_path in expand(args.files):
+        hpl2NetCDF.hpl_to_netcdf(file_path,args.path_out,institution=args.institution,\
+                                 contact=args.contact,overwrite=args.overwrite)
+
+def cmd_l1(args):
+    from .netcdf import hpl2NetCDF
+    for file_path in expand(args.files):
+        file_name_out=os.path.basename(file_path).replace('_l0.nc','_l1.nc')
+        hpl2NetCDF.to_netcdf_l1(file_path,file_name_out,lidar_info(args),args.path_out)
+
+def cmd_vad(args):
+    from .VAD_retrieval import vad_l1
+    print(vad_l1.vad_day(expand(args.files),lidar_info(args),args.path_out,snr_threshold=args.snr_threshold))
+
+def cmd_retrieve(args):
+    import numpy as np
+    from netCDF4 import Dataset
+    from .coplanar_retrieval import calc_retrieval as cr
+    from .coplanar_retrieval import retrieval_series as rs
+
+    names=[lidar[0] for lidar in args.lidar]
+    dl_locs=[[float(c) for c in lidar[1:4]] for lidar in args.lidar]
+    files_list=[expand([lidar[4]]) for lidar in args.lidar]
+
+    # start times of the scans from the catalog; files which are not in the catalog are opened
+    starts=dict()
+    if args.db is not None:
+        from .netcdf import catalog
+        with catalog.catalog(args.db) as cat:
+            starts={row['path']:row['start_dn'] for row in cat.query(product='l1')}
+    times_list=[]
+    for files in files_list:
+        times=[]
+        for file_path in files:
+            start=starts.get(os.path.abspath(file_path))
+            if start is None:
+                with Dataset(file_path,'r') as ds_temp:
+                    start=float(ds_temp['datenum_time'][0])
+            times.append(start)
+        times_list.append(np.array(times))
+
+    def load_scan(li,si):
+        return rs.load_l1_scan(files_list[li][si],dl_locs[li],snr_threshold=args.snr_threshold)[1]
+
+    grid,mask=cr.plan_grid([load_scan(li,0) for li in range(len(files_list))],delta_l=args.delta_l)
+    print(rs.calc_retrieval_series(times_list,load_scan,grid,args.file_out,window=args.window,\
+                                   lidar_names=names,mask=mask))
+
+def cmd_quicklook(args):
+    import matplotlib as mpl
+    mpl.use('Agg')
+    files=expand(args.files)
+    if args.product=='vad':
+        from .quicklooks import plot_vad_batch
+        # date_str from the file name [lidar]_[yyyymmdd]_vad.nc
+        file_list=[(file_path,os.path.basename(file_path).split('_')[-2]) for file_path in files]
+        plot_vad_batch.plot_VAD_batch(file_list,args.path_out,args.name,args.z_ref,args.location,\
+                                      processes=args.processes,overwrite=args.overwrite)
+    elif args.product=='l1':
+        from .quicklooks import plot_l1
+        plot_l1.plot_l1_day(files,args.path_out,args.name,args.date,snr_threshold=args.snr_threshold)
+    elif args.product=='retrieval':
+        from .quicklooks import plot_retrieval
+        for file_path in files:
+            plot_retrieval.plot_retrieval_series(file_path,args.path_out,processes=args.processes)
+
+def cmd_scanfile(args):
+    from .SL_scan_files import scan_commands as sc
+    pattern=getattr(sc,args.pattern)
+    params={}
+    for param in args.params:
+        key,value=param.split('=',1)
+        params[key]=ast.literal_eval(value)
+
+    if args.sweep:
+        params={key:(value if isinstance(value,list) else [value]) for key,value in params.items()}
+        file_names=sc.write_sweep(args.path_out,pattern,bearing=args.bearing,**params)
+    else:
+        file_names=[pattern(**params).write(args.path_out,args.bearing)]
+    for file_name in file_names:
+        print(file_name)
+
+def cmd_catalog(args):
+    from .netcdf import catalog
+    with catalog.catalog(args.db) as cat:
+        if args.action=='update':
+            for path_root in args.paths:
+                print('%s: %i added, %i updated, %i removed, %i unchanged' \
+                      %((path_root,)+cat.update(path_root,lidar=args.lidar,with_checksum=not args.no_checksum)))
+        else:
+            for file_path in cat.paths(product=args.product,lidar=args.lidar,start=args.start,end=args.end,\
+                                       scan_type=args.scan_type,geometry=args.geometry,el_range=args.el,\
+                                       az_range=args.az,gates_n=args.gates):
+                print(file_path)
+
+def cmd_ingest(args):
+    from . import ingest
+    service=ingest.ingest(args.path_watch,args.path_out,lidar_info(args),workers=args.workers,\
+                          queue_size=args.queue_size,interval=args.interval,settle=args.settle,\
+                          vad_pattern=args.vad_pattern,snr_threshold=args.snr_threshold,\
+                          metrics_path=args.metrics)
+    service.run(once=args.once)
+
+'''
+size in bytes of e.g. '8G', '512M' or '2e9'
+'''
+def memory_size(text):
+    factors={'K':1e3,'M':1e6,'G':1e9,'T':1e12}
+    text=text.strip().upper().rstrip('B')
+    if text and text[-1] in factors:
+        return float(text[:-1])*factors[text[-1]]
+    return float(text)
+
+'''
+config of dwl schedule: JSON list of lidars with name, lidar_id, lat, lon, zsl,
+bearing, files (glob patterns), path_out and vad_pattern (optional)
+'''
+def cmd_schedule(args):
+    import json
+    from . import scheduler
+    with open(args.config,'r') as json_file:
+        config=json.load(json_file)
+    lidars=[]
+    for lidar in config:
+        info=types.SimpleNamespace(name=lidar['name'],lidar_id=lidar.get('lidar_id',''),lat=lidar.get('lat',-999.),\
+                                   lon=lidar.get('lon',-999.),zsl=lidar.get('zsl',-999.),bearing=lidar.get('bearing',0),\
+                                   gc_corr=lidar.get('gc_corr',0),diff_WGS84=float('nan'),diff_geoid=float('nan'),\
+                                   diff_bessel=float('nan'))
+        files=expand(lidar['files'] if isinstance(lidar['files'],list) else [lidar['files']])
+        lidars.append({'lidar_info':info,'files':files,'path_out':lidar['path_out'],'vad_pattern':lidar.get('vad_pattern')})
+    status=scheduler.process_campaign(lidars,args.memory_budget,workers=args.workers,worker_memory=args.worker_memory,\
+                                      max_tasks_per_child=args.max_tasks_per_child,snr_threshold=args.snr_threshold)
+    states=[state for state in status.values()]
+    print('%i jobs: %i done, %i failed, %i skipped' \
+          %(len(states),states.count('done'),states.count('failed'),states.count('skipped')))
+
+def parser():
+    parser_main=argparse.ArgumentParser(prog='dwl',description='Doppler wind lidar toolbox')
+    parser_main.add_argument('--metrics',metavar='PATH',help='write timing, counters and peak memory to PATH (.prom or .jsonl)')
+    parser_main.add_argument('--trace-memory',action='store_true',help='peak python memory of each step (slower)')
+    subparsers=parser_main.add_subparsers(dest='command',metavar='command')
+    subparsers.required=True
+
+    p=subparsers.add_parser('convert',help='StreamLine .hpl files into l0 .nc files')
+    p.add_argument('files',nargs='+',help='.hpl files')
+    p.add_argument('-o','--path-out',required=True,help='output directory')
+    p.add_argument('--institution')
+    p.add_argument('--contact')
+    p.add_argument('--overwrite',action='store_true')
+    p.set_defaults(func=cmd_convert)
+
+    p=subparsers.add_parser('l1',help='l0 .nc files into corrected l1 .nc files')
+    p.add_argument('files',nargs='+',help='l0 .nc files')
+    p.add_argument('-o','--path-out',required=True,help='output directory')
+    add_lidar_arguments(p)
+    p.add_argument('--bearing',type=float,default=0,help='bearing of the lidar in deg')
+    p.set_defaults(func=cmd_l1)
+
+    p=subparsers.add_parser('vad',help='daily VAD .nc file of l1 conical scans')
+    p.add_argument('files',nargs='+',help='l1 .nc files of one day')
+    p.add_argument('-o','--path-out',required=True,help='output directory')
+    add_lidar_arguments(p)
+    p.add_argument('--snr-threshold',type=float,default=-22,help='SNR threshold in dB')
+    p.set_defaults(func=cmd_vad)
+
+    p=subparsers.add_parser('retrieve',help='time series of coplanar retrievals')
+    p.add_argument('--lidar',nargs=5,action='append',required=True,metavar=('NAME','X','Y','Z','FILES'),\
+                   help='name, location in m and l1 files (glob pattern) of a lidar; repeat for each lidar')
+    p.add_argument('-o','--file-out',required=True,help='output .nc file')
+    p.add_argument('--delta-l',type=float,help='grid spacing in m (default: from the scans)')
+    p.add_argument('--window',type=float,default=60,help='maximum time difference of paired scans in s')
+    p.add_argument('--snr-threshold',type=float,help='SNR threshold in dB')
+    p.add_argument('--db',help='SQLite catalog (dwl catalog) with the start times of the scans')
+    p.set_defaults(func=cmd_retrieve)
+
+    p=subparsers.add_parser('quicklook',help='quicklooks of VAD, l1 or retrieval .nc files')
+    p.add_argument('product',choices=['vad','l1','retrieval'])
+    p.add_argument('files',nargs='+',help='.nc files')
+    p.add_argument('-o','--path-out',required=True,help='output directory')
+    p.add_argument('--name',default='lidar',help='name of the lidar')
+    p.add_argument('--z-ref',type=float,default=0,help='surface height above mean sea level in m (vad)')
+    p.add_argument('--location',default='',help='location shown in the title (vad)')
+    p.add_argument('--date',default='',help='yyyymmdd (l1)')
+    p.add_argument('--snr-threshold',type=float,help='SNR threshold in dB (l1)')
+    p.add_argument('--processes',type=int,help='number of processes (vad, retrieval)')
+    p.add_argument('--overwrite',action='store_true',help='plot also days which are up to date (vad)')
+    p.set_defaults(func=cmd_quicklook)
+
+    p=subparsers.add_parser('scanfile',help='scan files for the StreamLine software')
+    p.add_argument('pattern',choices=['ppi','rhi','ppi_rhi','vad_csm','vad','ppi_el'])
+    p.add_argument('params',nargs='*',help='parameters of the pattern, e.g. az_start=0 az_end=90 el=2 s=3')
+    p.add_argument('-o','--path-out',required=True,help='output directory')
+    p.add_argument('--bearing',type=float,default=0,help='bearing of the lidar in deg')
+    p.add_argument('--sweep',action='store_true',help='write all combinations of list parameters, e.g. el=[0,2,4]')
+    p.set_defaults(func=cmd_scanfile)
+
+    p=subparsers.add_parser('catalog',help='SQLite catalog of l0, l1 and VAD .nc files')
+    p.add_argument('action',choices=['update','query'],help='update: index directories; query: print matching files')
+    p.add_argument('paths',nargs='*',help='directories to index (update)')
+    p.add_argument('--db',required=True,help='SQLite database file')
+    p.add_argument('--lidar',help='name of the lidar (update: of all indexed files)')
+    p.add_argument('--no-checksum',action='store_true',help='do not calculate sha256 of the files (update)')
+    p.add_argument('--product',choices=['l0','l1','vad'])
+    p.add_argument('--start',help='e.g. 2019-07-01 or "2019-07-01 12:00"')
+    p.add_argument('--end')
+    p.add_argument('--scan-type',help='part of the scan type, e.g. csm or Stare')
+    p.add_argument('--geometry',choices=['stare','ppi','rhi','other','vad'])
+    p.add_argument('--el',type=float,nargs=2,metavar=('MIN','MAX'),help='elevation range in deg')
+    p.add_argument('--az',type=float,nargs=2,metavar=('MIN','MAX'),help='azimuth range in deg')
+    p.add_argument('--gates',type=int,help='number of range gates')
+    p.set_defaults(func=cmd_catalog)
+
+    p=subparsers.add_parser('ingest',help='service converting new .hpl files into l0, l1 and VAD files')
+    p.add_argument('path_watch',help='data directory of the StreamLine software')
+    p.add_argument('-o','--path-out',required=True,help='output directory (subdirectories l0, l1, vad)')
+    add_lidar_arguments(p)
+    p.add_argument('--bearing',type=float,default=0,help='bearing of the lidar in deg')
+    p.add_argument('--workers',type=int,default=2,help='number of worker processes')
+    p.add_argument('--queue-size',type=int,default=8,help='maximum number of files waiting for a worker')
+    p.add_argument('--interval',type=float,default=10,help='time between polls in s')
+    p.add_argument('--settle',type=float,default=30,help='files modified within the last SETTLE s are not processed')
+    p.add_argument('--vad-pattern',help='file name pattern of .hpl files of VAD scans, e.g. "VAD_*"')
+    p.add_argument('--snr-threshold',type=float,default=-22,help='SNR threshold of the VAD retrieval in dB')
+    p.add_argument('--once',action='store_true',help='process the current files and exit')
+    # the service writes the metrics itself while it is running
+    p.set_defaults(func=cmd_ingest,own_metrics=True)
+
+    p=subparsers.add_parser('schedule',help='l0, l1 and VAD files of several lidars within a memory budget')
+    p.add_argument('config',help='JSON file with a list of lidars (name, lidar_id, lat, lon, zsl, bearing, files, path_out, vad_pattern)')
+    p.add_argument('--memory-budget',type=memory_size,required=True,help='memory of all workers and jobs, e.g. 8G')
+    p.add_argument('--workers',type=int,help='number of worker processes (default: from CPUs and memory budget)')
+    p.add_argument('--worker-memory',type=memory_size,default=150e6,help='memory of an idle worker (default: 150M)')
+    p.add_argument('--max-tasks-per-child',type=int,help='new worker process after this number of jobs (python>=3.11)')
+    p.add_argument('--snr-threshold',type=float,default=-22,help='SNR threshold of the VAD retrieval in dB')
+    p.set_defaults(func=cmd_schedule)
+
+    return parser_main
+
+def main(argv=None):
+    args=parser().parse_args(argv)
+    if args.metrics is None or getattr(args,'own_metrics',False):
+        args.func(args)
+        return
+
+    from . import instrument
+    instrument.enable(trace_memory=args.trace_memory)
+    try:
+        with instrument.timer(args.command):
+            args.func(args)
+    finally:
+        instrument.write(args.metrics)
+
+if __name__=='__main__':
+    main()
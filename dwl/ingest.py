@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ingest service for new StreamLine .hpl files (asyncio)
+The data directory of the StreamLine software is polled for new or changed .hpl
+files. Files which were not modified for settle seconds are converted into l0
+and l1 .nc files (hpl_to_netcdf, to_netcdf_l1) in a pool of worker processes;
+for files matching vad_pattern the daily VAD file is updated (vad_l1.vad_day).
+    - process_hpl(): l0 and l1 file of one .hpl file (worker process)
+    - process_vad(): daily VAD file of the l1 files of one day (worker process)
+    - ingest: the service; run() polls until stopped, run(once=True) processes
+              the current files and returns
+
+Backpressure: new files are put into a queue of limited size; when the workers
+are busy the polling waits until there is space in the queue again.
+Processed files are kept with size and modification time in a state file
+(path_out/ingest_state.json); they are processed again only if they change.
+Metrics (see instrument.py) are written to metrics_path after each file:
+    gauges      - ingest_queue_depth, ingest_in_progress
+    stages      - ingest_latency (modification of the file until its l1 file is
+                  written), ingest_wait (time in the queue), hpl_to_netcdf,
+                  to_netcdf_l1, vad_day (measured in the workers)
+    counters    - ingest_files_done, ingest_files_failed
+usage:
+    dwl --metrics ingest.prom ingest /data/SLXR_142 -o /products/SLXR_142 --bearing 18.4 --vad-pattern "VAD_*"
+"""
+import os
+import time
+import json
+import fnmatch
+import asyncio
+import concurrent.futures
+
+from . import instrument
+
+'''
+l0 and l1 file of one .hpl file; l1 files are written into the same
+yyyy/yyyymm/yyyymmdd directories below path_l1 as the l0 files below path_l0
+Output:
+    path of l1 file, dictionary with durations in s of the steps
+'''
+def process_hpl(file_path,path_l0,path_l1,lidar_info):
+    from .netcdf import hpl2NetCDF
+    durations=dict()
+    t_start=time.perf_counter()
+    file_l0=hpl2NetCDF.hpl_to_netcdf(file_path,path_l0,overwrite=True)
+    durations['hpl_to_netcdf']=time.perf_counter()-t_start
+    if file_l0 is None:
+        raise ValueError('%s cannot be converted' % file_path)
+
+    path_l1_date=os.path.join(path_l1,os.path.relpath(os.path.dirname(file_l0),path_l0))
+    file_name_l1=os.path.basename(file_l0).replace('_l0.nc','_l1.nc')
+    t_start=time.perf_counter()
+    hpl2NetCDF.to_netcdf_l1(file_l0,file_name_l1,lidar_info,path_l1_date)
+    durations['to_netcdf_l1']=time.perf_counter()-t_start
+
+    return os.path.join(path_l1_date,file_name_l1),durations
+
+'''
+daily VAD file of the l1 files of one day
+'''
+def process_vad(files_l1,path_vad,lidar_info,snr_threshold):
+    from .VAD_retrieval import vad_l1
+    t_start=time.perf_counter()
+    file_vad=vad_l1.vad_day(sorted(files_l1),lidar_info,path_vad,snr_threshold=snr_threshold)
+    return file_vad,{'vad_day':time.perf_counter()-t_start}
+
+'''
+Input:
+    path_watch      - data directory of the StreamLine software (searched recursively)
+    path_out        - output directory with subdirectories l0, l1 and vad
+    lidar_info      - see hpl2NetCDF.to_netcdf_l1 and vad2NetCDF.to_netcdf
+    workers         - number of worker processes
+    queue_size      - maximum number of files waiting for a worker
+    interval in s   - time between two polls of path_watch
+    settle in s     - files modified within the last settle seconds are not processed
+    vad_pattern     - file name pattern of .hpl files of VAD scans (e.g. 'VAD_*'); None: no VAD
+    snr_threshold in dB - of the VAD retrieval
+    metrics_path    - file of the metrics (.prom or .jsonl, see instrument.write)
+'''
+class ingest:
+    def __init__(self,path_watch,path_out,lidar_info,workers=2,queue_size=8,interval=10.,settle=30.,\
+                 vad_pattern=None,snr_threshold=-22,metrics_path=None):
+        self.path_watch=path_watch
+        self.path_l0,self.path_l1,self.path_vad=[os.path.join(path_out,level) for level in ['l0','l1','vad']]
+        self.lidar_info=lidar_info
+        self.workers=workers
+        self.queue_size=queue_size
+        self.interval=interval
+        self.settle=settle
+        self.vad_pattern=vad_pattern
+        self.snr_threshold=snr_threshold
+        self.metrics_path=metrics_path
+
+        self.state_path=os.path.join(path_out,'ingest_state.json')
+        self.state=dict()
+        if os.path.isfile(self.state_path):
+            with open(self.state_path,'r') as json_file:
+                self.state=json.load(json_file)
+        self.in_progress=set()
+        self.vad_days=dict() # day: set of l1 files of VAD scans
+        self.vad_locks=dict()
+        if metrics_path is not None: instrument.enable()
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path),exist_ok=True)
+        with open(self.state_path+'.tmp','w') as json_file:
+            json.dump(self.state,json_file)
+        os.replace(self.state_path+'.tmp',self.state_path)
+
+    def _metrics(self,queue):
+        instrument.gauge('ingest_queue_depth',queue.qsize())
+        instrument.gauge('ingest_in_progress',len(self.in_progress)-queue.qsize())
+        # JSON lines are appended once at the end of run_async
+        if self.metrics_path is not None and self.metrics_path.endswith('.prom'):
+            instrument.write_prometheus(self.metrics_path)
+
+    '''
+    .hpl files which are new or changed and settled: (path, size, mtime_ns)
+    '''
+    def scan(self):
+        files=[]
+        time_now=time.time()
+        for path,dirs,file_names in os.walk(self.path_watch):
+            for file_name in sorted(file_names):
+                if not file_name.endswith('.hpl'): continue
+                file_path=os.path.join(path,file_name)
+                if file_path in self.in_progress: continue
+                try:
+                    stat=os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                if time_now-stat.st_mtime<self.settle: continue
+                if self.state.get(file_path,[None,None])[:2]==[stat.st_size,stat.st_mtime_ns]: continue
+                files.append((file_path,stat.st_size,stat.st_mtime_ns))
+        return files
+
+    async def _poll(self,queue,once):
+        while True:
+            for file_path,size,mtime_ns in self.scan():
+                self.in_progress.add(file_path)
+                # waits while the queue is full (backpressure)
+                await queue.put((file_path,size,mtime_ns,time.time()))
+                self._metrics(queue)
+            if once: return
+            await asyncio.sleep(self.interval)
+
+    async def _worker(self,queue,executor):
+        loop=asyncio.get_running_loop()
+        while True:
+            file_path,size,mtime_ns,t_queued=await queue.get()
+            instrument.observe('ingest_wait',time.time()-t_queued)
+            try:
+                file_l1,durations=await loop.run_in_executor(executor,process_hpl,file_path,\
+                                                             self.path_l0,self.path_l1,self.lidar_info)
+                for stage,duration in durations.items(): instrument.observe(stage,duration)
+                instrument.observe('ingest_latency',time.time()-mtime_ns/1e9)
+                self.state[file_path]=[size,mtime_ns,'done']
+                instrument.count('ingest_files_done')
+                if self.vad_pattern is not None and fnmatch.fnmatch(os.path.basename(file_path),self.vad_pattern):
+                    await self._update_vad(file_l1,executor)
+            except (Exception,SystemExit) as error:
+                # SystemExit of a worker marks only this file as failed
+                print('%s failed: %r' %(file_path,error))
+                self.state[file_path]=[size,mtime_ns,'failed']
+                instrument.count('ingest_files_failed')
+            finally:
+                self.in_progress.discard(file_path)
+                self._save_state()
+                queue.task_done()
+                self._metrics(queue)
+
+    '''
+    VAD file of the day of file_l1; one update per day at a time
+    '''
+    async def _update_vad(self,file_l1,executor):
+        day=os.path.basename(os.path.dirname(file_l1))
+        files_day=self.vad_days.setdefault(day,set())
+        if not files_day:
+            # VAD l1 files of this day processed before a restart
+            files_day.update(os.path.join(os.path.dirname(file_l1),file_name) for file_name in os.listdir(os.path.dirname(file_l1)) \
+                             if fnmatch.fnmatch(file_name.replace('_l1.nc','.hpl'),self.vad_pattern))
+        files_day.add(file_l1)
+        lock=self.vad_locks.setdefault(day,asyncio.Lock())
+        async with lock:
+            loop=asyncio.get_running_loop()
+            file_vad,durations=await loop.run_in_executor(executor,process_vad,sorted(files_day),\
+                                                          self.path_vad,self.lidar_info,self.snr_threshold)
+            for stage,duration in durations.items(): instrument.observe(stage,duration)
+
+    '''
+    poll path_watch and process new files until cancelled (or until the current
+    files are processed if once is True)
+    '''
+    async def run_async(self,once=False):
+        queue=asyncio.Queue(maxsize=self.queue_size)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+            workers=[asyncio.create_task(self._worker(queue,executor)) for wi in range(self.workers)]
+            try:
+                await self._poll(queue,once)
+                await queue.join()
+            finally:
+                for worker in workers: worker.cancel()
+                await asyncio.gather(*workers,return_exceptions=True)
+                if self.metrics_path is not None: instrument.write(self.metrics_path)
+
+    def run(self,once=False):
+        try:
+            asyncio.run(self.run_async(once))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Timing, counters and peak memory of the processing steps
+    - timed(): decorator measuring the run time of a function (stage)
+    - timer(): context manager measuring the run time of a block
+    - count(): add to a counter (e.g. rays, gates, grid cells, files)
+    - observe(): add a duration measured elsewhere (e.g. in a worker process)
+    - gauge(): set a current value (e.g. queue depth)
+    - enable(), disable(), reset()
+    - summary(), write_jsonl(), write_prometheus(): export of the results
+
+The instrumentation is disabled by default (or enabled with the environment
+variable DWL_METRICS=1). When disabled, timed functions and count() only check
+one flag. For each stage the number of calls, the total and maximum run time and
+the peak resident memory of the process (resource.getrusage) after the stage are
+kept; with enable(trace_memory=True) also the peak of the memory allocated by
+python during the stage (tracemalloc, slows down the processing); the peak of a
+stage includes the peaks of the stages nested in it.
+Only the standard library is used.
+"""
+import os,sys,time,json
+import functools
+import contextlib
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource=None
+
+class _state:
+    enabled=os.environ.get('DWL_METRICS','0') not in ('','0')
+    trace_memory=False
+    traced_peaks=[] # traced peak of each running timer (nested timers)
+    stages=dict()
+    counters=dict()
+    gauges=dict()
+
+def enable(trace_memory=False):
+    _state.enabled=True
+    _state.trace_memory=trace_memory
+    if trace_memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing(): tracemalloc.start()
+
+def disable():
+    _state.enabled=False
+    if _state.trace_memory:
+        import tracemalloc
+        tracemalloc.stop()
+        _state.trace_memory=False
+
+def reset():
+    _state.stages=dict()
+    _state.counters=dict()
+    _state.gauges=dict()
+
+def is_enabled():
+    return _state.enabled
+
+'''
+peak resident memory of the process in bytes (NaN if not available)
+'''
+def peak_rss():
+    if resource is None: return float('nan')
+    rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform=='darwin' else rss*1024
+
+def _record(stage,duration,traced_peak):
+    stage_temp=_state.stages.setdefault(stage,{'calls':0,'seconds':0.,'seconds_max':0.,'traced_peak_bytes':0})
+    stage_temp['calls']+=1
+    stage_temp['seconds']+=duration
+    stage_temp['seconds_max']=max(stage_temp['seconds_max'],duration)
+    stage_temp['peak_rss_bytes']=peak_rss()
+    if traced_peak is not None:
+        stage_temp['traced_peak_bytes']=max(stage_temp['traced_peak_bytes'],traced_peak)
+
+'''
+context manager measuring the run time of a block
+    with instrument.timer('read_files'):
+        ...
+'''
+@contextlib.contextmanager
+def timer(stage):
+    if not _state.enabled:
+        yield
+        return
+    trace_memory=_state.trace_memory
+    if trace_memory:
+        # the peak of an enclosing timer is kept before the peak is reset for this block
+        import tracemalloc
+        if _state.traced_peaks:
+            _state.traced_peaks[-1]=max(_state.traced_peaks[-1],tracemalloc.get_traced_memory()[1])
+        _state.traced_peaks.append(0)
+        tracemalloc.reset_peak()
+    t_start=time.perf_counter()
+    try:
+        yield
+    finally:
+        duration=time.perf_counter()-t_start
+        traced_peak=None
+        if trace_memory:
+            traced_peak=max(_state.traced_peaks.pop(),tracemalloc.get_traced_memory()[1])
+            if _state.traced_peaks:
+                _state.traced_peaks[-1]=max(_state.traced_peaks[-1],traced_peak)
+        _record(stage,duration,traced_peak)
+
+'''
+decorator measuring the run time of a function
+    @instrument.timed('hpl2dict')
+    def hpl2dict(file_path):
+'''
+def timed(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args,**kwargs):
+            if not _state.enabled:
+                return func(*args,**kwargs)
+            with timer(stage):
+                return func(*args,**kwargs)
+        return wrapper
+    return decorator
+
+'''
+add n to counter name
+'''
+def count(name,n=1):
+    if not _state.enabled: return
+    _state.counters[name]=_state.counters.get(name,0)+int(n)
+
+'''
+add a duration in s of stage which was measured elsewhere
+'''
+def observe(stage,duration):
+    if not _state.enabled: return
+    _record(stage,duration,None)
+
+'''
+set gauge name to value
+'''
+def gauge(name,value):
+    if not _state.enabled: return
+    _state.gauges[name]=value
+
+'''
+stages, counters and gauges as dictionary
+'''
+def summary():
+    return {'stages':{stage:dict(values) for stage,values in _state.stages.items()},\
+            'counters':dict(_state.counters),'gauges':dict(_state.gauges),'peak_rss_bytes':peak_rss()}
+
+'''
+append one JSON line per stage and one line with the counters and gauges to file_path
+(one record per run, e.g. for a log of many runs)
+'''
+def write_jsonl(file_path):
+    time_now=time.time()
+    lines=[json.dumps(dict(values,type='stage',stage=stage,time=time_now)) for stage,values in _state.stages.items()]
+    lines.append(json.dumps({'type':'counters','time':time_now,'counters':_state.counters,'gauges':_state.gauges,\
+                             'peak_rss_bytes':peak_rss()}))
+    with open(file_path,'a') as text_file:
+        text_file.write('\n'.join(lines)+'\n')
+
+'''
+write stages, counters and gauges in Prometheus text format to file_path (e.g. for the
+textfile collector of the node exporter); the file is replaced at once
+'''
+def write_prometheus(file_path,prefix='dwl'):
+    lines=['# TYPE %s_stage_calls_total counter' % prefix]
+    lines+=['%s_stage_calls_total{stage="%s"} %i' % (prefix,stage,values['calls']) for stage,values in _state.stages.items()]
+    lines+=['# TYPE %s_stage_seconds_total counter' % prefix]
+    lines+=['%s_stage_seconds_total{stage="%s"} %.6f' % (prefix,stage,values['seconds']) for stage,values in _state.stages.items()]
+    lines+=['# TYPE %s_stage_seconds_max gauge' % prefix]
+    lines+=['%s_stage_seconds_max{stage="%s"} %.6f' % (prefix,stage,values['seconds_max']) for stage,values in _state.stages.items()]
+    lines+=['# TYPE %s_stage_peak_rss_bytes gauge' % prefix]
+    lines+=['%s_stage_peak_rss_bytes{stage="%s"} %.0f' % (prefix,stage,values['peak_rss_bytes']) for stage,values in _state.stages.items()]
+    if _state.trace_memory:
+        lines+=['# TYPE %s_stage_traced_peak_bytes gauge' % prefix]
+        lines+=['%s_stage_traced_peak_bytes{stage="%s"} %i' % (prefix,stage,values['traced_peak_bytes']) for stage,values in _state.stages.items()]
+    lines+=['# TYPE %s_items_total counter' % prefix]
+    lines+=['%s_items_total{name="%s"} %i' % (prefix,name,n) for name,n in _state.counters.items()]
+    lines+=['# TYPE %s_gauge gauge' % prefix]
+    lines+=['%s_gauge{name="%s"} %g' % (prefix,name,value) for name,value in _state.gauges.items()]
+    lines+=['# TYPE %s_peak_rss_bytes gauge' % prefix,'%s_peak_rss_bytes %.0f' % (prefix,peak_rss())]
+    with open(file_path+'.tmp','w') as text_file:
+        text_file.write('\n'.join(lines)+'\n')
+    os.replace(file_path+'.tmp',file_path)
+
+'''
+write results to file_path; Prometheus format for *.prom, JSON lines otherwise
+'''
+def write(file_path):
+    if file_path.endswith('.prom'):
+        write_prometheus(file_path)
+    else:
+        write_jsonl(file_path)
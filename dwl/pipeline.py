@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline of processing stages with a content-hashed cache of the outputs
+    - pipeline: graph (DAG) of stages; add() declares a stage, run() computes
+                the stages which are not cached, independent stages in parallel
+    - stage_l0, stage_l1, stage_vad, stage_quicklook_vad: stages of the toolbox
+      (hpl -> l0 -> l1 -> VAD -> quicklook)
+
+Each stage declares its inputs (files or names of other stages) and parameters.
+The key of a stage is a sha256 hash of the stage function (source code), the
+parameters and the keys of its inputs (content hash of input files, key of input
+stages). The outputs are written into cache_dir/name/key/ and reused as long as
+the key does not change, so after changing a parameter (e.g. bearing of
+lidar_info, snr_threshold) only this stage and the stages depending on it are
+computed again. Outputs of a stage appear only after the stage is finished (it
+writes into a temporary directory which is renamed).
+
+A stage function is called as func(inputs,path_out,**params) with inputs the list
+of input files (output files of input stages) and returns the list of written
+files (or one file). Stages run in separate processes (netCDF4/HDF5 is not
+thread-safe), so the functions must be defined at module level.
+example:
+    p=pipeline('cache')
+    for file_path in hpl_files:
+        name=os.path.basename(file_path)[:-4]
+        p.add('l0/'+name,stage_l0,[file_path])
+        p.add('l1/'+name,stage_l1,['l0/'+name],lidar_info=lidar_info)
+    p.add('vad',stage_vad,['l1/'+os.path.basename(f)[:-4] for f in hpl_files],lidar_info=lidar_info,snr_threshold=-22)
+    p.add('quicklook',stage_quicklook_vad,['vad'],lidar_str='SLXR_142',z_ref=546,location='Kolsass')
+    status=p.run(workers=4)
+"""
+import os
+import glob
+import json
+import shutil
+import hashlib
+import inspect
+import concurrent.futures
+
+'''
+sha256 of a file, read in blocks of 1 MB
+'''
+def file_hash(file_path,block_size=2**20):
+    sha=hashlib.sha256()
+    with open(file_path,'rb') as file_temp:
+        for block in iter(lambda: file_temp.read(block_size),b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+'''
+parameters as JSON text for the key; objects (e.g. lidar_info) by their
+attributes, numpy arrays as lists
+'''
+def _json_default(value):
+    if hasattr(value,'tolist'): return value.tolist()
+    if hasattr(value,'__dict__'): return vars(value)
+    return repr(value)
+
+def params_text(params):
+    return json.dumps(params,sort_keys=True,default=_json_default)
+
+'''
+source code of the stage function; changes of the function change the key
+'''
+def func_text(func):
+    try:
+        return inspect.getsource(func)
+    except (OSError,TypeError):
+        return '%s.%s' %(func.__module__,func.__qualname__)
+
+class stage:
+    def __init__(self,name,func,inputs,params):
+        self.name=name
+        self.func=func
+        self.inputs=list(inputs)
+        self.params=params
+        self.key=None
+
+'''
+run one stage into a temporary directory which is renamed to path_out when the
+stage is finished (executed in the worker processes)
+'''
+def _run_stage(func,inputs,path_out,params):
+    path_temp=path_out+'.tmp%i' % os.getpid()
+    if os.path.exists(path_temp): shutil.rmtree(path_temp)
+    os.makedirs(path_temp)
+    try:
+        outputs=func(inputs,path_temp,**params)
+        if outputs is None: outputs=[]
+        if isinstance(outputs,str): outputs=[outputs]
+        outputs=[os.path.relpath(os.path.abspath(output),path_temp) for output in outputs]
+        with open(os.path.join(path_temp,'manifest.json'),'w') as json_file:
+            json.dump({'outputs':outputs,'inputs':inputs,'params':params_text(params)},json_file,indent=1)
+        if os.path.exists(path_out): shutil.rmtree(path_out)
+        os.replace(path_temp,path_out)
+    except BaseException:
+        shutil.rmtree(path_temp,ignore_errors=True)
+        raise
+
+    return outputs
+
+class pipeline:
+    '''
+    cache_dir   - directory of the outputs of all stages
+    '''
+    def __init__(self,cache_dir):
+        self.cache_dir=cache_dir
+        self.stages=dict()
+        self._hashes_path=os.path.join(cache_dir,'file_hashes.json')
+        self._hashes=None
+
+    '''
+    declare a stage
+    Input:
+        name    - unique name of the stage (may contain '/' for grouping)
+        func    - stage function func(inputs,path_out,**params)
+        inputs  - list of input files or names of stages
+        params  - parameters of func (part of the key)
+    '''
+    def add(self,name,func,inputs=(),**params):
+        if name in self.stages: raise ValueError('stage %s already exists' % name)
+        self.stages[name]=stage(name,func,inputs,params)
+        return name
+
+    '''
+    content hash of an input file; hashes are kept in the cache directory and only
+    calculated again if size or modification time of the file changed
+    '''
+    def _file_hash(self,file_path):
+        if self._hashes is None:
+            self._hashes=dict()
+            if os.path.isfile(self._hashes_path):
+                with open(self._hashes_path,'r') as json_file:
+                    self._hashes=json.load(json_file)
+        path_abs=os.path.abspath(file_path)
+        stat=os.stat(path_abs)
+        entry=self._hashes.get(path_abs)
+        if entry is None or entry[:2]!=[stat.st_size,stat.st_mtime_ns]:
+            entry=[stat.st_size,stat.st_mtime_ns,file_hash(path_abs)]
+            self._hashes[path_abs]=entry
+        return entry[2]
+
+    def _save_hashes(self):
+        if self._hashes is None: return
+        os.makedirs(self.cache_dir,exist_ok=True)
+        with open(self._hashes_path+'.tmp','w') as json_file:
+            json.dump(self._hashes,json_file)
+        os.replace(self._hashes_path+'.tmp',self._hashes_path)
+
+    '''
+    stages in topological order (inputs before the stages using them)
+    '''
+    def order(self):
+        order,state=[],dict()
+        def visit(name,path):
+            if state.get(name)=='done': return
+            if state.get(name)=='visiting':
+                raise ValueError('cycle in pipeline: %s' % ' -> '.join(path+[name]))
+            state[name]='visiting'
+            for input_temp in self.stages[name].inputs:
+                if input_temp in self.stages: visit(input_temp,path+[name])
+            state[name]='done'
+            order.append(name)
+        for name in self.stages:
+            visit(name,[])
+        return order
+
+    '''
+    keys of all stages
+    '''
+    def keys(self):
+        for name in self.order():
+            stage_temp=self.stages[name]
+            sha=hashlib.sha256()
+            sha.update(func_text(stage_temp.func).encode())
+            sha.update(params_text(stage_temp.params).encode())
+            for input_temp in stage_temp.inputs:
+                if input_temp in self.stages:
+                    sha.update(('stage:%s:%s' %(input_temp,self.stages[input_temp].key)).encode())
+                else:
+                    sha.update(('file:%s' % self._file_hash(input_temp)).encode())
+            stage_temp.key=sha.hexdigest()[:16]
+        self._save_hashes()
+        return {name:stage_temp.key for name,stage_temp in self.stages.items()}
+
+    def path(self,name):
+        return os.path.join(self.cache_dir,name,self.stages[name].key)
+
+    '''
+    output files of a computed stage (None if not in the cache)
+    '''
+    def outputs(self,name):
+        if self.stages[name].key is None: self.keys()
+        path_stage=self.path(name)
+        manifest=os.path.join(path_stage,'manifest.json')
+        if not os.path.isfile(manifest): return None
+        with open(manifest,'r') as json_file:
+            return [os.path.join(path_stage,output) for output in json.load(json_file)['outputs']]
+
+    def _inputs(self,name):
+        inputs=[]
+        for input_temp in self.stages[name].inputs:
+            inputs+=self.outputs(input_temp) if input_temp in self.stages else [os.path.abspath(input_temp)]
+        return inputs
+
+    '''
+    compute all stages (or the given stages and their inputs) which are not cached
+    Input:
+        targets - names of stages (default: all)
+        workers - number of worker processes; 1: stages run in this process
+        force   - compute also cached stages
+    Output:
+        dictionary stage name: 'cached', 'computed', 'failed' or 'skipped' (an input failed)
+    '''
+    def run(self,targets=None,workers=None,force=False):
+        self.keys()
+        order=self.order()
+        if targets is not None:
+            needed=set()
+            def collect(name):
+                if name in needed: return
+                needed.add(name)
+                for input_temp in self.stages[name].inputs:
+                    if input_temp in self.stages: collect(input_temp)
+            for name in targets: collect(name)
+            order=[name for name in order if name in needed]
+
+        status=dict()
+        pending=[]
+        for name in order:
+            if not force and self.outputs(name) is not None:
+                status[name]='cached'
+            else:
+                pending.append(name)
+
+        def ready(name):
+            deps=[input_temp for input_temp in self.stages[name].inputs if input_temp in self.stages]
+            if any(status.get(dep) in ('failed','skipped') for dep in deps): return 'skipped'
+            return all(status.get(dep) in ('cached','computed') for dep in deps)
+
+        workers=workers or os.cpu_count() or 1
+        if workers==1:
+            for name in pending:
+                if ready(name)=='skipped':
+                    status[name]='skipped'
+                    continue
+                status[name]=self._run_local(name)
+            return status
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            running=dict()
+            while pending or running:
+                for name in list(pending):
+                    state_temp=ready(name)
+                    if state_temp=='skipped':
+                        status[name]='skipped'
+                        pending.remove(name)
+                    elif state_temp:
+                        stage_temp=self.stages[name]
+                        running[executor.submit(_run_stage,stage_temp.func,self._inputs(name),\
+                                                self.path(name),stage_temp.params)]=name
+                        pending.remove(name)
+                if not running: continue
+                done,not_done=concurrent.futures.wait(running,return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name=running.pop(future)
+                    try:
+                        future.result()
+                        status[name]='computed'
+                    except (Exception,SystemExit) as error:
+                        # SystemExit of a stage function fails only this stage
+                        print('stage %s failed: %r' %(name,error))
+                        status[name]='failed'
+
+        return status
+
+    def _run_local(self,name):
+        stage_temp=self.stages[name]
+        try:
+            _run_stage(stage_temp.func,self._inputs(name),self.path(name),stage_temp.params)
+            return 'computed'
+        except (Exception,SystemExit) as error:
+            print('stage %s failed: %r' %(name,error))
+            return 'failed'
+
+    '''
+    remove cached outputs of the stages which are not the current key of a stage
+    '''
+    def clean(self):
+        self.keys()
+        removed=[]
+        for name,stage_temp in self.stages.items():
+            path_name=os.path.join(self.cache_dir,name)
+            for key in os.listdir(path_name) if os.path.isdir(path_name) else []:
+                if key!=stage_temp.key and os.path.isdir(os.path.join(path_name,key)):
+                    shutil.rmtree(os.path.join(path_name,key))
+                    removed.append(os.path.join(name,key))
+        return removed
+
+'''
+stages of the toolbox; the modules are imported in the worker processes
+'''
+def stage_l0(inputs,path_out,institution=None,contact=None):
+    from .netcdf import hpl2NetCDF
+    for file_path in inputs:
+        hpl2NetCDF.hpl_to_netcdf(file_path,path_out,institution=institution,contact=contact,overwrite=True)
+    return sorted(glob.glob(os.path.join(path_out,'**','*_l0.nc'),recursive=True))
+
+def stage_l1(inputs,path_out,lidar_info):
+    from .netcdf import hpl2NetCDF
+    outputs=[]
+    for file_path in inputs:
+        file_name_out=os.path.basename(file_path).replace('_l0.nc','_l1.nc')
+        hpl2NetCDF.to_netcdf_l1(file_path,file_name_out,lidar_info,path_out)
+        outputs.append(os.path.join(path_out,file_name_out))
+    return outputs
+
+def stage_vad(inputs,path_out,lidar_info,snr_threshold=-22):
+    from .VAD_retrieval import vad_l1
+    return vad_l1.vad_day(inputs,lidar_info,path_out,snr_threshold=snr_threshold)
+
+def stage_quicklook_vad(inputs,path_out,lidar_str,z_ref,location):
+    import matplotlib as mpl
+    mpl.use('Agg')
+    from .quicklooks import plot_vad
+    quicklook=plot_vad.vad_quicklook(lidar_str,z_ref,location)
+    outputs=[]
+    for file_path in inputs:
+        date_str=os.path.basename(file_path).split('_')[-2]
+        plot_vad.plot_VAD_day(file_path,path_out,lidar_str,date_str,z_ref,location,quicklook=quicklook)
+        outputs.append(os.path.join(path_out,'%s_%s_vad.png' %(lidar_str,date_str)))
+    quicklook.close()
+    return outputs
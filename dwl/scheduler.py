@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Processing of several lidars at once within a memory budget
+    - read_hpl_header(): range gates and (estimated) rays of a .hpl file from its
+                         header and first ray, without reading the whole file
+    - estimate_memory(): peak memory in bytes of the l1 job (hpl2dict, hpl_to_netcdf,
+                         to_netcdf_l1) or the VAD job of a day
+    - scheduler: runs jobs in a pool of worker processes; a job is only started if
+                 the estimated memory of all running jobs and of the workers stays
+                 within the budget
+    - process_campaign(): l0, l1 and VAD files of several lidars (see ingest.py)
+
+The memory of a job is estimated from number_of_gates x rays: hpl2dict holds
+the lines of the file as python strings and four float64 matrices (radial
+velocity, intensity, beta, spectral width); vad_day holds radial velocity, SNR
+and intensity of all scans of a day as float64. Jobs are started in the order
+they were added, alternating between lidars; jobs which do not fit into the
+free memory are passed by smaller jobs (at most 2 x workers times, then the
+waiting job is started next). A job larger than the budget runs alone.
+The VAD file of a day (date of the start time in the .hpl header) is calculated
+from the l1 files which were written; failed files are left out.
+Metrics (see instrument.py): gauges scheduler_memory_running and
+scheduler_memory_peak (estimated memory of the running jobs), stages
+hpl_to_netcdf, to_netcdf_l1 and vad_day (measured in the workers).
+example:
+    lidars=[{'lidar_info':lidar_info_142,'files':glob.glob('SLXR_142/*.hpl'),'path_out':'products/SLXR_142','vad_pattern':'VAD_*'},
+            {'lidar_info':lidar_info_88,'files':glob.glob('SL_88/*.hpl'),'path_out':'products/SL_88'}]
+    status=process_campaign(lidars,memory_budget=8e9)
+"""
+import os
+import sys
+import fnmatch
+import concurrent.futures
+
+from . import instrument
+from . import ingest
+
+header_n=17 # lines of the header of .hpl files
+
+# bytes per line of a .hpl file kept as python string in a list (object header and list pointer)
+line_overhead=57
+
+'''
+number of range gates and rays of a .hpl file; the number of rays is estimated
+from the file size and the length of the first ray (header line and gates)
+Output:
+    gates_n, rays_n, file_size in bytes, date of the start time (yyyymmdd)
+'''
+def read_hpl_header(file_path):
+    file_size=os.path.getsize(file_path)
+    with open(file_path,'r') as text_file:
+        header=[text_file.readline() for li in range(header_n)]
+        gates_n=int(header[2].split()[-1])
+        datestr=header[9].split()[-2]
+        ray=[text_file.readline() for li in range(gates_n+1)]
+    bytes_header=sum(len(line) for line in header)
+    bytes_ray=sum(len(line) for line in ray)
+    rays_n=int(round((file_size-bytes_header)/bytes_ray)) if bytes_ray>0 else 0
+
+    return gates_n,rays_n,file_size,datestr
+
+'''
+estimated peak memory in bytes of a job (in addition to the memory of the worker)
+Input:
+    stage       - 'l1': hpl2dict, hpl_to_netcdf and to_netcdf_l1 of one file
+                  'vad': vad_day of all files of a day
+    gates_n, rays_n - range gates and rays (for 'vad': sum of rays of all files)
+    file_size   - size of the .hpl file in bytes ('l1')
+    overhead    - factor for temporary arrays
+'''
+def estimate_memory(stage,gates_n,rays_n,file_size=0,overhead=1.2):
+    cells=gates_n*rays_n
+    if stage=='l1':
+        lines_n=rays_n*(gates_n+1)+header_n
+        return overhead*(file_size+line_overhead*lines_n+4*8*cells)
+    if stage=='vad':
+        return overhead*5*8*cells
+    raise ValueError('unknown stage %s' % stage)
+
+class job:
+    def __init__(self,name,func,args,memory,lidar,after,partial):
+        self.name=name
+        self.func=func
+        self.args=args
+        self.memory=memory
+        self.lidar=lidar
+        self.after=list(after)
+        self.partial=partial
+        self.skipped=0
+
+    '''
+    'wait', 'ready' or 'skipped' from the status of the jobs in after
+    '''
+    def state(self,status):
+        deps=[status.get(dep) for dep in self.after]
+        if self.partial:
+            if None in deps: return 'wait'
+            return 'ready' if not deps or 'done' in deps else 'skipped'
+        if any(dep in ('failed','skipped') for dep in deps): return 'skipped'
+        return 'ready' if all(dep=='done' for dep in deps) else 'wait'
+
+'''
+Input:
+    memory_budget in bytes - maximum memory of the workers and running jobs
+    workers         - number of worker processes (default: number of CPUs, reduced
+                      so that worker_memory of all workers and a typical job fit)
+    worker_memory in bytes - memory of an idle worker (python with numpy, netCDF4, xarray)
+    max_tasks_per_child - new worker process after this number of jobs (python>=3.11),
+                      e.g. 1 if the memory of finished jobs is not returned to the system
+'''
+class scheduler:
+    def __init__(self,memory_budget,workers=None,worker_memory=150e6,max_tasks_per_child=None):
+        if max_tasks_per_child is not None and sys.version_info<(3,11):
+            raise ValueError('max_tasks_per_child needs python>=3.11')
+        self.memory_budget=memory_budget
+        self.workers=workers
+        self.worker_memory=worker_memory
+        self.max_tasks_per_child=max_tasks_per_child
+        self.jobs=dict()
+        self.lidars=[]
+
+    '''
+    add job func(*args) with estimated memory in bytes; the job is started after
+    the jobs named in after are finished
+    Input:
+        args    - arguments of func, or a function of the results of the finished
+                  jobs in after (dictionary job name: result) returning the arguments
+        partial - start the job also if some jobs in after failed (skipped if all
+                  failed); otherwise the job is skipped if one of them failed
+    '''
+    def add(self,name,func,args=(),memory=0,lidar=None,after=(),partial=False):
+        if name in self.jobs: raise ValueError('job %s already exists' % name)
+        if lidar not in self.lidars: self.lidars.append(lidar)
+        self.jobs[name]=job(name,func,args,memory,lidar,after,partial)
+        return name
+
+    '''
+    jobs in the order they are started: alternating between the lidars
+    '''
+    def _order(self):
+        rank=dict()
+        for lidar in self.lidars:
+            names=[name for name,job_temp in self.jobs.items() if job_temp.lidar==lidar]
+            for ji,name in enumerate(names):
+                rank[name]=(ji,self.lidars.index(lidar))
+        return sorted(self.jobs,key=lambda name: rank[name])
+
+    def _workers(self):
+        if self.workers is not None: return self.workers
+        memory_typical=float(sorted(job_temp.memory for job_temp in self.jobs.values())[len(self.jobs)//2]) if self.jobs else 0
+        workers_memory=int(self.memory_budget//(self.worker_memory+memory_typical))
+        return max(1,min(os.cpu_count() or 1,workers_memory))
+
+    '''
+    run all jobs
+    Output:
+        dictionary job name: 'done', 'failed' or 'skipped' (a job in after failed)
+        result of each finished job is in self.results
+    '''
+    def run(self):
+        workers=self._workers()
+        memory_jobs=self.memory_budget-workers*self.worker_memory
+        if memory_jobs<=0:
+            raise ValueError('memory budget %.0f MB is too small for %i workers' %(self.memory_budget/1e6,workers))
+
+        pending=self._order()
+        status,self.results=dict(),dict()
+        running=dict()
+        memory_running=0.
+        self.memory_peak=0.
+
+        kwargs={'max_workers':workers}
+        if self.max_tasks_per_child is not None: kwargs['max_tasks_per_child']=self.max_tasks_per_child
+        with concurrent.futures.ProcessPoolExecutor(**kwargs) as executor:
+            while pending or running:
+                blocked=False # a passed job waits for memory, no more jobs pass it
+                for name in list(pending):
+                    job_temp=self.jobs[name]
+                    state=job_temp.state(status)
+                    if state=='skipped':
+                        status[name]='skipped'
+                        pending.remove(name)
+                        continue
+                    if state=='wait': continue
+                    if len(running)>=workers: break
+                    fits=memory_running+job_temp.memory<=memory_jobs or not running
+                    if not fits:
+                        job_temp.skipped+=1
+                        if job_temp.skipped>2*workers: blocked=True
+                        continue
+                    if blocked: break
+                    args=job_temp.args
+                    if callable(args):
+                        args=args({dep:self.results[dep] for dep in job_temp.after if status[dep]=='done'})
+                    running[executor.submit(job_temp.func,*args)]=name
+                    memory_running+=job_temp.memory
+                    self.memory_peak=max(self.memory_peak,memory_running)
+                    instrument.gauge('scheduler_memory_running',memory_running)
+                    pending.remove(name)
+                    # a job larger than the budget runs alone
+                    if job_temp.memory>memory_jobs: break
+
+                if not running: continue
+                done,not_done=concurrent.futures.wait(running,return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name=running.pop(future)
+                    memory_running-=self.jobs[name].memory
+                    try:
+                        self.results[name]=future.result()
+                        status[name]='done'
+                    except (Exception,SystemExit) as error:
+                        # SystemExit of a worker fails only this job
+                        print('job %s failed: %r' %(name,error))
+                        status[name]='failed'
+                instrument.gauge('scheduler_memory_running',memory_running)
+
+        return status
+
+'''
+l0, l1 and VAD files of several lidars within a memory budget
+Input:
+    lidars          - list of dictionaries with
+                        lidar_info  - see hpl2NetCDF.to_netcdf_l1 and vad2NetCDF.to_netcdf
+                        files       - .hpl files
+                        path_out    - output directory with subdirectories l0, l1, vad
+                        vad_pattern - file name pattern of .hpl files of VAD scans (optional)
+    memory_budget in bytes
+    workers, worker_memory, max_tasks_per_child - see scheduler
+    snr_threshold in dB - of the VAD retrieval
+Output:
+    dictionary job name: 'done', 'failed' or 'skipped'; the VAD file of a day is
+    calculated from the l1 files which were written
+'''
+def process_campaign(lidars,memory_budget,workers=None,worker_memory=150e6,max_tasks_per_child=None,snr_threshold=-22):
+    sched=scheduler(memory_budget,workers,worker_memory,max_tasks_per_child)
+    status_files=dict()
+    for lidar in lidars:
+        lidar_info=lidar['lidar_info']
+        path_l0,path_l1,path_vad=[os.path.join(lidar['path_out'],level) for level in ['l0','l1','vad']]
+        vad_days=dict() # day: list of (job name, gates_n, rays_n)
+        for file_path in sorted(lidar['files']):
+            file_name=os.path.basename(file_path)
+            name='%s/l1/%s' %(lidar_info.name,file_name)
+            try:
+                gates_n,rays_n,file_size,datestr=read_hpl_header(file_path)
+            except (OSError,ValueError,IndexError) as error:
+                print('job %s failed: %r' %(name,error))
+                status_files[name]='failed'
+                continue
+            sched.add(name,ingest.process_hpl,(file_path,path_l0,path_l1,lidar_info),\
+                      estimate_memory('l1',gates_n,rays_n,file_size),lidar_info.name)
+            if lidar.get('vad_pattern') is not None and fnmatch.fnmatch(file_name,lidar['vad_pattern']):
+                vad_days.setdefault(datestr,[]).append((name,gates_n,rays_n))
+        for datestr,day_jobs in sorted(vad_days.items()):
+            # l1 files returned by process_hpl
+            args=lambda results,path_vad=path_vad,lidar_info=lidar_info: \
+                 ([result[0] for result in results.values()],path_vad,lidar_info,snr_threshold)
+            sched.add('%s/vad/%s' %(lidar_info.name,datestr),ingest.process_vad,args,\
+                      estimate_memory('vad',max(job_day[1] for job_day in day_jobs),sum(job_day[2] for job_day in day_jobs)),\
+                      lidar_info.name,after=[job_day[0] for job_day in day_jobs],partial=True)
+
+    status=sched.run()
+    for result in sched.results.values():
+        for stage,duration in result[1].items(): instrument.observe(stage,duration)
+    instrument.gauge('scheduler_memory_peak',sched.memory_peak)
+    status.update(status_files)
+    return status
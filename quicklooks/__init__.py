@@ -0,0 +1,3 @@
+"""
+Quicklooks of raw data and retrieved variables
+"""
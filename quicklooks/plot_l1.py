@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Time-height diagrams of l1 data (see 2NetCDF/hpl2NetCDF.to_netcdf_l1) of stare or
+other scans with many rays: radial velocity, signal-to-noise ratio and attenuated 
+backscatter.
+The rays are not drawn one by one (pcolormesh); instead they are binned to the 
+pixels of the output figure (mean or max per pixel) and drawn with imshow without
+interpolation (a bin of a short file stays one pixel wide), so the time for 
+drawing does not depend on the number of rays.
+    - bin_l1: reduce l1 variables of one file to a time-height pixel lattice
+    - plot_l1_day: create plot of radial velocity, SNR and backscatter for complete day
+"""
+import os
+import numpy as np
+import xarray as xr
+import matplotlib.pyplot as plt
+import matplotlib as mpl
+import matplotlib.dates as mdates
+
+try:
+    from . import colormap_costumn as cm
+except ImportError:
+    import colormap_costumn as cm
+
+'''
+pixel lattice of a time-height diagram; accumulates sums, counts and maxima of
+variables from many files
+Input:
+    - t_lim     - [start,end] in datenum
+    - y_lim     - [bottom,top] in m
+    - nx,ny     - number of pixels in time and height
+'''
+class pixel_lattice():
+    def __init__(self,t_lim,y_lim,nx,ny):
+        self.t_lim,self.y_lim=t_lim,y_lim
+        self.nx,self.ny=nx,ny
+        self.dt=(t_lim[1]-t_lim[0])/nx
+        self.dy=(y_lim[1]-y_lim[0])/ny
+        self.sum,self.count,self.max=dict(),dict(),dict()
+    
+    '''
+    index of the pixel of each measurement (gn x rn), -1 outside of the lattice
+    Input:
+        - dn        - (rn,) time of rays in datenum
+        - height    - (gn,) or (gn x rn) height of range gates in m
+    '''
+    def pixel_index(self,dn,height):
+        xi=np.floor((dn-self.t_lim[0])/self.dt).astype(int)
+        yi=np.floor((np.asarray(height)-self.y_lim[0])/self.dy).astype(int)
+        if yi.ndim==1: yi=yi[:,np.newaxis]
+        inside=(xi>=0)&(xi<self.nx)&(yi>=0)&(yi<self.ny)
+        
+        return np.where(inside,yi*self.nx+xi,-1)
+    
+    '''
+    add measurements (gn x rn) of variable var to the lattice
+    '''
+    def add(self,var,values,ind):
+        valid=(ind>=0)&~np.isnan(values)
+        ind_valid,values_valid=ind[valid],values[valid]
+        n=self.nx*self.ny
+        if var not in self.sum:
+            self.sum[var],self.count[var]=np.zeros(n),np.zeros(n)
+            self.max[var]=np.full(n,np.nan)
+        self.sum[var]+=np.bincount(ind_valid,weights=values_valid,minlength=n)
+        self.count[var]+=np.bincount(ind_valid,minlength=n)
+        np.fmax.at(self.max[var],ind_valid,values_valid)
+    
+    '''
+    (ny x nx) image of variable var; stat: 'mean' or 'max'
+    '''
+    def image(self,var,stat='mean'):
+        if var not in self.sum:
+            return np.full((self.ny,self.nx),np.nan)
+        if stat=='max':
+            image=self.max[var]
+        else:
+            with np.errstate(invalid='ignore',divide='ignore'):
+                image=self.sum[var]/self.count[var]
+        
+        return image.reshape(self.ny,self.nx)
+
+'''
+read l1 file and add radial velocity, SNR (dB) and backscatter (log10) to the lattice
+Input:
+    - file_path     - path of l1 .nc file
+    - lattice       - pixel_lattice
+    - snr_threshold - radial velocity is removed for SNR (dB) below threshold (optional)
+'''
+def bin_l1(file_path,lattice,snr_threshold=None):
+    # datenum_time is not decoded (units are not CF conform)
+    with xr.open_dataset(file_path,decode_times=False) as data_temp:
+        dn=data_temp.datenum_time.values
+        height=np.outer(data_temp.gate_centers.values,np.sin(np.deg2rad(data_temp.elevation.values)))
+        rv=data_temp.radial_velocity.values.astype(float)
+        intensity=data_temp.intensity.values.astype(float)
+        beta=data_temp.beta.values.astype(float)
+    
+    with np.errstate(invalid='ignore',divide='ignore'):
+        snr=10*np.log10(intensity-1)
+        beta_log=np.log10(np.where(beta>0,beta,np.nan))
+    if snr_threshold is not None:
+        rv[~(snr>=snr_threshold)]=np.nan
+    
+    ind=lattice.pixel_index(dn,height)
+    lattice.add('radial_velocity',rv,ind)
+    lattice.add('snr',snr,ind)
+    lattice.add('beta',beta_log,ind)
+
+'''
+vertical distance between range gates of l1 file in m (rows of the lattice should 
+not be finer than the range gates)
+'''
+def gate_spacing(file_path):
+    with xr.open_dataset(file_path,decode_times=False) as data_temp:
+        dr=np.median(np.diff(data_temp.gate_centers.values))
+        el=np.nanmedian(data_temp.elevation.values)
+    
+    return dr*np.abs(np.sin(np.deg2rad(el)))
+
+'''
+create plot of radial velocity, SNR and backscatter for complete day and save as .png
+Input:
+    - file_paths    - list of l1 .nc files of the day
+    - path_out      - path for output .png figure
+    - lidar_str     - Lidar name
+    - date_str      - day 'yyyymmdd'
+    - y_lim in m    - height range
+    - snr_threshold - radial velocity is removed for SNR (dB) below threshold (optional)
+    - beta_stat     - 'mean' or 'max' backscatter per pixel
+    - dpi           - resolution of the .png; defines the number of pixels 
+'''
+def plot_l1_day(file_paths,path_out,lidar_str,date_str,y_lim=[0,2000],snr_threshold=None,beta_stat='max',dpi=100):
+    plt.ioff()
+    date_num=mdates.datestr2num(date_str)
+    
+    fig_size=(20,10)
+    ax_pos=[[.15,.69,.7,.25],[.15,.42,.7,.25],[.15,.15,.7,.25]]
+    # one bin per pixel of the axes; in height not finer than the range gates
+    nx=int(fig_size[0]*dpi*ax_pos[0][2])
+    ny=int(fig_size[1]*dpi*ax_pos[0][3])
+    if len(file_paths)>0:
+        ny=max(min(ny,int(np.round((y_lim[1]-y_lim[0])/gate_spacing(file_paths[0])))),1)
+    lattice=pixel_lattice([date_num,date_num+1],y_lim,nx,ny)
+    for file_path in file_paths:
+        bin_l1(file_path,lattice,snr_threshold=snr_threshold)
+    
+    # axis limits and ticks
+    x_lim=[date_num,date_num+1]
+    x_ticks=np.arange(x_lim[0],x_lim[1]+3/24,3/24)
+    x_ticklabels=['%02i00' %(np.round((xt-date_num)*24)%24) for xt in x_ticks]
+    y_ticks=np.arange(y_lim[0],y_lim[1]+1,500)
+    y_ticklabels=y_ticks/1000
+    
+    c_map,c_map_snr,c_map_ws,c_map_rv=cm.load_colormaps()
+    with mpl.rc_context({'font.size':16}):
+        fig=plt.figure(figsize=fig_size)
+        ax=[fig.add_axes(pos) for pos in ax_pos]
+        cax=[fig.add_axes([.87,pos[1],.01,pos[3]]) for pos in ax_pos]
+    
+        panels=[(lattice.image('radial_velocity'),c_map_rv,-3,3,'both','$v_r$ (m s$^{-1}$)'),\
+                (lattice.image('snr'),c_map_snr,-30,10,'both','SNR (dB)'),\
+                (lattice.image('beta',beta_stat),c_map,-7,-4,'both','log$_{10}$($\\beta$) (m$^{-1}$ sr$^{-1}$)')]
+    
+        for ai,(image,c_map_temp,vmin,vmax,extend,label) in enumerate(panels):
+            ax_temp=ax[ai]
+            ax_temp.set_facecolor('#DDDDDD')
+            im_temp=ax_temp.imshow(image,origin='lower',aspect='auto',interpolation='none',\
+                                   extent=[x_lim[0],x_lim[1],y_lim[0],y_lim[1]],cmap=c_map_temp,vmin=vmin,vmax=vmax)
+            ax_temp.set(xlim=x_lim,xticks=x_ticks,xticklabels=x_ticklabels if ai==2 else [])
+            ax_temp.set(ylim=y_lim,yticks=y_ticks,yticklabels=y_ticklabels)
+            ax_temp.grid()
+            cb_temp=fig.colorbar(im_temp,cax=cax[ai],extend=extend)
+            cb_temp.set_label(label)
+        ax[2].set_xlabel('time (UTC)')
+    
+        #%% Figure title
+        fig.text(.1,.5,'height above lidar (km)',rotation=90,va='center')
+        fig.text(0.5,0.95,'%s lidar: %s' %(lidar_str,mdates.num2date(date_num).strftime('%d-%b-%Y')),ha='center',va='bottom')
+    
+        #%% save figure
+        plot_file_name='%s_%s_l1.png' %(lidar_str,date_str)
+        fig.savefig(os.path.join(path_out,plot_file_name),dpi=dpi,bbox_inches='tight')
+        plt.close(fig)
+    
+    plt.ion()
+    
+    return os.path.join(path_out,plot_file_name)
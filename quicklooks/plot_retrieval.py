@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Quicklooks of coplanar retrievals (see coplanar_retrieval/calc_retrieval.py and 
+the time series written by coplanar_retrieval/retrieval_series.py)
+For horizontal planes the fields are plotted in (x,y), for vertical planes in 
+(distance along the plane, z):
+    - wind speed with decimated quiver arrows or streamlines
+    - error prefactor
+    - coverage (number of measurements of all lidars per grid point)
+
+    - retrieval_quicklook: figure template; axes and colorbars are created once and 
+                           only the data artists are replaced for each frame
+    - plot_retrieval: single retrieval (retrieval class) as .png
+    - plot_retrieval_series: all frames of a retrieval .nc file in parallel
+    - animate_retrieval_series: animation of a retrieval .nc file; frames are 
+                                streamed to ffmpeg and not kept in memory
+"""
+import os,time
+import multiprocessing as mp
+import numpy as np
+from netCDF4 import Dataset
+import matplotlib.pyplot as plt
+import matplotlib as mpl
+import matplotlib.dates as mdates
+
+try:
+    from . import colormap_costumn as cm
+except ImportError:
+    import colormap_costumn as cm
+
+'''
+coordinates of the plane for plotting
+Input:
+    - xx,yy,zz          - (jn x in) coordinates of grid points
+    - plane_orientation - 'horizontal' or 'vertical'
+Output:
+    - (p1,p2)           - (jn x in) horizontal and vertical axis of the figure
+    - (label1,label2)   - axis labels
+'''
+def plane_coordinates(xx,yy,zz,plane_orientation):
+    if plane_orientation=='horizontal':
+        return (xx,yy),('x (m)','y (m)')
+    # distance along the vertical plane from its first grid point
+    s=np.hypot(xx-xx[0,0],yy-yy[0,0])
+    
+    return (s,zz),('distance along plane (m)','z (m)')
+
+'''
+Figure template for one retrieval plane
+Input:
+    - p1,p2             - (jn x in) coordinates of the plane (see plane_coordinates)
+    - labels            - axis labels
+    - plane_orientation - 'horizontal' (equal aspect of x and y) or 'vertical'
+    - ws_max in m/s     - upper limit of wind speed
+    - vectors           - 'quiver' or 'streamlines'
+    - arrows_n          - number of arrows along the longer axis (quiver)
+'''
+class retrieval_quicklook():
+    def __init__(self,p1,p2,labels,plane_orientation,ws_max=20,vectors='quiver',arrows_n=25):
+        self.p1,self.p2=p1,p2
+        self.vectors=vectors
+        
+        # decimation of the arrows
+        step=max(int(np.ceil(max(p1.shape)/arrows_n)),1)
+        self.decimate=(slice(step//2,None,step),slice(step//2,None,step))
+        
+        c_map,c_map_snr,c_map_ws,c_map_rv=cm.load_colormaps()
+        with mpl.rc_context({'font.size':16}):
+            fig=plt.figure(figsize=(21,7))
+            ax=[fig.add_axes([.05+ai*.33,.12,.22,.76]) for ai in range(3)]
+            cax=[fig.add_axes([.28+ai*.33,.12,.008,.76]) for ai in range(3)]
+        
+            nan=np.full(p1.shape,np.nan)
+            self.mesh=[]
+            panels=[(c_map_ws,mpl.colors.Normalize(0,ws_max),'max','wind speed (m s$^{-1}$)'),\
+                    (c_map_snr,mpl.colors.LogNorm(1,10),'max','error prefactor'),\
+                    (c_map_snr,mpl.colors.Normalize(0,None),'neither','number of measurements')]
+            for ai,(c_map_temp,norm,extend,label) in enumerate(panels):
+                ax_temp=ax[ai]
+                ax_temp.set_facecolor('#DDDDDD')
+                self.mesh.append(ax_temp.pcolormesh(p1,p2,nan,cmap=c_map_temp,norm=norm,shading='nearest'))
+                ax_temp.set_xlabel(labels[0])
+                if ai==0: ax_temp.set_ylabel(labels[1])
+                ax_temp.set_aspect('equal' if plane_orientation=='horizontal' else 'auto')
+                ax_temp.grid()
+                cb_temp=fig.colorbar(self.mesh[ai],cax=cax[ai],extend=extend)
+                cb_temp.set_label(label)
+            self.title=fig.text(0.5,0.95,'',ha='center',va='bottom')
+
+        self.quiver=None
+        self.streamlines=None
+        self.fig,self.ax,self.cax=fig,ax,cax
+    
+    '''
+    replace the data of the figure
+    Input:
+        - u,v,ws,error  - (jn x in) retrieved fields
+        - n             - (jn x in x lidar_n) number of measurements of each lidar
+        - title         - figure title
+    '''
+    def update(self,u,v,ws,error,n,title=''):
+        coverage=np.nansum(n,axis=-1)
+        coverage[np.all(np.isnan(n),axis=-1)]=np.nan
+        for mesh,field in zip(self.mesh,[ws,error,coverage]):
+            mesh.set_array(np.ma.masked_invalid(field))
+        if np.any(~np.isnan(coverage)):
+            self.mesh[2].set_clim(0,np.nanmax(coverage))
+        
+        if self.vectors=='quiver':
+            d=self.decimate
+            if self.quiver is None:
+                self.quiver=self.ax[0].quiver(self.p1[d],self.p2[d],u[d],v[d],pivot='middle')
+            else:
+                self.quiver.set_UVC(u[d],v[d])
+        else:
+            # streamlines cannot be updated; they need a regular 1d grid of the plane
+            if self.streamlines is not None:
+                self.streamlines.lines.remove()
+                for patch in self.ax[0].patches[:]: patch.remove()
+            valid=~np.isnan(u)
+            if valid.any():
+                self.streamlines=self.ax[0].streamplot(self.p1[0,:],self.p2[:,0],np.where(valid,u,0),np.where(valid,v,0),\
+                                                       color='k',linewidth=0.8,density=1.2)
+            else:
+                self.streamlines=None
+        
+        self.title.set_text(title)
+    
+    def save(self,file_path):
+        self.fig.savefig(file_path,bbox_inches='tight')
+    
+    def close(self):
+        plt.close(self.fig)
+
+'''
+create plot of one retrieval (retrieval class of calc_retrieval) and save as .png
+Input:
+    - retrieval     - retrieval class (after reshape)
+    - file_path     - path of the output .png
+    - title         - figure title
+    - vectors       - 'quiver' or 'streamlines'
+'''
+def plot_retrieval(retrieval,file_path,title='',vectors='quiver'):
+    plt.ioff()
+    grid=retrieval.grid
+    (p1,p2),labels=plane_coordinates(grid.xx,grid.yy,grid.zz,grid.plane_orientation)
+    
+    quicklook=retrieval_quicklook(p1,p2,labels,grid.plane_orientation,vectors=vectors)
+    quicklook.update(retrieval.u,retrieval.v,retrieval.ws,retrieval.error,retrieval.n,title=title)
+    quicklook.save(file_path)
+    quicklook.close()
+    plt.ion()
+    
+    return file_path
+
+'''
+read one frame (time index ti) of a retrieval .nc file (retrieval_series.py)
+'''
+def read_frame(ds,ti):
+    frame={var:np.ma.filled(ds[var][ti].astype(float),np.nan) for var in ['u','v','ws','error','n']}
+    frame['datenum']=float(ds['datenum'][ti])
+    
+    return frame
+
+def read_plane(ds,vectors):
+    xx,yy,zz=ds['x'][:],ds['y'][:],ds['z'][:]
+    (p1,p2),labels=plane_coordinates(np.asarray(xx),np.asarray(yy),np.asarray(zz),ds.plane_orientation)
+    
+    return p1,p2,labels,ds.plane_orientation
+
+def frame_title(ds,dn):
+    lidars=getattr(ds,'lidars','')
+    
+    return '%s %s: %s' %(ds.plane_orientation,lidars,mdates.num2date(dn).strftime('%d-%b-%Y %H:%M:%S'))
+
+# figure template of each worker process; reused for all frames of the same file
+_quicklooks=dict()
+
+# function executed in the worker processes
+def _plot_frames(args):
+    file_path,path_out,frames,vectors=args
+    plt.ioff()
+    files_out=[]
+    with Dataset(file_path,'r') as ds:
+        key=(file_path,vectors)
+        if key not in _quicklooks:
+            p1,p2,labels,plane_orientation=read_plane(ds,vectors)
+            _quicklooks[key]=retrieval_quicklook(p1,p2,labels,plane_orientation,vectors=vectors)
+        quicklook=_quicklooks[key]
+        for ti in frames:
+            frame=read_frame(ds,ti)
+            quicklook.update(frame['u'],frame['v'],frame['ws'],frame['error'],frame['n'],title=frame_title(ds,frame['datenum']))
+            file_out=os.path.join(path_out,'%s_%s.png' %(os.path.basename(file_path)[:-3],mdates.num2date(frame['datenum']).strftime('%Y%m%d_%H%M%S')))
+            quicklook.save(file_out)
+            files_out.append(file_out)
+    
+    return files_out
+
+'''
+render all frames of a retrieval .nc file in parallel; each process renders a 
+contiguous block of frames with one figure template
+Input:
+    - file_path     - retrieval .nc file (retrieval_series.py)
+    - path_out      - directory of the .png files
+    - processes     - number of processes (default: number of CPUs)
+    - vectors       - 'quiver' or 'streamlines'
+Output:
+    - list of .png files
+'''
+def plot_retrieval_series(file_path,path_out,processes=None,vectors='quiver'):
+    if not os.path.exists(path_out): os.makedirs(path_out)
+    with Dataset(file_path,'r') as ds:
+        tn=ds.dimensions['NUMBER_OF_SCANS'].size
+    
+    processes=processes or mp.cpu_count()
+    blocks=[b for b in np.array_split(np.arange(tn),processes) if b.size>0]
+    jobs=[(file_path,path_out,list(block),vectors) for block in blocks]
+    
+    t_start=time.perf_counter()
+    if processes==1:
+        files_out=[f for job in jobs for f in _plot_frames(job)]
+    else:
+        # the workers use the Agg backend, set before pyplot is imported with this module
+        with mp.get_context('spawn').Pool(processes,initializer=mpl.use,initargs=('Agg',)) as pool:
+            files_out=[f for files in pool.map(_plot_frames,jobs) for f in files]
+    print('%i frames rendered: %.1f frames/min' %(len(files_out),len(files_out)/(time.perf_counter()-t_start)*60))
+    
+    return files_out
+
+'''
+animation of all frames of a retrieval .nc file; frames are read one by one and 
+streamed to ffmpeg, so only one frame is kept in memory
+Input:
+    - file_path     - retrieval .nc file (retrieval_series.py)
+    - file_out      - output file (e.g., .mp4)
+    - fps           - frames per second
+    - vectors       - 'quiver' or 'streamlines'
+'''
+def animate_retrieval_series(file_path,file_out,fps=4,vectors='quiver',dpi=100):
+    import matplotlib.animation as animation
+    if not animation.FFMpegWriter.isAvailable():
+        raise Exception('ffmpeg is necessary to write animations')
+    
+    plt.ioff()
+    writer=animation.FFMpegWriter(fps=fps)
+    with Dataset(file_path,'r') as ds:
+        p1,p2,labels,plane_orientation=read_plane(ds,vectors)
+        quicklook=retrieval_quicklook(p1,p2,labels,plane_orientation,vectors=vectors)
+        with writer.saving(quicklook.fig,file_out,dpi):
+            for ti in range(ds.dimensions['NUMBER_OF_SCANS'].size):
+                frame=read_frame(ds,ti)
+                quicklook.update(frame['u'],frame['v'],frame['ws'],frame['error'],frame['n'],title=frame_title(ds,frame['datenum']))
+                writer.grab_frame()
+    quicklook.close()
+    plt.ion()
+    
+    return file_out
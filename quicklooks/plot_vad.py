@@ -4,6 +4,8 @@ Created on Thu Mar  4 15:28:43 2021
 Time-heght diagram of vertical profiles of horizontal wind speed and additionally
 parameters:
     - plot_VAD_day: create plot of horizontal wind, vertical velocity and variance of radial velocity fluctuation for complete day
+    - vad_quicklook: figure template of plot_VAD_day; axes, colorbars and legend are 
+                     created once and only the data is replaced for each day
 @author: Maren
 """
 import os,sys
@@ -13,7 +15,12 @@ import matplotlib.pyplot as plt
 import matplotlib as mpl
 import matplotlib.dates as mdates
 
-import colormap_costumn as cm
+try:
+    from . import colormap_costumn as cm
+    from .. import instrument
+except ImportError:
+    import colormap_costumn as cm
+    from dwl import instrument
 
 # Plot paramters 
 mpl.rcParams.update({'font.size':16})
@@ -21,155 +28,249 @@ c_map,c_map_snr,c_map_ws,c_map_rv=cm.load_colormaps()
 dtn=(24*60*60) # second of day
 
 '''
-create plot of horizontal wind, vertical velocity and radial velocity fluctuation 
-for complete day and save as .png file
+read variables of *_vad.nc file used in the quicklook
 Input:
     - file_path     - path of *_vad.nc input file
-    - path_out      - path for output .png figure
-    - lidar_str     - Lidar name
-    - date_str      - day 'yyyymmdd'
     - z_ref         - surface height above mean sea level
-    - location      - location name
+Output:
+    - dictionary: datenum, height above z_ref, ff, u, v, w, rv_fluc_var
 '''
-def plot_VAD_day(file_path,path_out,lidar_str,date_str,z_ref,location):
-    plt.ioff()
-    date_num=mdates.datestr2num(date_str)
-    
-    with xr.open_dataset(file_path) as data_temp:
-        datenum_plot=data_temp.datenum.values
-        ff_plot=data_temp.ff.values
-        u_plot=data_temp.ucomp.values
-        v_plot=data_temp.vcomp.values
-        w_plot=data_temp.wcomp.values
-        rv_fluc_var_plot=data_temp.vr_fluc_var.values
-        height=data_temp.height.values+data_temp.alt-z_ref
-        
-    # axis limits and ticks
-    x_lim=[date_num,date_num+1]
-    x_ticks=np.arange(x_lim[0],x_lim[1]+3/24,3/24)
-    x_ticklabels=mdates.num2datestr(x_ticks,'%H%M')
-    y_lim=[0,2000]
-    y_ticks=np.arange(y_lim[0],y_lim[1]+1,500)
-    y_ticklabels=y_ticks/1000
+def read_vad(file_path,z_ref):
+    with xr.open_dataset(file_path,decode_times=False) as data_temp:
+        data_plot={'datenum':data_temp.datenum.values,\
+                   'ff':data_temp.ff.values,\
+                   'u':data_temp.ucomp.values,\
+                   'v':data_temp.vcomp.values,\
+                   'w':data_temp.wcomp.values,\
+                   'rv_fluc_var':data_temp.vr_fluc_var.values,\
+                   'height':data_temp.height.values+data_temp.alt-z_ref}
     
-    #%%  create figure with three subplots
-    fig=plt.figure(figsize=(20,10))
-    ax=[]
-    ax.append(fig.add_axes([.15,.69,.7,.25]))
-    ax.append(fig.add_axes([.15,.42,.7,.25]))
-    ax.append(fig.add_axes([.15,.15,.7,.25]))
-    
-    cax=[]
-    cax.append(fig.add_axes([.87,.69,.01,.25]))
-    cax.append(fig.add_axes([.87,.42,.01,.25]))
-    cax.append(fig.add_axes([.87,.15,.01,.25]))
-    
-    
-    #%% Estimate the number of wind barbs depicted in the plot
+    return data_plot
 
-    time_plot=datenum_plot+np.median(np.diff(datenum_plot))/2
-    gc_plot=height+np.median(np.diff(height))/2
-    
-    dn_delta=np.mean(np.diff(time_plot))*dtn
-    barbs_x_n=50
-    barb_delta_x=int(np.diff(x_lim)*dtn/barbs_x_n/dn_delta)
-    barbs_y_n=25
-    gc_delta=np.mean(np.diff(height))
-    barb_delta_y=int(y_lim[1]/barbs_y_n/gc_delta)
-    
-    ff_plot_ext=np.hstack([ff_plot,np.full([ff_plot.shape[0],1],np.nan)])
-    datenum_plot_ext=np.hstack([datenum_plot,datenum_plot[-1]+np.median(np.diff(datenum_plot))])
-    
-    #%% Plot vertical profiles of horizontal wind
-    ax_temp=ax[0]
-    
-    ax_temp.set_facecolor('#DDDDDD')
-    pc_temp=ax_temp.contourf(datenum_plot_ext,height,ff_plot_ext,levels=np.arange(0,21,1),cmap=c_map_ws)
-    
-    X,Y=np.meshgrid(time_plot,gc_plot)
-    X_plot, Y_plot = X[::barb_delta_y,::barb_delta_x], Y[::barb_delta_y,::barb_delta_x]
-    U_plot, V_plot =  u_plot[::barb_delta_y,::barb_delta_x], v_plot[::barb_delta_y,::barb_delta_x]
+'''
+Block average of the horizontal wind on a lattice of wind barbs
+The profiles are assigned to the lattice cells by their time and height, 
+u and v are averaged separately (vector average) ignoring NaN values. The number 
+of barbs does not depend on the number or spacing of the profiles.
+Input:
+    - time          - (tn,) time of profiles
+    - height        - (gn,) height of range gates
+    - u,v           - (gn x tn) components of the horizontal wind
+    - x_lim,y_lim   - limits of the lattice in time and height
+    - nx,ny         - number of barbs in time and height
+Output:
+    - X,Y           - (ny x nx) positions of barbs (centers of lattice cells)
+    - U,V           - (ny x nx) averaged components (NaN for cells without data)
+'''
+def regrid_barbs(time,height,u,v,x_lim,y_lim,nx=50,ny=25):
+    xi=np.floor((np.asarray(time)-x_lim[0])/(x_lim[1]-x_lim[0])*nx).astype(int)
+    yi=np.floor((np.asarray(height)-y_lim[0])/(y_lim[1]-y_lim[0])*ny).astype(int)
+    ind=yi[:,np.newaxis]*nx+xi[np.newaxis,:]
+    valid=(xi>=0)[np.newaxis,:]&(xi<nx)[np.newaxis,:]&(yi>=0)[:,np.newaxis]&(yi<ny)[:,np.newaxis]\
+          &~np.isnan(u)&~np.isnan(v)
     
-    ax_temp.plot(X_plot[~np.isnan(U_plot)],Y_plot[~np.isnan(U_plot)],'k.',ms=3)
+    count=np.bincount(ind[valid],minlength=nx*ny)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        U=(np.bincount(ind[valid],weights=u[valid],minlength=nx*ny)/count).reshape(ny,nx)
+        V=(np.bincount(ind[valid],weights=v[valid],minlength=nx*ny)/count).reshape(ny,nx)
     
-    ax_temp.barbs(X_plot,Y_plot,\
-                  U_plot*1.94,V_plot*1.94,\
-                  pivot='tip',length=4.8,fill_empty=False,rounding=False,\
-                   sizes=dict(emptybarb=0.04,spacing=0.2,height=0.4))
+    X,Y=np.meshgrid(x_lim[0]+(np.arange(nx)+0.5)*(x_lim[1]-x_lim[0])/nx,\
+                    y_lim[0]+(np.arange(ny)+0.5)*(y_lim[1]-y_lim[0])/ny)
     
-    ax_temp.set(xlim=x_lim,xticks=x_ticks,xticklabels=[])
-    ax_temp.set(ylim=y_lim,yticks=y_ticks,yticklabels=y_ticklabels) 
-    ax_temp.grid()
+    return X,Y,U,V
 
-    cb_temp=fig.colorbar(pc_temp,cax=cax[0],ticks=np.arange(0,21,4),extend='max')
-    cb_temp.set_label('$\overline{u_h}$ (m s$^{-1}$)')
-    #    cb_temp.ax.tick_params(labelsize=fs)
-        
-    #%% Create legend for wind barbs    
-    legend_axes = fig.add_axes([0.1, 0.95, 0.18, 0.04]) 
-    #legend_axes.set_frame_on(False)
-    legend_axes.patch.set_visible(False)
-    legend_axes.axis('off')
-    legend_axes.axes.get_xaxis().set_visible(False)
-    legend_axes.axes.get_yaxis().set_visible(False)
-    #    rectangle = plt.matplotlib.patches.Rectangle((0,-1.3),2,5, ec='#DDDDDD', fc='#BBBBBB', zorder=1) #set relativ position of rectangle
-    rectangle = plt.matplotlib.patches.Rectangle((0,-1.3),2,5, zorder=1, ec=[1,1,1], fc=[1,1,1])    
-    legend_axes.add_patch(rectangle) 
-
-    fs_temp=10
-    legend_axes.barbs([0.65, 0.13, 0.22, 0.32, 0.41, 0.52],[0,0,0,0,0,0], [-26, 0, -2, -5, -10, -50],[0, 0 ,0, 0, 0, 0], pivot='tip',
-        fill_empty=False, length=6, rounding=False,sizes=dict(emptybarb=0.04,spacing=0.2,height=0.4),zorder=3)
-    legend_axes.plot([0.65, 0.13, 0.22, 0.32, 0.41, 0.52],[0,0,0,0,0,0], 'o', color='black', markersize=2.5)
-    legend_axes.annotate('50 kn', xy=(0.5,1), fontsize=fs_temp)
-    legend_axes.annotate('10 kn', xy=(0.4,1), fontsize=fs_temp)
-    legend_axes.annotate(' 5 kn', xy=(0.3,1), fontsize=fs_temp)
-    legend_axes.annotate('<5 kn', xy=(0.2,1), fontsize=fs_temp)
-    legend_axes.annotate('Calm',  xy=(0.1,1), fontsize=fs_temp)
-    legend_axes.annotate('25 kn from East', xy=(0.6, 1), fontsize=fs_temp)
-    legend_axes.set_ylim([-1.3, 2.5])
-    legend_axes.set_xlim([0.08, 0.8])
-    
-    #%% Create plot of vertical velocity retrieved from VAD algorithm
-    ax_temp=ax[1]
+'''
+Figure template for the quicklooks of plot_VAD_day
+All elements which are identical for each day (axes, ticks, colorbars, legend of 
+wind barbs, labels) are created once in __init__. The time axis is the time of the 
+day (in days), so the axes do not change from day to day. render() replaces only the 
+data artists (contour fill, pcolormesh arrays, wind barbs) and the title.
+Input:
+    - lidar_str     - Lidar name
+    - z_ref         - surface height above mean sea level
+    - location      - location name
+'''
+class vad_quicklook():
+    def __init__(self,lidar_str,z_ref,location):
+        self.lidar_str,self.z_ref,self.location=lidar_str,z_ref,location
+        
+        # axis limits and ticks (time of day)
+        self.x_lim=[0,1]
+        x_ticks=np.arange(self.x_lim[0],self.x_lim[1]+3/24,3/24)
+        x_ticklabels=['%02i00' %(np.round(xt*24)%24) for xt in x_ticks]
+        self.y_lim=[0,2000]
+        y_ticks=np.arange(self.y_lim[0],self.y_lim[1]+1,500)
+        y_ticklabels=y_ticks/1000
+        
+        self.ws_levels=np.arange(0,21,1)
+        self.norm_ws=mpl.colors.BoundaryNorm(self.ws_levels,c_map_ws.N)
+        self.norm_w=mpl.colors.Normalize(vmin=-3,vmax=3)
+        self.norm_rv_fluc=mpl.colors.Normalize(vmin=0,vmax=4)
+        
+        #%%  create figure with three subplots
+        fig=plt.figure(figsize=(20,10))
+        ax=[]
+        ax.append(fig.add_axes([.15,.69,.7,.25]))
+        ax.append(fig.add_axes([.15,.42,.7,.25]))
+        ax.append(fig.add_axes([.15,.15,.7,.25]))
+        
+        cax=[]
+        cax.append(fig.add_axes([.87,.69,.01,.25]))
+        cax.append(fig.add_axes([.87,.42,.01,.25]))
+        cax.append(fig.add_axes([.87,.15,.01,.25]))
+        
+        for ai,ax_temp in enumerate(ax):
+            ax_temp.set_facecolor('#DDDDDD')
+            ax_temp.set(xlim=self.x_lim,xticks=x_ticks,xticklabels=x_ticklabels if ai==2 else [])
+            ax_temp.set(ylim=self.y_lim,yticks=y_ticks,yticklabels=y_ticklabels)
+            ax_temp.grid()
+        ax[2].set_xlabel('time (UTC)')
+        
+        #%% colorbars are independent of the data
+        cb_temp=fig.colorbar(mpl.cm.ScalarMappable(norm=self.norm_ws,cmap=c_map_ws),cax=cax[0],ticks=np.arange(0,21,4),extend='max')
+        cb_temp.set_label('$\overline{u_h}$ (m s$^{-1}$)')
+        cb_temp=fig.colorbar(mpl.cm.ScalarMappable(norm=self.norm_w,cmap=c_map_rv),cax=cax[1],ticks=np.arange(-3,4,1),extend='both')
+        cb_temp.set_label('w (m s$^{-1}$)')
+        cb_temp=fig.colorbar(mpl.cm.ScalarMappable(norm=self.norm_rv_fluc,cmap=c_map_snr),cax=cax[2],ticks=np.arange(0,4.1,1),extend='both')
+        cb_temp.set_label('$\overline{v_r^{\prime 2}}$ (m$^2$ s$^{-1}$)')
+        
+        #%% Create legend for wind barbs    
+        legend_axes = fig.add_axes([0.1, 0.95, 0.18, 0.04]) 
+        legend_axes.patch.set_visible(False)
+        legend_axes.axis('off')
+        legend_axes.axes.get_xaxis().set_visible(False)
+        legend_axes.axes.get_yaxis().set_visible(False)
+        rectangle = plt.matplotlib.patches.Rectangle((0,-1.3),2,5, zorder=1, ec=[1,1,1], fc=[1,1,1])    
+        legend_axes.add_patch(rectangle) 
     
-    w_plot_ext=np.hstack([w_plot,np.full([w_plot.shape[0],1],np.nan)])
-    datenum_plot_ext=np.hstack([datenum_plot,datenum_plot[-1]+np.median(np.diff(datenum_plot))])
+        fs_temp=10
+        legend_axes.barbs([0.65, 0.13, 0.22, 0.32, 0.41, 0.52],[0,0,0,0,0,0], [-26, 0, -2, -5, -10, -50],[0, 0 ,0, 0, 0, 0], pivot='tip',
+            fill_empty=False, length=6, rounding=False,sizes=dict(emptybarb=0.04,spacing=0.2,height=0.4),zorder=3)
+        legend_axes.plot([0.65, 0.13, 0.22, 0.32, 0.41, 0.52],[0,0,0,0,0,0], 'o', color='black', markersize=2.5)
+        legend_axes.annotate('50 kn', xy=(0.5,1), fontsize=fs_temp)
+        legend_axes.annotate('10 kn', xy=(0.4,1), fontsize=fs_temp)
+        legend_axes.annotate(' 5 kn', xy=(0.3,1), fontsize=fs_temp)
+        legend_axes.annotate('<5 kn', xy=(0.2,1), fontsize=fs_temp)
+        legend_axes.annotate('Calm',  xy=(0.1,1), fontsize=fs_temp)
+        legend_axes.annotate('25 kn from East', xy=(0.6, 1), fontsize=fs_temp)
+        legend_axes.set_ylim([-1.3, 2.5])
+        legend_axes.set_xlim([0.08, 0.8])
+        
+        #%% Figure title
+        fig.text(.1,.5,'height above reference level (km)',rotation=90,va='center')
+        fig.text(.16,.93,'reference level: %i m MSL' %z_ref,ha='left',va='top',size=12)
+        self.title=fig.text(0.5,0.95,'',ha='center',va='bottom')
+        
+        self.fig,self.ax,self.cax=fig,ax,cax
+        self.contour=None   # contour fill of wind speed
+        self.mesh=[None,None]   # pcolormesh of w and rv_fluc_var
+        self.mesh_coords=[(None,None),(None,None)]
+        self.barbs=[]   # barbs and dots of wind barbs
     
-    ax_temp.set_facecolor('#DDDDDD')
-    pc_temp=ax_temp.pcolormesh(datenum_plot_ext,height,w_plot_ext,\
-                   cmap=c_map_rv,vmin=-3,vmax=3)
-    ax_temp.set(xlim=x_lim,xticks=x_ticks,xticklabels=[])
-    ax_temp.set(ylim=y_lim,yticks=y_ticks,yticklabels=y_ticklabels) 
-    ax_temp.grid()
+    '''
+    Positions and components of the wind barbs on a fixed lattice of 
+    barbs_x_n x barbs_y_n barbs (see regrid_barbs)
+    '''
+    def barb_data(self,time_plot,height,u_plot,v_plot):
+        return regrid_barbs(time_plot,height,u_plot,v_plot,self.x_lim,self.y_lim,nx=50,ny=25)
     
-    cb_temp=fig.colorbar(pc_temp,cax=cax[1],ticks=np.arange(-3,4,1),extend='both')
-    cb_temp.set_label('w (m s$^{-1}$)')
+    '''
+    pcolormesh of the data; the array of the existing mesh is replaced if the 
+    coordinates did not change
+    '''
+    def update_mesh(self,mi,x,y,c,cmap,norm):
+        ax_temp=self.ax[mi+1]
+        mesh=self.mesh[mi]
+        x_old,y_old=self.mesh_coords[mi]
+        if (mesh is not None) and np.array_equal(x_old,x) and np.array_equal(y_old,y):
+            mesh.set_array(c)
+        else:
+            if mesh is not None: mesh.remove()
+            self.mesh[mi]=ax_temp.pcolormesh(x,y,c,cmap=cmap,norm=norm)
+            self.mesh_coords[mi]=(x,y)
     
-    #%% Variance of variations from the estimated wind vector
-    ax_temp=ax[2]
+    '''
+    replace the data of the figure 
+    Input:
+        - data_plot     - dictionary of read_vad
+        - date_num      - day (datenum)
+    '''
+    def update(self,data_plot,date_num):
+        datenum_plot=data_plot['datenum']-date_num
+        height=data_plot['height']
+        
+        time_plot=datenum_plot+np.median(np.diff(datenum_plot))/2
+        gc_plot=height+np.median(np.diff(height))/2
+        
+        datenum_plot_ext=np.hstack([datenum_plot,datenum_plot[-1]+np.median(np.diff(datenum_plot))])
+        ext=lambda var: np.hstack([var,np.full([var.shape[0],1],np.nan)])
+        
+        #%% Plot vertical profiles of horizontal wind
+        ax_temp=self.ax[0]
+        if self.contour is not None: self.contour.remove()
+        self.contour=ax_temp.contourf(datenum_plot_ext,height,ext(data_plot['ff']),levels=self.ws_levels,cmap=c_map_ws)
+        
+        for artist in self.barbs: artist.remove()
+        X_plot,Y_plot,U_plot,V_plot=self.barb_data(time_plot,gc_plot,data_plot['u'],data_plot['v'])
+        dots,=ax_temp.plot(X_plot[~np.isnan(U_plot)],Y_plot[~np.isnan(U_plot)],'k.',ms=3)
+        barbs=ax_temp.barbs(X_plot,Y_plot,\
+                      U_plot*1.94,V_plot*1.94,\
+                      pivot='tip',length=4.8,fill_empty=False,rounding=False,\
+                       sizes=dict(emptybarb=0.04,spacing=0.2,height=0.4))
+        self.barbs=[dots,barbs]
+        ax_temp.set(xlim=self.x_lim,ylim=self.y_lim)
+        
+        #%% vertical velocity and variance of variations from the estimated wind vector
+        self.update_mesh(0,datenum_plot_ext,height,ext(data_plot['w']),c_map_rv,self.norm_w)
+        self.update_mesh(1,datenum_plot_ext,height,ext(data_plot['rv_fluc_var']),c_map_snr,self.norm_rv_fluc)
+        
+        self.title.set_text('%s lidar at %s (%s m MSL): %s' %(self.lidar_str,self.location,self.z_ref,mdates.num2date(date_num).strftime('%d-%b-%Y')))
     
-    rv_fluc_var_plot_ext=np.hstack([rv_fluc_var_plot,np.full([rv_fluc_var_plot.shape[0],1],np.nan)])
-    datenum_plot_ext=np.hstack([datenum_plot,datenum_plot[-1]+np.median(np.diff(datenum_plot))])
+    '''
+    read *_vad.nc file, update figure and save as .png
+    Input:
+        - file_path     - path of *_vad.nc input file
+        - path_out      - path for output .png figure
+        - date_str      - day 'yyyymmdd'
+    Output:
+        - path of .png file
+    '''
+    def render(self,file_path,path_out,date_str):
+        self.update(read_vad(file_path,self.z_ref),mdates.datestr2num(date_str))
+        
+        plot_file_name='%s_%s_vad.png' %(self.lidar_str,date_str)
+        self.fig.savefig(os.path.join(path_out,plot_file_name),bbox_inches='tight')
+        
+        return os.path.join(path_out,plot_file_name)
     
-    ax_temp.set_facecolor('#DDDDDD')
-    pc_temp=ax_temp.pcolormesh(datenum_plot_ext,height,rv_fluc_var_plot_ext,\
-                   cmap=c_map_snr,vmin=0,vmax=4)
-    ax_temp.set(xlim=x_lim,xticks=x_ticks,xticklabels=x_ticklabels)
-    ax_temp.set(ylim=y_lim,yticks=y_ticks,yticklabels=y_ticklabels) 
-    ax_temp.set_xlabel('time (UTC)')
-    ax_temp.grid()
+    def close(self):
+        plt.close(self.fig)
+
+'''
+create plot of horizontal wind, vertical velocity and radial velocity fluctuation 
+for complete day and save as .png file
+Input:
+    - file_path     - path of *_vad.nc input file
+    - path_out      - path for output .png figure
+    - lidar_str     - Lidar name
+    - date_str      - day 'yyyymmdd'
+    - z_ref         - surface height above mean sea level
+    - location      - location name
+    - quicklook     - vad_quicklook of the same lidar_str, z_ref and location which 
+                      is reused (optional); otherwise a new figure is created and closed
+'''
+@instrument.timed('plot_VAD_day')
+def plot_VAD_day(file_path,path_out,lidar_str,date_str,z_ref,location,quicklook=None):
+    plt.ioff()
     
-    cb_temp=fig.colorbar(pc_temp,cax=cax[2],ticks=np.arange(0,4.1,1),extend='both')
-    cb_temp.set_label('$\overline{v_r^{\prime 2}}$ (m$^2$ s$^{-1}$)')
+    if quicklook is None:
+        quicklook_temp=vad_quicklook(lidar_str,z_ref,location)
+    else:
+        quicklook_temp=quicklook
     
-    #%% Figure title
-    fig.text(.1,.5,'height above reference level (km)',rotation=90,va='center')
-    fig.text(.16,.93,'reference level: %i m MSL' %z_ref,ha='left',va='top',size=12)
-    fig.text(0.5,0.95,'%s lidar at %s (%s m MSL): %s' %(lidar_str,location,z_ref,mdates.num2datestr(date_num,'%d-%b-%Y')),ha='center',va='bottom')
+    quicklook_temp.render(file_path,path_out,date_str)
     
-    #%% save figure
-    plot_file_name='%s_%s_vad.png' %(lidar_str,date_str)
-    plt.savefig(os.path.join(path_out,plot_file_name),bbox_inches='tight')
-    plt.close(fig)
+    if quicklook is None:
+        quicklook_temp.close()
     
-    plt.ion()
\ No newline at end of file
+    plt.ion()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Batch rendering of VAD quicklooks (see plot_vad.plot_VAD_day) for archives of 
+daily *_vad.nc files:
+    - find_vad_files: collect daily .nc files and the day they contain
+    - plot_VAD_batch: render the days in parallel on a pool of processes (Agg backend);
+                      days whose .png is newer than the .nc file are skipped; each 
+                      process reuses one figure template (plot_vad.vad_quicklook)
+"""
+import os,sys,re,time
+import multiprocessing as mp
+import matplotlib as mpl
+
+try:
+    from . import plot_vad
+except ImportError:
+    if __name__=='__main__':
+        # script: dwl.instrument (see plot_vad) from the repository, if the toolbox is not installed
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+    import plot_vad
+
+'''
+Find daily VAD files (written by vad2NetCDF.to_netcdf: [lidar]_[yyyymmdd]_vad.nc) 
+in path_in and all its subdirectories
+Input:
+    path_in     - directory containing *_vad.nc files
+    lidar_str   - only files of this lidar (optional)
+Output:
+    file_list   - list of (file_path, date_str) sorted by day
+'''
+def find_vad_files(path_in,lidar_str=None):
+    pattern=re.compile(r'^(.+)_(\d{8})_vad\.nc$')
+    file_list=[]
+    for root,dirs,files in os.walk(path_in):
+        for file_name in files:
+            match=pattern.match(file_name)
+            if match is None: continue
+            if (lidar_str is not None) and (match.group(1)!=lidar_str): continue
+            file_list.append((os.path.join(root,file_name),match.group(2)))
+    
+    return sorted(file_list,key=lambda f: f[1])
+
+'''
+.png file of plot_VAD_day is up to date if it is newer than the .nc file
+'''
+def is_up_to_date(file_path,path_out,lidar_str,date_str):
+    plot_file=os.path.join(path_out,'%s_%s_vad.png' %(lidar_str,date_str))
+    
+    return os.path.isfile(plot_file) and (os.path.getmtime(plot_file)>=os.path.getmtime(file_path))
+
+# figure templates (plot_vad.vad_quicklook) of each worker process, reused for all 
+# days of the same lidar
+_quicklooks=dict()
+
+# function executed in the worker processes; errors are returned, not raised, so 
+# that one corrupt file does not stop the batch
+def _plot_day(args):
+    file_path,path_out,lidar_str,date_str,z_ref,location=args
+    try:
+        key=(lidar_str,z_ref,location)
+        if key not in _quicklooks:
+            _quicklooks[key]=plot_vad.vad_quicklook(lidar_str,z_ref,location)
+        plot_vad.plot_VAD_day(file_path,path_out,lidar_str,date_str,z_ref,location,quicklook=_quicklooks[key])
+        return date_str,None
+    except Exception as e:
+        return date_str,'%s: %s' %(type(e).__name__,e)
+
+'''
+Render quicklooks of many days in parallel
+Input:
+    file_list   - list of (file_path, date_str), e.g., from find_vad_files
+    path_out    - path for output .png figures
+    lidar_str   - Lidar name
+    z_ref       - surface height above mean sea level
+    location    - location name
+    processes   - number of processes (default: number of CPUs)
+    overwrite   - render days even if the .png is up to date
+Output:
+    stats       - dictionary: rendered, skipped, failed (list of (date_str, error)), 
+                  duration in s, rate in days/min
+'''
+def plot_VAD_batch(file_list,path_out,lidar_str,z_ref,location,processes=None,overwrite=False):
+    if not os.path.exists(path_out): os.makedirs(path_out)
+    
+    jobs=[(file_path,path_out,lidar_str,date_str,z_ref,location) for file_path,date_str in file_list\
+          if overwrite or not is_up_to_date(file_path,path_out,lidar_str,date_str)]
+    stats={'rendered':0,'skipped':len(file_list)-len(jobs),'failed':[],'duration':0.,'rate':0.}
+    
+    t_start=time.perf_counter()
+    if len(jobs)==0:
+        pass
+    elif processes==1:
+        results=map(_plot_day,jobs)
+        for date_str,error in results:
+            if error is None: stats['rendered']+=1
+            else: stats['failed'].append((date_str,error))
+    else:
+        # the workers use the Agg backend, set before pyplot is imported with plot_vad
+        with mp.get_context('spawn').Pool(processes,initializer=mpl.use,initargs=('Agg',)) as pool:
+            for date_str,error in pool.imap_unordered(_plot_day,jobs):
+                if error is None: stats['rendered']+=1
+                else: stats['failed'].append((date_str,error))
+    
+    stats['duration']=time.perf_counter()-t_start
+    if stats['rendered']>0:
+        stats['rate']=stats['rendered']/stats['duration']*60
+    print('%i days rendered, %i skipped, %i failed: %.1f days/min' %(stats['rendered'],stats['skipped'],len(stats['failed']),stats['rate']))
+    
+    return stats
+
+if __name__=='__main__':
+    # usage: python plot_vad_batch.py path_in path_out lidar_str z_ref location [processes]
+    path_in,path_out,lidar_str,z_ref,location=sys.argv[1:6]
+    processes=int(sys.argv[6]) if len(sys.argv)>6 else None
+    plot_VAD_batch(find_vad_files(path_in,lidar_str),path_out,lidar_str,float(z_ref),location,processes=processes)
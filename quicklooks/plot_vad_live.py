@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Near-real-time VAD quicklook of the current day (see plot_vad.plot_VAD_day)
+The daily *_vad.nc file grows during the day. Instead of reading the complete file
+and creating the figure at every refresh, only the profiles newer than the last 
+refresh (datenum) are read and written into the arrays of a fixed time lattice 
+of the day; the figure keeps one artist per element (contour fill, pcolormesh, 
+wind barbs), so the cost per refresh stays constant during the day. The contour
+fill of the wind speed is calculated again for the whole lattice of the day at
+every refresh (and the whole figure is rendered by savefig), so the incremental
+update saves the reading of the file, not the drawing.
+    - vad_quicklook_live: figure template with fixed time lattice of the day
+    - run_live: refresh the quicklook of the current day every interval seconds
+"""
+import os,sys,time,datetime
+import numpy as np
+from netCDF4 import Dataset
+import matplotlib.dates as mdates
+
+try:
+    from . import plot_vad
+except ImportError:
+    if __name__=='__main__':
+        # script: dwl.instrument (see plot_vad) from the repository, if the toolbox is not installed
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),'..'))
+    import plot_vad
+c_map_ws,dtn=plot_vad.c_map_ws,plot_vad.dtn
+
+'''
+Figure template for incremental updates; the profiles are placed on a fixed time 
+lattice of the day (delta_t in s, should equal the interval of the VAD scans); 
+column ti covers ti*delta_t to (ti+1)*delta_t. The pcolormesh of w and rv_fluc_var 
+and the wind barbs (lattice of plot_vad.regrid_barbs as in plot_VAD_day) cover the 
+whole day from the beginning, their arrays are replaced. The contour fill of the 
+wind speed is drawn again as one ContourSet of the lattice.
+Input:
+    - lidar_str     - Lidar name
+    - z_ref         - surface height above mean sea level
+    - location      - location name
+    - delta_t in s  - time resolution of the lattice (default: 10 min)
+'''
+class vad_quicklook_live(plot_vad.vad_quicklook):
+    def __init__(self,lidar_str,z_ref,location,delta_t=600):
+        super().__init__(lidar_str,z_ref,location)
+        self.delta_t=delta_t
+        self.tn=int(np.round(dtn/delta_t))
+        self.date_num=None
+    
+    '''
+    start a new day: empty arrays and data artists
+    '''
+    def reset(self,date_num,height):
+        self.date_num=date_num
+        self.last_dn=-np.inf
+        self.height=height
+        gn=height.size
+        self.data={var:np.full((gn,self.tn),np.nan) for var in ['ff','u','v','w','rv_fluc_var']}
+        
+        for artist in self.barbs: artist.remove()
+        if self.contour is not None: self.contour.remove()
+        self.contour=None
+        
+        # edges of the cells: time lattice and centered around the heights
+        self.x_edges=np.arange(self.tn+1)*self.delta_t/dtn
+        dh=np.diff(height) if height.size>1 else np.array([1.])
+        y_edges=np.hstack([height[0]-dh[0]/2,height[:-1]+dh/2,height[-1]+dh[-1]/2])
+        self.update_mesh(0,self.x_edges,y_edges,self.data['w'],plot_vad.c_map_rv,self.norm_w)
+        self.update_mesh(1,self.x_edges,y_edges,self.data['rv_fluc_var'],plot_vad.c_map_snr,self.norm_rv_fluc)
+        
+        # wind barbs: one artist on the fixed lattice of plot_VAD_day, U and V are replaced
+        self.time_plot=(np.arange(self.tn)+0.5)*self.delta_t/dtn
+        self.gc_plot=height+np.median(dh)/2
+        X,Y,U,V=self.barb_data(self.time_plot,self.gc_plot,self.data['u'],self.data['v'])
+        dots,=self.ax[0].plot([],[],'k.',ms=3)
+        barbs=self.ax[0].barbs(X,Y,U*1.94,V*1.94,\
+                  pivot='tip',length=4.8,fill_empty=False,rounding=False,\
+                   sizes=dict(emptybarb=0.04,spacing=0.2,height=0.4),zorder=2)
+        self.barbs=[dots,barbs]
+        
+        self.title.set_text('%s lidar at %s (%s m MSL): %s' %(self.lidar_str,self.location,self.z_ref,mdates.num2date(date_num).strftime('%d-%b-%Y')))
+    
+    '''
+    read profiles newer than the last refresh from the *_vad.nc file
+    Output:
+        - dictionary as in plot_vad.read_vad (only new profiles) or None
+    '''
+    def read_new(self,file_path):
+        with Dataset(file_path,'r') as ds:
+            datenum=np.asarray(ds['datenum'][:])
+            height=np.asarray(ds['height'][:])+ds.alt-self.z_ref
+            date_num=np.floor(datenum[0])
+            if (self.date_num!=date_num) or (height.size!=self.height.size):
+                self.reset(date_num,height)
+            
+            ind_new=np.where(datenum>self.last_dn)[0]
+            if ind_new.size==0:
+                return None
+            i0=ind_new[0]
+            data_new={'datenum':datenum[i0:]}
+            for var,var_nc in [('ff','ff'),('u','ucomp'),('v','vcomp'),('w','wcomp'),('rv_fluc_var','vr_fluc_var')]:
+                data_new[var]=np.ma.filled(ds[var_nc][:,i0:].astype(float),np.nan)
+        
+        return data_new
+    
+    '''
+    write new profiles into the arrays and update the affected columns; times within
+    1e-4 column of a column boundary (rounding of datenum) are put on the boundary
+    '''
+    def update_new(self,data_new):
+        ti=np.clip(np.floor(np.round((data_new['datenum']-self.date_num)*dtn/self.delta_t,4)).astype(int),0,self.tn-1)
+        for var in self.data:
+            self.data[var][:,ti]=data_new[var]
+        self.last_dn=data_new['datenum'].max()
+        
+        # w and rv_fluc_var: replace arrays of the meshes
+        self.mesh[0].set_array(self.data['w'])
+        self.mesh[1].set_array(self.data['rv_fluc_var'])
+        
+        # contour fill: one ContourSet of the lattice (as plot_VAD_day: value at the start of the column)
+        if self.contour is not None: self.contour.remove()
+        ff=np.hstack([self.data['ff'],np.full([self.height.size,1],np.nan)])
+        self.contour=self.ax[0].contourf(self.x_edges,self.height,ff,levels=self.ws_levels,cmap=c_map_ws)
+        
+        # wind barbs: averages on the lattice of plot_VAD_day
+        X,Y,U,V=self.barb_data(self.time_plot,self.gc_plot,self.data['u'],self.data['v'])
+        dots,barbs=self.barbs
+        dots.set_data(X[~np.isnan(U)],Y[~np.isnan(U)])
+        barbs.set_UVC(U*1.94,V*1.94)
+        self.ax[0].set(xlim=self.x_lim,ylim=self.y_lim)
+    
+    '''
+    read new profiles, update the figure and save as .png
+    Input:
+        - file_path     - path of *_vad.nc input file of the current day
+        - path_out      - path for output .png figure
+    Output:
+        - number of new profiles
+    '''
+    def refresh(self,file_path,path_out):
+        data_new=self.read_new(file_path)
+        if data_new is None:
+            return 0
+        self.update_new(data_new)
+        
+        date_str=mdates.num2date(self.date_num).strftime('%Y%m%d')
+        plot_file_name='%s_%s_vad.png' %(self.lidar_str,date_str)
+        self.fig.savefig(os.path.join(path_out,plot_file_name),bbox_inches='tight')
+        
+        return data_new['datenum'].size
+
+'''
+refresh the quicklook of the current day (UTC) every interval seconds
+Input:
+    - path_in       - directory of the daily [lidar_str]_[yyyymmdd]_vad.nc files
+    - path_out      - path for output .png figure
+    - lidar_str     - Lidar name
+    - z_ref         - surface height above mean sea level
+    - location      - location name
+    - interval in s - time between refreshes
+    - delta_t in s  - time resolution of the VAD profiles
+'''
+def run_live(path_in,path_out,lidar_str,z_ref,location,interval=600,delta_t=600):
+    quicklook=vad_quicklook_live(lidar_str,z_ref,location,delta_t=delta_t)
+    while True:
+        date_str=datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d')
+        file_path=os.path.join(path_in,'%s_%s_vad.nc' %(lidar_str,date_str))
+        if os.path.isfile(file_path):
+            t_start=time.perf_counter()
+            n=quicklook.refresh(file_path,path_out)
+            print('%s: %i new profiles, %.2f s' %(date_str,n,time.perf_counter()-t_start))
+        time.sleep(interval)
+
+if __name__=='__main__':
+    # usage: python plot_vad_live.py path_in path_out lidar_str z_ref location [interval]
+    path_in,path_out,lidar_str,z_ref,location=sys.argv[1:6]
+    interval=float(sys.argv[6]) if len(sys.argv)>6 else 600
+    run_live(path_in,path_out,lidar_str,float(z_ref),location,interval=interval)
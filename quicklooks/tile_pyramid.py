@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Level-of-detail tile pyramid of time-height diagrams for interactive web quicklooks
+(e.g., zoom from a month to a 10 minute window).
+
+The time axis is divided into tiles of tile_px pixel columns. Tiles of level 0 
+cover tile_seconds (default: 10 min), tiles of level k cover tile_seconds*2^k. 
+Only level 0 is calculated from the data (VAD or l1 files); each tile of level k+1
+is aggregated from its two tiles of level k (sum, count and maximum of pairs of 
+columns). For each tile the sums, counts and maxima are kept (.npz) next to the 
+image (.png), so tiles can be updated incrementally: only profiles or rays newer 
+than the last update of a file are added and only the affected tiles of all levels
+are recalculated.
+
+Tile files: path_out/[field]/[level]/[index].png with index=floor(time/tile duration),
+time in seconds since 01-01-1970.
+
+    - tile_pyramid: add data, aggregate and render tiles
+    - update_vad, update_l1: add new data of *_vad.nc or l1 .nc files
+    - serve: local HTTP server of the tiles for testing
+"""
+import os,sys,json
+import numpy as np
+from netCDF4 import Dataset
+import matplotlib as mpl
+import matplotlib.image as mimage
+import matplotlib.dates as mdates
+
+try:
+    from . import colormap_costumn as cm
+except ImportError:
+    import colormap_costumn as cm
+
+c_map,c_map_snr,c_map_ws,c_map_rv=cm.load_colormaps() 
+dtn=(24*60*60) # second of day
+
+# colormap, limits and statistic of the pixels of each field
+fields={'ff':(c_map_ws,0,20,'mean'),\
+        'w':(c_map_rv,-3,3,'mean'),\
+        'rv_fluc_var':(c_map_snr,0,4,'mean'),\
+        'radial_velocity':(c_map_rv,-3,3,'mean'),\
+        'snr':(c_map_snr,-30,10,'mean'),\
+        'beta':(c_map,-7,-4,'max')}
+
+'''
+pixel ranges covered by measurements of finite size; positions within 1e-4 
+pixel of a pixel boundary (e.g., rounding of datenum) are put on the boundary, 
+so the same pixels are covered when the measurements are added in parts
+Input:
+    - start,end     - position of start and end of each measurement in pixels
+Output:
+    - ind           - index of measurement for each covered pixel 
+    - pixel         - covered pixel
+'''
+def expand_pixels(start,end):
+    start,end=np.round(start,4),np.round(end,4)
+    p0=np.floor(start).astype(int)
+    p1=np.maximum(np.ceil(end).astype(int)-1,p0)
+    n=p1-p0+1
+    ind=np.repeat(np.arange(p0.size),n)
+    offset=np.arange(ind.size)-np.repeat(np.cumsum(n)-n,n)
+    
+    return ind,p0[ind]+offset
+
+'''
+Tile pyramid of several fields
+Input:
+    - path_out          - directory of the tiles
+    - y_lim in m        - height range
+    - ny                - number of pixel rows
+    - tile_px           - number of pixel columns of a tile
+    - tile_seconds in s - duration of tiles of level 0
+    - levels            - number of levels (default: 13, level 12 covers about 28 days)
+The parameters are stored in path_out/manifest.json; an existing pyramid can only
+be updated with the same parameters (ValueError otherwise).
+'''
+class tile_pyramid():
+    def __init__(self,path_out,y_lim=[0,2000],ny=128,tile_px=256,tile_seconds=600,levels=13):
+        self.path_out=path_out
+        self.y_lim,self.ny=y_lim,ny
+        self.tile_px,self.tile_seconds,self.levels=tile_px,tile_seconds,levels
+        self.dt=tile_seconds/tile_px # seconds per pixel of level 0
+        self.dy=(y_lim[1]-y_lim[0])/ny
+        
+        # parameters and last time (datenum) added of each source file
+        self.manifest_path=os.path.join(path_out,'manifest.json')
+        params={'y_lim':[float(y) for y in y_lim],'ny':ny,'tile_px':tile_px,'tile_seconds':tile_seconds,'levels':levels}
+        if os.path.isfile(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest=json.load(f)
+            differ=['%s=%s (pyramid: %s)' %(key,value,self.manifest.get(key)) for key,value in params.items() \
+                    if self.manifest.get(key)!=value]
+            if differ:
+                raise ValueError('tile pyramid %s was created with other parameters: %s' %(path_out,', '.join(differ)))
+        else:
+            self.manifest=dict(params,sources={})
+    
+    def tile_path(self,field,level,index,ext):
+        return os.path.join(self.path_out,field,str(level),'%i.%s' %(index,ext))
+    
+    '''
+    sums, counts and maxima of a tile (ny x tile_px); zeros/NaN if not existing
+    '''
+    def load(self,field,level,index):
+        path=self.tile_path(field,level,index,'npz')
+        if os.path.isfile(path):
+            with np.load(path) as data:
+                return data['sum'],data['count'],data['max']
+        shape=(self.ny,self.tile_px)
+        
+        return np.zeros(shape),np.zeros(shape),np.full(shape,np.nan)
+    
+    '''
+    save sums, counts and maxima of a tile and render the image
+    '''
+    def save(self,field,level,index,tile_sum,tile_count,tile_max):
+        path=self.tile_path(field,level,index,'npz')
+        if not os.path.exists(os.path.dirname(path)): os.makedirs(os.path.dirname(path))
+        np.savez(path,sum=tile_sum,count=tile_count,max=tile_max)
+        
+        c_map_temp,vmin,vmax,stat=fields[field]
+        if stat=='max':
+            image=tile_max
+        else:
+            with np.errstate(invalid='ignore',divide='ignore'):
+                image=tile_sum/tile_count
+        rgba=c_map_temp(mpl.colors.Normalize(vmin=vmin,vmax=vmax)(image))
+        rgba[np.isnan(image),3]=0 # transparent without data
+        mimage.imsave(self.tile_path(field,level,index,'png'),rgba,origin='lower')
+    
+    '''
+    add measurements to level 0 and update all levels above
+    Input:
+        - field         - name of field (see fields)
+        - dn            - (rn,) start time of profiles/rays in datenum
+        - height in m   - (gn,) height of range gates 
+        - values        - (gn x rn) measurements
+        - duration in s - duration of each profile/ray (e.g., interval of VAD scans)
+        - depth in m    - vertical extent of each range gate
+    Output:
+        - indices of updated tiles of level 0
+    '''
+    def add(self,field,dn,height,values,duration=0,depth=0):
+        t=(np.asarray(dn)-mdates.datestr2num('19700101'))*dtn
+        ri,col=expand_pixels(t/self.dt,(t+duration)/self.dt)
+        gi,row=expand_pixels((np.asarray(height)-depth/2-self.y_lim[0])/self.dy,(np.asarray(height)+depth/2-self.y_lim[0])/self.dy)
+        
+        use_row=(row>=0)&(row<self.ny)
+        gi,row=gi[use_row],row[use_row]
+        values_exp=np.asarray(values,dtype=float)[gi][:,ri]
+        valid=~np.isnan(values_exp)
+        
+        tiles=col//self.tile_px
+        tiles_updated=np.unique(tiles[valid.any(axis=0)])
+        n=self.ny*self.tile_px
+        for index in tiles_updated:
+            in_tile=tiles==index
+            v=values_exp[:,in_tile]
+            ind=(row[:,np.newaxis]*self.tile_px+(col[in_tile]-index*self.tile_px)[np.newaxis,:])
+            ok=~np.isnan(v)
+            tile_sum,tile_count,tile_max=self.load(field,0,index)
+            tile_sum=tile_sum+np.bincount(ind[ok],weights=v[ok],minlength=n).reshape(self.ny,self.tile_px)
+            tile_count=tile_count+np.bincount(ind[ok],minlength=n).reshape(self.ny,self.tile_px)
+            tile_max=tile_max.ravel()
+            np.fmax.at(tile_max,ind[ok],v[ok])
+            self.save(field,0,index,tile_sum,tile_count,tile_max.reshape(self.ny,self.tile_px))
+        
+        self.aggregate(field,tiles_updated)
+        
+        return tiles_updated
+    
+    '''
+    recalculate tiles of all levels above the updated tiles of level 0 from 
+    their two tiles of the level below
+    '''
+    def aggregate(self,field,tiles_updated):
+        tiles_level=np.unique(tiles_updated)
+        for level in range(1,self.levels):
+            tiles_level=np.unique(tiles_level//2)
+            for index in tiles_level:
+                left,right=self.load(field,level-1,2*index),self.load(field,level-1,2*index+1)
+                tile_sum,tile_count,tile_max=[np.hstack([l,r]) for l,r in zip(left,right)]
+                self.save(field,level,index,\
+                          tile_sum[:,::2]+tile_sum[:,1::2],\
+                          tile_count[:,::2]+tile_count[:,1::2],\
+                          np.fmax(tile_max[:,::2],tile_max[:,1::2]))
+    
+    def last_added(self,file_path):
+        return self.manifest['sources'].get(os.path.abspath(file_path),-np.inf)
+    
+    def set_added(self,file_path,dn_last):
+        self.manifest['sources'][os.path.abspath(file_path)]=float(dn_last)
+        with open(self.manifest_path,'w') as f:
+            json.dump(self.manifest,f,indent=1)
+
+'''
+add profiles of a *_vad.nc file which are newer than the last update
+Input:
+    - pyramid       - tile_pyramid
+    - file_path     - path of *_vad.nc file
+    - z_ref         - surface height above mean sea level (default: height above lidar)
+Output:
+    - number of new profiles
+'''
+def update_vad(pyramid,file_path,z_ref=None):
+    with Dataset(file_path,'r') as ds:
+        dn=np.asarray(ds['datenum'][:])
+        ind_new=np.where(dn>pyramid.last_added(file_path))[0]
+        if ind_new.size==0: return 0
+        i0=ind_new[0]
+        height=np.asarray(ds['height'][:],dtype=float)
+        if z_ref is not None: height=height+ds.alt-z_ref
+        data_new={var:np.ma.filled(ds[var_nc][:,i0:].astype(float),np.nan) for var,var_nc in [('ff','ff'),('w','wcomp'),('rv_fluc_var','vr_fluc_var')]}
+    
+    duration=np.median(np.diff(dn))*dtn if dn.size>1 else 0
+    depth=np.median(np.diff(height)) if height.size>1 else 0
+    for field,values in data_new.items():
+        pyramid.add(field,dn[i0:],height,values,duration=duration,depth=depth)
+    pyramid.set_added(file_path,dn.max())
+    
+    return dn.size-i0
+
+'''
+add rays of a l1 .nc file which are newer than the last update (height of range
+gates from the median elevation angle)
+Output:
+    - number of new rays
+'''
+def update_l1(pyramid,file_path):
+    with Dataset(file_path,'r') as ds:
+        dn=np.asarray(ds['datenum_time'][:])
+        ind_new=np.where(dn>pyramid.last_added(file_path))[0]
+        if ind_new.size==0: return 0
+        i0=ind_new[0]
+        el=np.nanmedian(np.asarray(ds['elevation'][:]))
+        height=np.asarray(ds['gate_centers'][:],dtype=float)*np.sin(np.deg2rad(el))
+        rv=np.ma.filled(ds['radial_velocity'][:,i0:].astype(float),np.nan)
+        intensity=np.ma.filled(ds['intensity'][:,i0:].astype(float),np.nan)
+        beta=np.ma.filled(ds['beta'][:,i0:].astype(float),np.nan)
+    
+    with np.errstate(invalid='ignore',divide='ignore'):
+        snr=10*np.log10(intensity-1)
+        beta_log=np.log10(np.where(beta>0,beta,np.nan))
+    depth=np.median(np.diff(height)) if height.size>1 else 0
+    for field,values in [('radial_velocity',rv),('snr',snr),('beta',beta_log)]:
+        pyramid.add(field,dn[i0:],height,values,depth=depth)
+    pyramid.set_added(file_path,dn.max())
+    
+    return dn.size-i0
+
+'''
+local HTTP server of the tiles (stand-in for the web server)
+'''
+def serve(path_out,port=8000):
+    import functools
+    import http.server
+    handler=functools.partial(http.server.SimpleHTTPRequestHandler,directory=path_out)
+    with http.server.ThreadingHTTPServer(('localhost',port),handler) as server:
+        print('serving tiles of %s at http://localhost:%i/' %(path_out,port))
+        server.serve_forever()
+
+if __name__=='__main__':
+    # usage: python tile_pyramid.py path_out [port]
+    serve(sys.argv[1],int(sys.argv[2]) if len(sys.argv)>2 else 8000)
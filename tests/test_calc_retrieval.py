@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from dwl.coplanar_retrieval import calc_retrieval as cr
+
+'''
+PPI scans of a uniform wind (u,v) with noise and missing values; the sector of
+the first lidar crosses north
+'''
+def ppi_scans(locs,u=3.,v=-2.,noise=0.3,seed=0):
+    rng=np.random.default_rng(seed)
+    r=np.arange(50,1500,30.)
+    scan_list=[]
+    for li,loc in enumerate(locs):
+        az=np.linspace(-60+li*40,60+li*40,121)%360
+        vr=np.outer(np.ones(r.size),u*np.sin(np.deg2rad(az))+v*np.cos(np.deg2rad(az)))\
+           +rng.normal(0,noise,(r.size,az.size))
+        vr[rng.random(vr.shape)<0.1]=np.nan
+        scan_list.append(cr.scan(np.zeros(az.size),az,vr,np.ones_like(vr),loc,r))
+    return scan_list
+
+'''
+RHI scans of two lidars facing each other (horizontal wind u along the plane, w)
+'''
+def rhi_scans(u=3.,w=0.5,noise=0.2,seed=0):
+    rng=np.random.default_rng(seed)
+    r=np.arange(50,1500,30.)
+    scan_list=[]
+    for loc,az in [([0,0,0],90.),([1200,0,0],270.)]:
+        el=np.linspace(2,90,89)
+        vr=np.outer(np.ones(r.size),u*np.cos(np.deg2rad(el))*np.sin(np.deg2rad(az))+w*np.sin(np.deg2rad(el)))\
+           +rng.normal(0,noise,(r.size,el.size))
+        scan_list.append(cr.scan(el,np.full(el.size,az),vr,np.ones_like(vr),loc,r))
+    return scan_list
+
+locs_2=[[0,0,0],[1200,0,0]]
+locs_3=[[0,0,0],[1200,0,0],[600,1000,0]]
+x=np.arange(-1000,1600,100.)
+
+def horizontal_grid():
+    return cr.grid(x,x,np.array([0.]),100)
+
+def vertical_grid():
+    return cr.grid(np.arange(0,1300,100.),np.zeros(13),np.arange(0,1000,100.),100)
+
+@pytest.mark.parametrize('locs',[locs_2,locs_3])
+def test_horizontal_uniform_wind(locs):
+    ret=cr.calc_retrieval(ppi_scans(locs,noise=0),horizontal_grid())
+    valid=~np.isnan(ret.u)
+    assert valid.sum()>20
+    np.testing.assert_allclose(ret.u[valid],3,atol=1e-9)
+    np.testing.assert_allclose(ret.v[valid],-2,atol=1e-9)
+    assert np.all(ret.error[valid]>=1)
+
+def test_vertical_uniform_wind():
+    ret=cr.calc_retrieval(rhi_scans(noise=0),vertical_grid())
+    valid=~np.isnan(ret.u)
+    assert valid.sum()>50
+    np.testing.assert_allclose(ret.u[valid],3,atol=1e-9)
+    np.testing.assert_allclose(ret.v[valid],0.5,atol=1e-9)
+
+'''
+regression: number of retrieved grid points and sums of u, v and error prefactor
+(noisy scans); the mean azimuth of a lidar is the circular mean
+'''
+@pytest.mark.parametrize('case,expected',[
+    ('2',(31,[92.42556766452205,-61.74978512499385,43.92806443939298])),
+    ('3',(111,[332.7705739703392,-220.9046842909264,155.68234753262632])),
+    ('vertical',(118,[353.92701741152854,58.655982975206065,185.1315301236645]))])
+def test_regression(case,expected):
+    if case=='vertical':
+        ret=cr.calc_retrieval(rhi_scans(),vertical_grid())
+    else:
+        ret=cr.calc_retrieval(ppi_scans(locs_2 if case=='2' else locs_3),horizontal_grid())
+    n_valid,sums=expected
+    assert np.sum(~np.isnan(ret.u))==n_valid
+    np.testing.assert_allclose([np.nansum(ret.u),np.nansum(ret.v),np.nansum(ret.error)],sums,rtol=1e-9)
+
+def test_mask_skips_grid_points():
+    g=horizontal_grid()
+    mask=np.zeros(g.xx.shape,dtype=bool)
+    mask[10:15,10:20]=True
+    scan_list=ppi_scans(locs_3)
+    ret_all=cr.calc_retrieval(scan_list,g)
+    ret_mask=cr.calc_retrieval(scan_list,g,mask=mask)
+    assert np.all(np.isnan(ret_mask.u[~mask]))
+    np.testing.assert_array_equal(ret_mask.u[mask],ret_all.u[mask])
+
+@pytest.mark.parametrize('case,delta_l',[('3',None),('3',100),('2',None),('vertical',None),('vertical',100)])
+def test_plan_grid_mask(case,delta_l):
+    scan_list=rhi_scans() if case=='vertical' else ppi_scans(locs_2 if case=='2' else locs_3)
+    g,mask=cr.plan_grid(scan_list,delta_l=delta_l)
+    assert g.plane_orientation==('vertical' if case=='vertical' else 'horizontal')
+    ret_all=cr.calc_retrieval(scan_list,g)
+    ret_mask=cr.calc_retrieval(scan_list,g,mask=mask)
+    np.testing.assert_array_equal(~np.isnan(ret_all.u),mask)
+    np.testing.assert_array_equal(ret_mask.u,ret_all.u)
+
+def test_select_lidars():
+    # 0 and 90 deg cross with a valid angle, 10 deg is valid with 90 deg only
+    lidar_sel,error=cr.select_lidars(np.deg2rad([0,90,10]))
+    np.testing.assert_array_equal(lidar_sel,[True,True,True])
+    expected=np.mean(1/np.sin(np.deg2rad([90,80]))**2)
+    assert error==pytest.approx(expected)
+    # parallel beams
+    lidar_sel,error=cr.select_lidars(np.deg2rad([0,10,175]))
+    assert not lidar_sel.any() and np.isnan(error)
+    # across north: 350 and 80 deg are 90 deg apart
+    assert cr.pairwise_angle(np.deg2rad([350,80]))[0,1]==pytest.approx(90)
+    # limits of the vertical plane
+    assert cr.select_lidars(np.deg2rad([0,25]),'vertical')[0].all()
+    assert not cr.select_lidars(np.deg2rad([0,25]))[0].any()
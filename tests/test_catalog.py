@@ -0,0 +1,102 @@
+import os
+import numpy as np
+import xarray as xr
+import matplotlib.dates as mdates
+
+from dwl.netcdf import catalog as ct
+from dwl.netcdf import multifile as mf
+
+'''
+l1 file of a PPI (el fixed) or stare scan with rays every second from minute of the day
+'''
+def write_l1(path,name,minute,rays_n=60,gates_n=20,el=2.,geometry='ppi',system_id=142,day='20190805'):
+    dn=mdates.datestr2num(day)+minute/1440+np.arange(rays_n)/86400
+    az=np.linspace(0,90,rays_n) if geometry=='ppi' else np.zeros(rays_n)
+    rv=np.add.outer(np.arange(gates_n),minute*100+np.arange(rays_n)).astype('f4')
+    ds=xr.Dataset({'radial_velocity':(('NUMBER_OF_GATES','NUMBER_OF_RAYS'),rv),\
+                   'elevation':(('NUMBER_OF_RAYS',),np.full(rays_n,el,dtype='f4')),\
+                   'azimuth':(('NUMBER_OF_RAYS',),az.astype('f4')),\
+                   'gate_centers':(('NUMBER_OF_GATES',),(np.arange(gates_n)+0.5)*30.),\
+                   'datenum_time':(('NUMBER_OF_RAYS',),dn)})
+    ds.attrs.update(system_id=system_id,scan_type='User file 1 - csm',range_gate_length='30.0',pulses_per_ray=10000)
+    os.makedirs(path,exist_ok=True)
+    file_path=os.path.join(path,'%s_%s_%04i_l1.nc' %(name,day,minute))
+    ds.to_netcdf(file_path)
+    return file_path
+
+def test_catalog_update(tmp_path):
+    path=str(tmp_path/'l1')
+    files=[write_l1(path,'A',minute) for minute in [0,10,20]]
+    with ct.catalog(str(tmp_path/'products.sqlite')) as cat:
+        assert cat.update(path,lidar='A')==(3,0,0,0)
+        assert cat.update(path,lidar='A')==(0,0,0,3)
+        write_l1(path,'A',10,rays_n=30)
+        os.remove(files[2])
+        assert cat.update(path,lidar='A')==(0,1,1,1)
+        rows=cat.query()
+        assert [row['path'] for row in rows]==[os.path.abspath(file_path) for file_path in files[:2]]
+        assert rows[1]['rays_n']==30 and rows[1]['checksum']==ct.checksum(files[1])
+
+def test_catalog_query(tmp_path):
+    path=str(tmp_path/'l1')
+    ppi_2=[write_l1(path,'A',minute) for minute in [0,10,20]]
+    ppi_5=write_l1(path,'A',30,el=5.)
+    stare=write_l1(path,'A',40,el=90.,geometry='stare')
+    other=write_l1(str(tmp_path/'l1_B'),'B',0,system_id=88)
+    with ct.catalog(str(tmp_path/'products.sqlite')) as cat:
+        cat.update(str(tmp_path))
+        assert len(cat.query(product='l1'))==6
+        assert cat.paths(lidar='88')==[os.path.abspath(other)]
+        assert cat.paths(lidar='142',geometry='ppi',el_range=(1.5,2.5))==[os.path.abspath(f) for f in ppi_2]
+        assert cat.paths(geometry='stare')==[os.path.abspath(stare)]
+        assert cat.paths(lidar='142',el_range=(4,6))==[os.path.abspath(ppi_5)]
+        # files with rays between start and end
+        assert cat.paths(lidar='142',start='2019-08-05 00:10:30',end='2019-08-05 00:20:00')==\
+               [os.path.abspath(f) for f in ppi_2[1:]]
+        assert cat.query(product='vad')==[]
+        row=cat.query(lidar='88')[0]
+        assert row['gates_n']==20 and row['rays_n']==60 and row['range_gate_length']==30.
+        assert row['start_dn']==mdates.datestr2num('20190805')
+
+def test_series_read(tmp_path):
+    path=str(tmp_path/'l1')
+    files=[write_l1(path,'A',minute,gates_n=gates_n) for minute,gates_n in [(10,20),(0,20),(20,25)]]
+    ser=mf.series(files)
+    ds=ser.read(['radial_velocity','gate_centers'])
+    assert ds.sizes['time']==180 and ds.sizes['gate']==25
+    assert np.all(np.diff(ds.datenum.values)>0)
+    # files with fewer range gates are filled with NaN
+    assert np.isnan(ds.radial_velocity.values[20:,:120]).all()
+    assert not np.isnan(ds.radial_velocity.values[:,120:]).any()
+    np.testing.assert_allclose(ds.gate_centers.values,(np.arange(25)+0.5)*30.)
+
+    day=mdates.datestr2num('20190805')
+    ds=ser.read(['radial_velocity'],start=day+(10*60+30)/86400,end=day+(20*60+9)/86400)
+    assert ds.sizes['time']==40
+    np.testing.assert_allclose(ds.radial_velocity.values[0,0],10*100+30)
+
+def test_series_chunks(tmp_path):
+    path=str(tmp_path/'l1')
+    files=[write_l1(path,'A',0,day=day) for day in ['20190805','20190806','20190808']]
+    chunks=list(mf.series(files).chunks(days=1,variables=['radial_velocity']))
+    assert [mdates.num2date(start).strftime('%Y%m%d') for start,ds in chunks]==['20190805','20190806','20190808']
+    assert all(ds.sizes['time']==60 for start,ds in chunks)
+
+    # chunks of 15 s: each ray once
+    chunks=list(mf.series(files[:1]).chunks(days=1/24/60/4,variables=['radial_velocity']))
+    assert len(chunks)==4 and sum(ds.sizes['time'] for start,ds in chunks)==60
+
+    # single ray (start of the series equals its end)
+    file_ray=write_l1(path,'B',0,rays_n=1)
+    chunks=list(mf.series([file_ray]).chunks(days=1/24,variables=['radial_velocity']))
+    assert len(chunks)==1 and chunks[0][1].sizes['time']==1
+
+def test_series_without_files(tmp_path):
+    assert list(mf.series([]).chunks())==[]
+    db_path=str(tmp_path/'products.sqlite')
+    with ct.catalog(db_path) as cat:
+        cat.update(str(tmp_path))
+    ser=mf.open_series(db_path,'A','2019-08-01','2019-08-02')
+    assert len(ser)==0
+    assert list(ser.chunks())==[]
+    assert ser.read().sizes.get('time',0)==0
@@ -0,0 +1,62 @@
+import os
+import time
+import json
+
+from dwl import cli
+from dwl import ingest
+from dwl import instrument
+
+'''
+small .hpl file (csm PPI) of the StreamLine software; mtime age seconds ago
+'''
+def write_hpl(path_out,name,age,rays_n=20,gates_n=10):
+    lines=['Filename:\t%s.hpl' %name,'System ID:\t142','Number of gates:\t%i' %gates_n,\
+           'Range gate length (m):\t30.0','Gate length (pts):\t10','Pulses/ray:\t10000',\
+           'No. of waypoints in file:\t1','Scan type:\tUser file 1 - csm','Focus range:\t65535',\
+           'Start time:\t20190805 12:00:00.00','Resolution (m/s):\t0.0382',\
+           'Altitude of measurement (center of gate) = (range gate + 0.5) * Gate length',\
+           'Data line 1: Decimal time (hours)  Azimuth (degrees)  Elevation (degrees) Pitch (degrees) Roll (degrees)',\
+           'f9.6,1x,f6.2,1x,f6.2',\
+           'Data line 2: Range Gate  Doppler (m/s)  Intensity (SNR + 1)  Beta (m-1 sr-1)',\
+           'i3,1x,f6.4,1x,f8.6,1x,e12.6 - repeat for no. gates','****']
+    for ri in range(rays_n):
+        lines.append('%.6f %.2f %.2f 0.00 0.00' %(12+ri/3600,ri*360/rays_n,5.))
+        lines+=['%3i %.4f %.6f %.6E' %(gi,1.,1.01,1e-6) for gi in range(gates_n)]
+    file_path=os.path.join(path_out,name+'.hpl')
+    with open(file_path,'w') as text_file:
+        text_file.write('\n'.join(lines)+'\n')
+    time_file=time.time()-age
+    os.utime(file_path,(time_file,time_file))
+    return file_path
+
+def test_ingest(tmp_path):
+    path_watch,path_out=str(tmp_path/'watch'),str(tmp_path/'out')
+    os.makedirs(os.path.join(path_watch,'2019'))
+    file_old=write_hpl(os.path.join(path_watch,'2019'),'User1_142_20190805_120000',age=120)
+    file_new=write_hpl(path_watch,'User1_142_20190805_130000',age=0)
+    with open(os.path.join(path_watch,'notes.txt'),'w') as text_file:
+        text_file.write('not a .hpl file')
+
+    # files modified within settle seconds and other files are not processed
+    service=ingest.ingest(path_watch,path_out,None,settle=60)
+    assert [f[0] for f in service.scan()]==[file_old]
+
+    try:
+        cli.main(['--metrics',str(tmp_path/'ingest.prom'),'ingest',path_watch,'-o',path_out,\
+                  '--settle','60','--workers','1','--once'])
+        assert os.path.isfile(os.path.join(path_out,'l1','2019','201908','20190805','User1_142_20190805_120000_l1.nc'))
+        with open(os.path.join(path_out,'ingest_state.json'),'r') as json_file:
+            state=json.load(json_file)
+        assert list(state)==[file_old] and state[file_old][2]=='done'
+        with open(str(tmp_path/'ingest.prom'),'r') as text_file:
+            assert 'dwl_items_total{name="ingest_files_done"} 1' in text_file.read()
+    finally:
+        instrument.disable()
+        instrument.reset()
+
+    # processed files are skipped after a restart until they change
+    service=ingest.ingest(path_watch,path_out,None,settle=60)
+    assert service.scan()==[]
+    write_hpl(path_watch,'User1_142_20190805_130000',age=120)
+    write_hpl(os.path.join(path_watch,'2019'),'User1_142_20190805_120000',age=120,rays_n=21)
+    assert sorted(f[0] for f in service.scan())==sorted([file_old,file_new])
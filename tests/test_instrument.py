@@ -0,0 +1,30 @@
+import numpy as np
+
+from dwl import instrument
+
+def test_nested_traced_peaks(tmp_path):
+    instrument.reset()
+    instrument.enable(trace_memory=True)
+    try:
+        with instrument.timer('outer'):
+            large=np.ones(10**6) # 8 MB
+            del large
+            with instrument.timer('inner'):
+                small=np.ones(10**5) # 0.8 MB
+                del small
+            with instrument.timer('inner'):
+                pass
+        stages=instrument.summary()['stages']
+        assert stages['outer']['traced_peak_bytes']>=8e6
+        assert 8e5<=stages['inner']['traced_peak_bytes']<8e6
+        assert stages['inner']['calls']==2
+
+        file_path=str(tmp_path/'metrics.prom')
+        instrument.write(file_path)
+        with open(file_path,'r') as text_file:
+            text=text_file.read()
+        assert 'dwl_stage_peak_rss_bytes{stage="outer"}' in text
+        assert 'dwl_stage_traced_peak_bytes{stage="outer"} %i' % stages['outer']['traced_peak_bytes'] in text
+    finally:
+        instrument.disable()
+        instrument.reset()
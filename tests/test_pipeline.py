@@ -0,0 +1,74 @@
+import os
+
+from dwl import pipeline as pl
+
+calls=[]
+
+'''
+stages writing the sum of the numbers in their inputs (times factor)
+'''
+def stage_sum(inputs,path_out,factor=1):
+    calls.append(os.path.basename(os.path.dirname(path_out)))
+    total=0
+    for file_path in inputs:
+        with open(file_path,'r') as text_file:
+            total+=int(text_file.read())
+    file_out=os.path.join(path_out,'sum.txt')
+    with open(file_out,'w') as text_file:
+        text_file.write('%i' %(total*factor))
+    return file_out
+
+def stage_fail(inputs,path_out):
+    raise SystemExit('stage exits')
+
+def read(file_path):
+    with open(file_path,'r') as text_file:
+        return int(text_file.read())
+
+def make_pipeline(tmp_path,files,factor=1):
+    p=pl.pipeline(str(tmp_path/'cache'))
+    p.add('a',stage_sum,[files[0]])
+    p.add('b',stage_sum,[files[1]],factor=factor)
+    p.add('total',stage_sum,['a','b'])
+    return p
+
+def test_pipeline_cache(tmp_path):
+    files=[str(tmp_path/'1.txt'),str(tmp_path/'2.txt')]
+    for value,file_path in zip([1,2],files):
+        with open(file_path,'w') as text_file:
+            text_file.write('%i' % value)
+    del calls[:]
+
+    p=make_pipeline(tmp_path,files)
+    assert p.run(workers=1)=={'a':'computed','b':'computed','total':'computed'}
+    assert read(p.outputs('total')[0])==3
+
+    # unchanged stages are not computed again
+    p=make_pipeline(tmp_path,files)
+    assert set(p.run(workers=1).values())=={'cached'}
+    assert len(calls)==3
+
+    # a changed parameter: the stage and the stages using it
+    p=make_pipeline(tmp_path,files,factor=10)
+    assert p.run(workers=1)=={'a':'cached','b':'computed','total':'computed'}
+    assert read(p.outputs('total')[0])==21
+
+    # a changed input file (other size, independent of the resolution of mtime)
+    with open(files[0],'w') as text_file:
+        text_file.write('15')
+    p=make_pipeline(tmp_path,files,factor=10)
+    assert p.run(workers=1)=={'a':'computed','b':'cached','total':'computed'}
+    assert read(p.outputs('total')[0])==35
+
+    assert p.run(workers=1,force=True,targets=['b'])=={'b':'computed'}
+
+def test_pipeline_failed_stage(tmp_path):
+    file_path=str(tmp_path/'1.txt')
+    with open(file_path,'w') as text_file:
+        text_file.write('1')
+    p=pl.pipeline(str(tmp_path/'cache'))
+    p.add('fail',stage_fail,[file_path])
+    p.add('a',stage_sum,['fail'])
+    p.add('b',stage_sum,[file_path])
+    assert p.run(workers=1)=={'fail':'failed','a':'skipped','b':'computed'}
+    assert p.outputs('fail') is None
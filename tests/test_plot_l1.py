@@ -0,0 +1,22 @@
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+from dwl.quicklooks import plot_l1
+
+def test_pixel_lattice():
+    # 4 x 2 pixels of 0.25 days and 100 m
+    lattice=plot_l1.pixel_lattice([0,1],[0,200],4,2)
+    dn=np.array([0.1,0.2,0.6,1.2])
+    height=np.array([50.,150.,250.])
+    ind=lattice.pixel_index(dn,height)
+    np.testing.assert_array_equal(ind,[[0,0,2,-1],[4,4,6,-1],[-1,-1,-1,-1]])
+
+    values=np.array([[1.,3.,5.,7.],[2.,np.nan,4.,7.],[9.,9.,9.,9.]])
+    lattice.add('snr',values,ind)
+    # second file: rays in pixels 1, 1 and 3
+    lattice.add('snr',np.full((3,4),6.),lattice.pixel_index(dn+0.25,height))
+    np.testing.assert_array_equal(lattice.count['snr'].reshape(2,4),[[2,2,1,1],[1,2,1,1]])
+    np.testing.assert_array_equal(lattice.image('snr'),[[2.,6.,5.,6.],[2.,6.,4.,6.]])
+    np.testing.assert_array_equal(lattice.image('snr','max'),[[3.,6.,5.,6.],[2.,6.,4.,6.]])
+    assert np.isnan(lattice.image('beta')).all()
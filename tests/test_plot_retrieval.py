@@ -0,0 +1,36 @@
+import os
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+from dwl.quicklooks import plot_retrieval as pr
+from dwl.coplanar_retrieval import calc_retrieval as cr
+from dwl.coplanar_retrieval import retrieval_series as rs
+
+'''
+PPI scans of two lidars (sectors of 90 deg facing north) with uniform wind
+'''
+def ppi_scan(li,si):
+    r=np.arange(50,1500,30.)
+    az=(np.linspace(0,90,91)-li*90)%360
+    vr=np.outer(np.ones(r.size),3*np.sin(np.deg2rad(az))-2*np.cos(np.deg2rad(az))+0.1*si)
+    return cr.scan(np.zeros(az.size),az,vr,np.ones_like(vr),[[0,0,0],[1200,0,0]][li],r)
+
+def test_plot_retrieval(tmp_path):
+    scan_list=[ppi_scan(0,0),ppi_scan(1,0)]
+    g,mask=cr.plan_grid(scan_list,delta_l=100)
+    file_path=pr.plot_retrieval(cr.calc_retrieval(scan_list,g,mask=mask),str(tmp_path/'ret.png'),title='test')
+    assert os.path.getsize(file_path)>0
+
+    file_nc=rs.calc_retrieval_series([np.array([737641.5,737641.51])]*2,ppi_scan,g,str(tmp_path/'ret.nc'),mask=mask)
+    files_out=pr.plot_retrieval_series(file_nc,str(tmp_path/'png'),processes=1)
+    assert len(files_out)==2 and all(os.path.getsize(f)>0 for f in files_out)
+
+def test_aspect_of_plane():
+    p=np.meshgrid(np.arange(3.),np.arange(2.))
+    quicklook=pr.retrieval_quicklook(p[0],p[1],('x (m)','y (m)'),'horizontal')
+    assert quicklook.ax[0].get_aspect()==1
+    quicklook.close()
+    quicklook=pr.retrieval_quicklook(p[0],p[1],('distance along plane (m)','z (m)'),'vertical')
+    assert quicklook.ax[0].get_aspect()=='auto'
+    quicklook.close()
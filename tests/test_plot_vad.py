@@ -0,0 +1,25 @@
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+from dwl.quicklooks import plot_vad
+
+def test_regrid_barbs_cell_means():
+    time=np.array([0.05,0.15,0.6])
+    height=np.array([100.,300.,1500.])
+    u=np.array([[1.,3.,5.],[np.nan,2.,7.],[4.,4.,4.]])
+    v=-u
+    X,Y,U,V=plot_vad.regrid_barbs(time,height,u,v,[0,1],[0,2000],nx=2,ny=2)
+    np.testing.assert_allclose(X,[[0.25,0.75],[0.25,0.75]])
+    np.testing.assert_allclose(Y,[[500,500],[1500,1500]])
+    # cell (0,0): time 0.05, 0.15 and height 100, 300 (NaN left out)
+    np.testing.assert_allclose(U,[[2.,6.],[4.,4.]])
+    np.testing.assert_allclose(V,-U)
+
+def test_regrid_barbs_outside_and_empty():
+    time=np.array([-0.1,0.1,1.2])
+    height=np.array([100.,2500.])
+    u=np.ones((2,3))
+    X,Y,U,V=plot_vad.regrid_barbs(time,height,u,u,[0,1],[0,2000],nx=4,ny=2)
+    assert U.shape==(2,4)
+    assert U[0,0]==1 and np.isnan(U).sum()==7
@@ -0,0 +1,39 @@
+import os
+import types
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from dwl.quicklooks import plot_vad_live
+from dwl.netcdf import vad2NetCDF
+
+def test_refresh_reads_new_profiles(tmp_path):
+    rng=np.random.default_rng(0)
+    tn,gn=12,20
+    dn=mdates.datestr2num('20190805 12:00')+np.arange(tn)*600/plot_vad_live.dtn
+    gz=(np.arange(gn)+0.5)*30*np.sin(np.deg2rad(70))
+    u,v,w=rng.normal(3,1,(gn,tn)),rng.normal(-2,1,(gn,tn)),rng.normal(0,.5,(gn,tn))
+    lidar_info=types.SimpleNamespace(name='SLXR_142',lidar_id=142,lat=47.3,lon=11.6,zsl=546,bearing=0,gc_corr=0,\
+                                     diff_WGS84=np.nan,diff_geoid=np.nan,diff_bessel=np.nan)
+    def write_vad(ti,u):
+        vad_temp=vad2NetCDF.vad(dn[:ti],gz,u[:,:ti],v[:,:ti],w[:,:ti],np.hypot(u,v)[:,:ti],np.zeros((gn,ti)),np.abs(w[:,:ti]),\
+                                np.full((gn,ti),-10.),30,-18,70,np.full(ti,36),u[:,:ti],v[:,:ti])
+        return vad2NetCDF.to_netcdf(lidar_info,vad_temp,str(tmp_path/'vad'))
+
+    path_out=str(tmp_path/'png')
+    os.makedirs(path_out)
+    quicklook=plot_vad_live.vad_quicklook_live('SLXR_142',546,'Innsbruck')
+    try:
+        assert quicklook.refresh(write_vad(7,u),path_out)==7
+        assert os.path.isfile(os.path.join(path_out,'SLXR_142_20190805_vad.png'))
+        # profiles which were already read are not read again (changed values are not seen)
+        file_path=write_vad(tn,np.where(np.arange(tn)<7,u+10,u))
+        assert quicklook.refresh(file_path,path_out)==tn-7
+        assert quicklook.refresh(file_path,path_out)==0
+        ti=np.round((dn-np.floor(dn[0]))*plot_vad_live.dtn/600).astype(int)
+        np.testing.assert_allclose(quicklook.data['u'][:,ti],u,rtol=1e-6)
+        assert np.isnan(np.delete(quicklook.data['u'],ti,axis=1)).all()
+    finally:
+        plt.close(quicklook.fig)
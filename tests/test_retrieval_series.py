@@ -0,0 +1,59 @@
+import numpy as np
+from netCDF4 import Dataset
+
+from dwl.coplanar_retrieval import retrieval_series as rs
+from dwl.coplanar_retrieval import calc_retrieval as cr
+
+dtn=24*60*60
+
+def test_pair_scans_closest_within_window():
+    times_ref=np.array([0,10,20,30])/dtn
+    times_other=np.array([50,12,1,21])/dtn
+    dn_pairs,ind_pairs=rs.pair_scans([times_ref,times_other],window=5)
+    np.testing.assert_allclose(dn_pairs*dtn,[0,10,20])
+    np.testing.assert_array_equal(ind_pairs,[[0,2],[1,1],[2,3]])
+
+def test_pair_scans_scan_used_once():
+    # both reference scans are closest to the same scan; the closer one is kept
+    dn_pairs,ind_pairs=rs.pair_scans([np.array([0,3])/dtn,np.array([2])/dtn],window=5)
+    np.testing.assert_allclose(dn_pairs*dtn,[3])
+    np.testing.assert_array_equal(ind_pairs,[[1,0]])
+
+def test_pair_scans_three_lidars():
+    times=[np.array([0,60,120])/dtn,np.array([2,61,119])/dtn,np.array([1,64,200])/dtn]
+    dn_pairs,ind_pairs=rs.pair_scans(times,window=5)
+    np.testing.assert_allclose(dn_pairs*dtn,[0,60])
+    np.testing.assert_array_equal(ind_pairs,[[0,0,0],[1,1,1]])
+
+def test_pair_scans_no_scans():
+    dn_pairs,ind_pairs=rs.pair_scans([np.array([0,1])/dtn,np.array([])],window=5)
+    assert dn_pairs.size==0 and ind_pairs.shape==(0,2)
+
+'''
+PPI scans of two lidars (sectors of 90 deg facing north) with uniform wind and noise
+'''
+def ppi_scan(li,si):
+    rng=np.random.default_rng(10*si+li)
+    r=np.arange(50,1500,30.)
+    az=(np.linspace(0,90,91)-li*90)%360
+    vr=np.outer(np.ones(r.size),3*np.sin(np.deg2rad(az))-2*np.cos(np.deg2rad(az)))+rng.normal(0,0.3,(r.size,az.size))
+    vr[rng.random(vr.shape)<0.1]=np.nan
+    return cr.scan(np.zeros(az.size),az,vr,np.ones_like(vr),[[0,0,0],[1200,0,0]][li],r)
+
+def test_calc_retrieval_series(tmp_path):
+    times_list=[np.array([737641.5,737641.51]),np.array([737641.5001,737641.5101])]
+    g,mask=cr.plan_grid([ppi_scan(0,0),ppi_scan(1,0)],delta_l=100)
+    file_path=rs.calc_retrieval_series(times_list,ppi_scan,g,str(tmp_path/'ret.nc'),lidar_names=['A','B'],mask=mask)
+
+    with Dataset(file_path,'r') as ds:
+        assert ds.dimensions['NUMBER_OF_SCANS'].isunlimited() and ds.dimensions['NUMBER_OF_SCANS'].size==2
+        assert ds.plane_orientation=='horizontal' and ds.lidars=='A, B'
+        np.testing.assert_allclose(ds['datenum'][:],times_list[0])
+        np.testing.assert_allclose(ds['x'][:],g.xx)
+        for si in range(2):
+            ret=cr.calc_retrieval([ppi_scan(0,si),ppi_scan(1,si)],g,mask=mask)
+            assert np.sum(~np.isnan(ret.u))>100
+            for var in ['u','v','ws','error','n']:
+                assert ds[var].filters()['zlib']
+                assert ds[var].chunking()[0]==1
+                np.testing.assert_array_equal(np.ma.filled(ds[var][si],np.nan),getattr(ret,var).astype(np.float32))
@@ -0,0 +1,154 @@
+import os
+import numpy as np
+import pytest
+
+from dwl.SL_scan_files import scan_commands as sc
+from dwl.SL_scan_files import simulate_scan_file as ssf
+from dwl.SL_scan_files import qc_l1_trajectory as qc
+from dwl.SL_scan_files import write_scan_file as wsf
+from dwl.SL_scan_files import write_dss as wd
+
+# scan files written by write_scan_file before the scan pattern were moved to scan_commands
+path_ref=os.path.join(os.path.dirname(os.path.abspath(__file__)),'data','scan_files')
+
+@pytest.mark.parametrize('scan,bearing',[
+    (sc.ppi(10,100,el=2,s=2,n=3,w=500),18.4),
+    (sc.rhi(0,180,az=45,s=3,n=2,w=200),0),
+    (sc.ppi_rhi(5,30,s=2,n=2),0),
+    (sc.vad_csm(10,40,10,s=3),5),
+    (sc.vad(12,75),0),
+    (sc.ppi_el(0,90,el=[2,4],s=2,n=2),0),
+    (sc.ht_scan('ref',[1,2],[10,20],1,0.5),0)])
+def test_scan_commands_as_old_writers(scan,bearing,tmp_path):
+    with open(os.path.join(path_ref,scan.name+'.txt'),'r',newline='') as text_file:
+        expected=text_file.read()
+    assert scan.render(bearing)==expected
+    assert scan.write(str(tmp_path/'out'),bearing)==scan.name
+    with open(str(tmp_path/'out'/(scan.name+'.txt')),'r',newline='') as text_file:
+        assert text_file.read()==expected
+
+def test_write_sweep(tmp_path):
+    names=sc.write_sweep(str(tmp_path),sc.ppi,az_start=[0],az_end=[90,180],el=[2],s=[1,2])
+    assert names==['csm_ppi_2.00_0.00-90.00_1x_s1_w500','csm_ppi_2.00_0.00-90.00_1x_s2_w500',\
+                   'csm_ppi_2.00_0.00-180.00_1x_s1_w500','csm_ppi_2.00_0.00-180.00_1x_s2_w500']
+    assert sorted(os.listdir(str(tmp_path)))==sorted(name+'.txt' for name in names)
+
+def test_write_path_out(tmp_path):
+    name=wsf.write_ppi('SL_1',0,90,path_out=str(tmp_path/'out'),el=2)
+    assert os.listdir(str(tmp_path/'out'))==[name+'.txt']
+
+    lidar=wd.lidar_schedule('SL_1',10000,0,[0],[wd.scan_pattern(2,1,'ppi',wsf.write_ppi,(0,90),dict(el=2))])
+    wd.write_scan_files(lidar,str(tmp_path))
+    assert os.listdir(str(tmp_path/'SL_1'))==[lidar.scans[0].scan_file+'.txt']
+
+def test_simulate_dss(tmp_path):
+    # averaging of 1 s (csm) and 2 s (ss) per ray
+    scans=[wd.scan_pattern(1,1,'stare'),\
+           wd.scan_pattern(2,1,'ppi',wsf.write_ppi,(0,90),dict(el=2,s=3)),\
+           wd.scan_pattern(2,2,'vad',wsf.write_vad,(12,75))]
+    lidar=wd.lidar_schedule('SL_1',10000,0,[0,0,0],scans)
+    wd.write_scan_files(lidar,str(tmp_path))
+    dss_path=wd.write_dss(lidar,'test',str(tmp_path))
+
+    sim=ssf.simulate_dss(dss_path,str(tmp_path/'SL_1'),pulse_frequency=10000)
+    assert len(sim['name'])==2*24*60/5 and not sim['overlap'].any()
+    for scan in scans[1:]:
+        duration=ssf.simulate_scan(str(tmp_path/'SL_1'/(scan.scan_file+'.txt')),ray_duration=scan.rays_avg)['duration']
+        ind=[name==scan.scan_file for name in sim['name']]
+        np.testing.assert_allclose(sim['end'][ind]-sim['start'][ind],duration)
+
+'''
+schedule with a stare and a PPI at 2 deg elevation from az_start to 180 deg (2 deg/s)
+'''
+def sync_schedule(lidar_id,dl_loc,az_start):
+    return wd.lidar_schedule(lidar_id,10000,0,dl_loc,[wd.scan_pattern(1,1,'stare'),\
+                             wd.scan_pattern(2,1,'sync',wsf.write_ppi,(az_start,180),dict(el=2,s=2))])
+
+def test_observation_time(tmp_path):
+    lidar=sync_schedule('A',[0,0,0],90)
+    wd.write_scan_files(lidar,str(tmp_path))
+    sim=ssf.simulate_scan(str(tmp_path/'A'/(lidar.scan('sync').scan_file+'.txt')))
+    az=np.deg2rad([135,270])
+    t=wd.observation_time(sim,lidar.dl_loc,1000*np.sin(az),1000*np.cos(az),np.full(2,1000*np.tan(np.deg2rad(2))))
+    # 45 deg at 2 deg/s after the start; 270 deg is not observed
+    assert t[0]==pytest.approx(22.5,abs=1.5) and np.isnan(t[1])
+
+def test_start_delay_and_dss(tmp_path):
+    # B scans from 0 deg, A from 90 deg: A starts 45 s later
+    lidars=[sync_schedule('A',[0,0,0],90),sync_schedule('B',[1,0,0],0)]
+    az=np.deg2rad(np.arange(100,171,10))
+    x,y,z=1000*np.sin(az),1000*np.cos(az),np.full(az.size,1000*np.tan(np.deg2rad(2)))
+    paths=wd.write_campaign(lidars,'sync',str(tmp_path),sync=['sync'],x=x,y=y,z=z)
+    np.testing.assert_allclose([lidar.scan('sync').start_delay for lidar in lidars],[45,0],atol=2)
+    delays,spread,coverage=wd.optimize_start_delay(lidars,'sync',x,y,z,str(tmp_path))
+    assert spread<2 and coverage==1
+
+    # entries shifted before 00:00 are written at the end of the day
+    lidars[1].scan('sync').start_delay=-90
+    paths['B']=wd.write_dss(lidars[1],'sync',str(tmp_path))
+    for lidar_id,start_delay in [('A',45),('B',-90)]:
+        dss=ssf.read_dss(paths[lidar_id])
+        t=np.array([entry[0] for entry in dss])
+        assert len(dss)==24*60/3 and np.all((t>=0)&(t<24*3600)) and np.all(np.diff(t)>0)
+        np.testing.assert_array_equal(np.sort(t),np.sort((np.arange(0,24*3600,180)+60+round(start_delay))%(24*3600)))
+
+def test_simulate_csm_ppi():
+    sim=ssf.simulate_scan(sc.ppi(0,90,el=2,s=2,n=1,w=500).render(),ray_duration=1.)
+    # 90 deg at 2 deg/s, acceleration and two waits of 0.5 s
+    assert 46<sim['duration']<47
+    assert sim['ray_time'].size==int(np.ceil(sim['duration']))
+    np.testing.assert_allclose(sim['ray_el'],2,atol=1e-3) # motor points
+    assert np.all(np.diff(sim['ray_az'])>=0)
+    assert sim['ray_az'][0]==0 and sim['ray_az'][-1]==pytest.approx(90,abs=1e-3)
+
+def test_simulate_bearing():
+    sim=ssf.simulate_scan(sc.ppi(0,90,el=2,s=2,n=1,w=500).render(18.4),ray_duration=1.,bearing=18.4)
+    assert sim['ray_az'][0]==pytest.approx(0,abs=1e-3) and sim['ray_az'][-1]==pytest.approx(90,abs=1e-3)
+
+def test_simulate_ss_vad():
+    sim=ssf.simulate_scan(sc.vad(12,75).render(),ray_duration=0.5)
+    np.testing.assert_allclose(sim['ray_az'],np.arange(0,360,30))
+    np.testing.assert_allclose(sim['ray_el'],75)
+    assert np.all(np.diff(sim['ray_time'])>0.5)
+    assert sim['duration']>sim['ray_time'][-1]
+
+def test_qc_flags_csm():
+    sim=ssf.simulate_scan(sc.ppi(0,90,el=2,s=2,n=1,w=500).render(),ray_duration=1.)
+    time,az,el=sim['ray_time']+1e4,sim['ray_az'].copy(),sim['ray_el'].copy()
+    az_res,el_res,flag=qc.qc_flags(sim,'csm',time,az,el)
+    assert np.all(flag==0)
+    np.testing.assert_allclose(az_res,0,atol=1e-9)
+
+    az[10]+=5
+    el[20]+=2
+    az[31],el[31]=az[30],el[30]
+    time=np.append(time,time[-1]+10)
+    az,el=np.append(az,az[-1]),np.append(el,el[-1])
+    az_res,el_res,flag=qc.qc_flags(sim,'csm',time,az,el)
+    assert flag[10]==qc.flag_az and az_res[10]==pytest.approx(5)
+    assert flag[20]==qc.flag_el and el_res[20]==pytest.approx(2)
+    assert flag[31]&qc.flag_stuck
+    assert flag[-1]==qc.flag_late
+    assert np.count_nonzero(flag)==4
+
+def test_qc_flags_csm_late_start():
+    # first rays missing: the rays are aligned with the trajectory by their angles
+    sim=ssf.simulate_scan(sc.ppi(0,90,el=2,s=2,n=2,w=500).render(),ray_duration=1.)
+    time,az,el=sim['ray_time'][8:]+1e4,sim['ray_az'][8:],sim['ray_el'][8:]
+    assert qc.scan_offset(sim,time[:5]-time[0],az[:5],el[:5])==pytest.approx(sim['ray_time'][8],abs=0.1)
+    az_res,el_res,flag=qc.qc_flags(sim,'csm',time,az,el)
+    assert np.all(flag==0)
+    np.testing.assert_allclose(az_res,0,atol=0.2)
+    # without alignment the later rays deviate
+    assert np.any(qc.qc_flags(sim,'csm',time,az,el,offset=0)[2]&qc.flag_az)
+
+def test_qc_flags_ss():
+    sim=ssf.simulate_scan(sc.vad(12,75).render(),ray_duration=0.5)
+    order=np.random.default_rng(0).permutation(12)
+    az=(sim['ray_az'][order]+0.3)%360
+    el=sim['ray_el'][order].copy()
+    el[3]=70
+    az_res,el_res,flag=qc.qc_flags(sim,'ss',sim['ray_time'],az,el)
+    np.testing.assert_allclose(az_res,0.3,atol=1e-9)
+    assert flag[3]==qc.flag_el
+    assert np.count_nonzero(flag)==1
@@ -0,0 +1,43 @@
+import time
+
+from dwl import scheduler
+from dwl import instrument
+
+'''
+scheduler with a memory of 800 for the jobs (budget 1000, 2 workers of 100);
+memory_running after each start and end of jobs is recorded (gauge)
+'''
+def run_jobs(monkeypatch,jobs):
+    gauges=[]
+    monkeypatch.setattr(instrument,'gauge',lambda name,value: gauges.append(value))
+    sched=scheduler.scheduler(1000,workers=2,worker_memory=100)
+    for name,memory,duration,lidar in jobs:
+        sched.add(name,time.sleep,(duration,),memory,lidar)
+    status=sched.run()
+    assert all(value=='done' for value in status.values()) and len(status)==len(jobs)
+
+    # jobs in the order they were started (memory of the jobs is unique)
+    names={memory:name for name,memory,duration,lidar in jobs}
+    started=[names[value-value_prev] for value_prev,value in zip([0]+gauges[:-1],gauges) if value>value_prev]
+    return sched,gauges,started
+
+def test_memory_budget(monkeypatch):
+    jobs=[('a%i' %ji,300+ji,0.05,'A') for ji in range(6)]+[('b%i' %ji,400+ji,0.05,'B') for ji in range(6)]
+    sched,gauges,started=run_jobs(monkeypatch,jobs)
+    assert sorted(started)==sorted(job[0] for job in jobs)
+    assert 0<max(gauges)<=800 and sched.memory_peak==max(gauges)
+
+def test_skip_limit(monkeypatch):
+    # a1 never fits next to a0 or a b job; without the limit it would wait for all b jobs
+    jobs=[('a0',250,1.,'A'),('a1',600,0.05,'A')]+[('b%i' %ji,300+ji,0.05,'B') for ji in range(12)]
+    sched,gauges,started=run_jobs(monkeypatch,jobs)
+    assert sched.memory_peak<=800
+    assert started.index('a1')<started.index('b11')
+
+def test_oversized_job_runs_alone(monkeypatch):
+    jobs=[('a%i' %ji,300+ji,0.05,'A') for ji in range(3)]+[('big',1200,0.2,'B')]+[('b%i' %ji,400+ji,0.05,'B') for ji in range(3)]
+    sched,gauges,started=run_jobs(monkeypatch,jobs)
+    assert sched.memory_peak==1200
+    i_big=gauges.index(1200)
+    assert gauges[i_big-1]==0 and gauges[i_big+1]==0
+    assert max(gauges[:i_big]+gauges[i_big+1:])<=800
@@ -0,0 +1,84 @@
+import os
+import types
+import numpy as np
+import pytest
+
+import matplotlib
+matplotlib.use('Agg')
+from dwl.quicklooks import tile_pyramid as tp
+from dwl.netcdf import vad2NetCDF
+
+def test_manifest_parameters(tmp_path):
+    path_out=str(tmp_path/'tiles')
+    pyramid=tp.tile_pyramid(path_out,ny=16,tile_px=32,levels=2)
+    pyramid.add('ff',np.array([737641.5]),np.array([100.,300.]),np.full((2,1),5.),duration=600,depth=200)
+    pyramid.set_added('vad.nc',737641.5)
+
+    tp.tile_pyramid(path_out,y_lim=(0,2000),ny=16,tile_px=32,levels=2)
+    with pytest.raises(ValueError,match='ny=32'):
+        tp.tile_pyramid(path_out,ny=32,tile_px=32,levels=2)
+    with pytest.raises(ValueError,match='tile_seconds'):
+        tp.tile_pyramid(path_out,ny=16,tile_px=32,tile_seconds=300,levels=2)
+
+'''
+tiles of a field of a pyramid: {(level,index): (sum,count,max)}
+'''
+def read_tiles(pyramid,field):
+    tiles=dict()
+    for level in range(pyramid.levels):
+        path_level=os.path.join(pyramid.path_out,field,str(level))
+        for file_name in os.listdir(path_level):
+            if not file_name.endswith('.npz'): continue
+            index=int(file_name[:-4])
+            tiles[(level,index)]=pyramid.load(field,level,index)
+    return tiles
+
+def test_aggregate_levels(tmp_path):
+    rng=np.random.default_rng(0)
+    pyramid=tp.tile_pyramid(str(tmp_path/'tiles'),ny=8,tile_px=16,tile_seconds=160,levels=4)
+    dn=737641.5+np.arange(60)*20/tp.dtn
+    values=rng.normal(0,1,(10,60))
+    values[rng.random(values.shape)<0.2]=np.nan
+    pyramid.add('beta',dn,np.arange(10)*200.+100,values,duration=20,depth=200)
+
+    tiles=read_tiles(pyramid,'beta')
+    for level in range(1,pyramid.levels):
+        for (level_temp,index),(tile_sum,tile_count,tile_max) in tiles.items():
+            if level_temp!=level: continue
+            left=pyramid.load('beta',level-1,2*index)
+            right=pyramid.load('beta',level-1,2*index+1)
+            for tile,stat,func in [(tile_sum,0,np.add),(tile_count,1,np.add),(tile_max,2,np.fmax)]:
+                children=np.hstack([left[stat],right[stat]])
+                np.testing.assert_array_equal(tile,func(children[:,::2],children[:,1::2]))
+        total=sum(tile[1].sum() for key,tile in tiles.items() if key[0]==level)
+        assert total==sum(tile[1].sum() for key,tile in tiles.items() if key[0]==0)
+    assert np.nanmax([np.nanmax(tile[2]) for tile in tiles.values()])==np.nanmax(values)
+
+def test_update_vad_incremental(tmp_path):
+    rng=np.random.default_rng(0)
+    tn,gn=12,20
+    dn=737641.5+np.arange(tn)*600/tp.dtn
+    gz=(np.arange(gn)+0.5)*30*np.sin(np.deg2rad(70))
+    u,v,w=rng.normal(3,1,(gn,tn)),rng.normal(-2,1,(gn,tn)),rng.normal(0,.5,(gn,tn))
+    lidar_info=types.SimpleNamespace(name='SLXR_142',lidar_id=142,lat=47.3,lon=11.6,zsl=546,bearing=0,gc_corr=0,\
+                                     diff_WGS84=np.nan,diff_geoid=np.nan,diff_bessel=np.nan)
+    def write_vad(ti):
+        vad_temp=vad2NetCDF.vad(dn[:ti],gz,u[:,:ti],v[:,:ti],w[:,:ti],np.hypot(u,v)[:,:ti],np.zeros((gn,ti)),np.abs(w[:,:ti]),\
+                                np.full((gn,ti),-10.),30,-18,70,np.full(ti,36),u[:,:ti],v[:,:ti])
+        return vad2NetCDF.to_netcdf(lidar_info,vad_temp,str(tmp_path/'vad'))
+
+    kwargs=dict(ny=16,tile_px=8,tile_seconds=3600,levels=3)
+    pyramid=tp.tile_pyramid(str(tmp_path/'incremental'),**kwargs)
+    assert tp.update_vad(pyramid,write_vad(7))==7
+    file_path=write_vad(tn)
+    assert tp.update_vad(pyramid,file_path)==tn-7
+    assert tp.update_vad(pyramid,file_path)==0
+
+    pyramid_full=tp.tile_pyramid(str(tmp_path/'full'),**kwargs)
+    assert tp.update_vad(pyramid_full,file_path)==tn
+    for field in ['ff','w','rv_fluc_var']:
+        tiles,tiles_full=read_tiles(pyramid,field),read_tiles(pyramid_full,field)
+        assert tiles.keys()==tiles_full.keys()
+        for key in tiles:
+            for stat,stat_full in zip(tiles[key],tiles_full[key]):
+                np.testing.assert_allclose(stat,stat_full,rtol=1e-12)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from dwl.coplanar_retrieval import virtual_tower as vt
+
+dtn=24*60*60
+
+'''
+rays of a lidar towards the tower at x=y=0 (stares at the elevation angles of the
+tower heights and 1 deg above, 1 ray per second) in a uniform wind
+'''
+def stare_rays(tower_temp,li,r,wind,dn_start=737641.5):
+    el=np.repeat(np.concatenate([tower_temp.el_deg[li],tower_temp.el_deg[li]+1]),5)
+    az=np.full(el.size,tower_temp.az_deg[li,0])
+    el_rad,az_rad=np.deg2rad(el),np.deg2rad(az)
+    direction=np.column_stack((np.cos(el_rad)*np.sin(az_rad),np.cos(el_rad)*np.cos(az_rad),np.sin(el_rad)))
+    vr=np.outer(np.ones(r.size),direction@np.asarray(wind,dtype=float))
+    return {'datenum':dn_start+np.arange(el.size)/dtn,'elevation':el,'azimuth':az,'radial_velocity':vr}
+
+def test_calc_tower_three_lidars():
+    dl_loc_list=[[-800,0,0],[600,-500,0],[100,900,0]]
+    r=np.arange(15,2000,30.)
+    z=np.array([50,100,200,400])
+    tower_temp=vt.tower(0,0,z,dl_loc_list,[r]*3,tolerance=0.5)
+    np.testing.assert_allclose(tower_temp.az_deg[0],90)
+    np.testing.assert_allclose(tower_temp.el_deg[0],np.rad2deg(np.arctan(z/800)))
+    np.testing.assert_array_equal(np.abs(r[tower_temp.gate[0]]-np.sqrt(800**2+z**2))<=15,True)
+
+    rays_list=[stare_rays(tower_temp,li,r,[3,-2,0.5]) for li in range(3)]
+    ret=vt.calc_tower(tower_temp,rays_list,dt=60)
+    # 5 rays of each lidar match each height, the rays 1 deg above none
+    assert ret.u.shape==(1,z.size) and np.all(ret.n==5)
+    np.testing.assert_allclose(ret.u,3,atol=1e-10)
+    np.testing.assert_allclose(ret.v,-2,atol=1e-10)
+    np.testing.assert_allclose(ret.w,0.5,atol=1e-10)
+    np.testing.assert_allclose(ret.ws,np.sqrt(13),atol=1e-10)
+
+def test_calc_tower_missing_lidar():
+    dl_loc_list=[[-800,0,0],[600,-500,0],[100,900,0]]
+    r=np.arange(15,2000,30.)
+    tower_temp=vt.tower(0,0,[100],dl_loc_list,[r]*3,tolerance=0.5)
+    rays_list=[stare_rays(tower_temp,li,r,[3,-2,0]) for li in range(3)]
+    rays_list[2]['radial_velocity'][:]=np.nan
+
+    # three components need three lidars, (u,v) with w=0 is retrieved from two
+    assert np.all(np.isnan(vt.calc_tower(tower_temp,rays_list,dt=60).u))
+    ret=vt.calc_tower(tower_temp,rays_list,dt=60,components=2)
+    np.testing.assert_allclose([ret.u[0,0],ret.v[0,0],ret.w[0,0]],[3,-2,0],atol=1e-10)
+    assert ret.n[0,0,2]==0